@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Benchmark the time to import curds2 modules in a fresh interpreter
+
+Usage: python benchmarks/import_time.py [nruns]
+
+Prints the best wall time of 'python -c "import <module>"' over nruns,
+minus the time of a bare interpreter start.
+"""
+import subprocess
+import sys
+import time
+
+MODULES = ['curds2', 'curds2.dbapi2', 'curds2.raw.dbapi2', 'curds2.cursors',
+           'curds2.rows', 'curds2.export']
+
+
+def best_time(code, nruns):
+    """Return the best wall time to run python code in a new process"""
+    best = None
+    for n in xrange(nruns):
+        t0 = time.time()
+        subprocess.check_call([sys.executable, '-c', code])
+        dt = time.time() - t0
+        if best is None or dt < best:
+            best = dt
+    return best
+
+
+def main(nruns=10):
+    base = best_time('pass', nruns)
+    print('{0:<24s} {1:>8.1f} ms'.format('(interpreter)', base * 1e3))
+    for module in MODULES:
+        dt = best_time('import ' + module, nruns) - base
+        print('{0:<24s} {1:>8.1f} ms'.format(module, dt * 1e3))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Benchmark handing a large result to a local client, JSON vs mmap
+
+Usage: python benchmarks/transfer.py [nrows]
+
+Times the server and client ends of each transport on a synthetic view
+of 'nrows' rows (default 1000000) without a network in between:
+
+json : encode_reply chunks -> ReplyReader rows (what HTTP carries)
+mmap : shm.write_result file -> shm.read_result columns -> NumPy arrays
+"""
+import sys
+import time
+from StringIO import StringIO
+
+from curds2.api.base import BaseCursor
+from curds2.ws import shm
+from curds2.ws.stream import ReplyReader, encode_reply
+
+
+class SyntheticCursor(BaseCursor):
+    """Cursor over 'nrows' generated origin-like rows"""
+    description = [('orid', 2, 8, 8, '%8ld', None, False),
+                   ('time', 4, 17, 17, '%17.5f', None, True),
+                   ('lat', 3, 9, 9, '%9.4f', None, True),
+                   ('lon', 3, 9, 9, '%9.4f', None, True),
+                   ('depth', 3, 9, 9, '%9.4f', None, True)]
+    rowcount = 0
+
+    def __init__(self, nrows):
+        super(SyntheticCursor, self).__init__()
+        self.rowcount = nrows
+        self._record = 0
+
+    def _getrow(self):
+        n = self._record
+        self._record += 1
+        return [n, 1.4e9 + n, 39.5 + n * 1e-6, -119.8 - n * 1e-6, 10.0]
+
+
+def timed(fxn, *args):
+    t0 = time.time()
+    result = fxn(*args)
+    return result, time.time() - t0
+
+
+def json_transfer(nrows):
+    reply = {'jsonrpc': '2.0', 'id': 1, 'result': {'cursor': {
+        'description': SyntheticCursor.description}}}
+    curs = SyntheticCursor(nrows)
+    text, t_server = timed(lambda: ''.join(encode_reply(reply, curs)))
+    rows, t_client = timed(lambda: list(ReplyReader(StringIO(text))))
+    return t_server, t_client, len(text)
+
+
+def mmap_transfer(nrows):
+    import numpy
+    curs = SyntheticCursor(nrows)
+    handle, t_server = timed(shm.write_result, curs)
+    size = handle['size']
+
+    def read():
+        return [numpy.asarray(c) for c in shm.read_result(handle)]
+    columns, t_client = timed(read)
+    return t_server, t_client, size
+
+
+def main(nrows=1000000):
+    print('{0} rows'.format(nrows))
+    print('{0:<6s} {1:>12s} {2:>12s} {3:>12s}'.format(
+        'mode', 'server (s)', 'client (s)', 'bytes'))
+    for name, transfer in [('json', json_transfer), ('mmap', mmap_transfer)]:
+        t_server, t_client, size = transfer(nrows)
+        print('{0:<6s} {1:>12.4f} {2:>12.4f} {3:>12d}'.format(
+            name, t_server, t_client, size))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        main(int(sys.argv[1]))
+    else:
+        main()
@@ -3,6 +3,12 @@
 Base classes for API
 """
 import abc
+import collections
+import threading
+import time
+import weakref
+
+from curds2.api.resultset import ResultSet, arrow_schema
 
 
 __metaclass__ = abc.ABCMeta
@@ -13,6 +19,68 @@ class BaseRow(object):
         return tuple(row)
 
 
+class NullLock(object):
+    """
+    Lock-alike that does nothing, for Connections used by one thread
+    """
+    __slots__ = []
+
+    def acquire(self, blocking=True):
+        return True
+
+    def release(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class DescriptionCache(object):
+    """
+    Bounded cache of Cursor 'description's, least recently used out
+
+    Shared by the Cursors of a Connection (or by Connections), so views
+    with the same identity (the key, made by the Cursor) build their
+    description once. Values are stored as tuples, callers get a list
+    of the same (immutable) column tuples.
+
+    """
+    maxsize = 256
+
+    def __init__(self, maxsize=None):
+        if maxsize is not None:
+            self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._items = collections.OrderedDict()
+
+    def get(self, key):
+        """Return list of the description of 'key', None if not cached"""
+        with self._lock:
+            value = self._items.pop(key, None)
+            if value is None:
+                return None
+            self._items[key] = value
+        return list(value)
+
+    def put(self, key, description):
+        """Cache a description under 'key'"""
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = tuple(description)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+
 class BaseExecuter(object):
     """
     Executes command as a function or attribute
@@ -62,6 +130,74 @@ class BaseExecuter(object):
         return result
 
 
+class AdaptiveArraysize(object):
+    """
+    Block size for prefetching rows, tuned by the time per row
+
+    The size doubles after each block that is faster per row than the
+    best so far by more than 'tolerance', and stays put once 'patience'
+    blocks in a row are not, or at 'maximum'. A block that isn't faster
+    is fetched again at the same size, so one slow block (timer noise, a
+    busy disk) doesn't stop the growth.
+
+    Use like this:
+    >>> sizer = AdaptiveArraysize(start=16, maximum=4096)
+    >>> rows = fetch(sizer.size)     # time it
+    >>> sizer.update(len(rows), seconds)
+
+    """
+    __slots__ = ['size', 'maximum', 'tolerance', 'patience', '_per_row',
+                 '_misses', '_settled']
+
+    def __init__(self, start=1, maximum=4096, tolerance=0.1, patience=3):
+        self.maximum = max(1, maximum)
+        self.size = max(1, min(start, self.maximum))
+        self.tolerance = tolerance
+        self.patience = max(1, patience)
+        self._per_row = None    # best time per row so far
+        self._misses = 0        # blocks in a row that weren't faster
+        self._settled = False
+
+    def update(self, nrows, seconds):
+        """Record the time to fetch a block, return the next block size"""
+        if self._settled or not nrows or nrows < self.size:
+            return self.size
+        per_row = float(seconds) / nrows
+        best = self._per_row
+        if best is not None and per_row >= best * (1 - self.tolerance):
+            self._misses += 1
+            if self._misses >= self.patience:
+                self._settled = True
+        else:
+            self._misses = 0
+            if self.size < self.maximum:
+                self.size = min(2 * self.size, self.maximum)
+        if best is None or per_row < best:
+            self._per_row = per_row
+        return self.size
+
+
+def _pointer_item(index):
+    """Property for one item of the Cursor pointer list"""
+    def fget(self):
+        return self._ptr[index]
+
+    def fset(self, value):
+        self._ptr[index] = value
+    return property(fget, fset)
+
+
+def _pointer_list(self):
+    """
+    Return the Cursor pointer list, made on first use, so subclasses
+    that don't call BaseCursor.__init__ still have one
+    """
+    ptr = self.__dict__.get('_pointer')
+    if ptr is None:
+        ptr = self.__dict__['_pointer'] = [None, None, None, None]
+    return ptr
+
+
 class BaseCursor(object):
     """
     Base Cursor class with generic methods
@@ -69,27 +205,34 @@ class BaseCursor(object):
     Must implement
     ==============
     __init__(self, *args, **kwargs) [can use super]
-    _fetch(self) [stub]
+    _getrow(self) [stub]
     description [read only attribute/property]
     rowcount [read only attribute/property]
     """
     # INTERNAL
     _executer = BaseExecuter
-    _database = None           # cursor pointer
-    _table    = None
-    _field    = None
-    _record   = None
+    _ptr      = property(_pointer_list)     # cursor pointer, 4-item list
+    _database = _pointer_item(0)
+    _table    = _pointer_item(1)
+    _field    = _pointer_item(2)
+    _record   = _pointer_item(3)
     
     # DBAPI
     arraysize = 1           # Step size for fetch
+
+    # PREFETCH
+    PREFETCH = True         # Iterate over blocks of rows fetched at once
+    prefetch_bytes = 1 << 20    # Max size of a block, from 'internal_size'
     
     # EXTENSIONS
     connection = None       # Parent Connection
+    _lock = NullLock()      # Parent Connection lock, held for backend calls
     
     # CUSTOM
     CONVERT_NULL = False    # Convert NULL values to python None
     CONVERT_DATETIME = False
     row_factory  = BaseRow      # Use this to build rows (default is tuple)
+    result_factory = None       # Use this to build fetchmany/fetchall results
     
     @abc.abstractproperty
     def description(self):
@@ -101,9 +244,13 @@ class BaseCursor(object):
         return -1
     
     @abc.abstractmethod
+    def _getrow(self):
+        """Fetch sequence of row values and increment pointer"""
+        pass
+
     def _fetch(self):
         """Fetch row"""
-        pass
+        return self.row_factory(self, self._getrow())
 
     @abc.abstractmethod
     def __init__(self, *args, **kwargs):
@@ -115,8 +262,12 @@ class BaseCursor(object):
 
         # Inherit settings from Connection if exists
         if self.connection:
+            self.connection._add_cursor(self)
+            self._lock = self.connection._lock
             if self.connection.row_factory:
                 self.row_factory = self.connection.row_factory
+            if self.connection.result_factory:
+                self.result_factory = self.connection.result_factory
             if self.connection.CONVERT_NULL:
                 self.CONVERT_NULL = self.connection.CONVERT_NULL
             if self.connection.CONVERT_DATETIME:
@@ -124,19 +275,73 @@ class BaseCursor(object):
     
     @property
     def _dbptr(self):
-        return [self._database, self._table, self._field, self._record]
+        """
+        Cursor pointer as a list of [database, table, field, record]
+
+        This is the list the Cursor keeps its pointer in, not a copy,
+        so it can be passed to the backend as is. Copy it to keep a
+        pointer that doesn't move with the Cursor.
+        """
+        return self._ptr
     @_dbptr.setter
     def _dbptr(self, value):
-        self._database, self._table, self._field, self._record = value
+        self._ptr[:] = value
     
     @property
     def rownumber(self):
         return self._record
         
     def __iter__(self):
-        """Generator, yields a row from 0 to rowcount"""
-        for self._record in xrange(self.rowcount):
-            yield self._fetch()
+        """
+        Generator, yields a row from 0 to rowcount
+
+        If PREFETCH is True, values are fetched in blocks starting at
+        'arraysize' rows, which grow while the time per row drops, up
+        to 'prefetch_bytes' worth of rows (by 'internal_size' of the
+        fields in 'description'). A subclass overriding '_fetch' but
+        not '_fetchblock' is iterated a row at a time, through '_fetch'.
+        """
+        if not self.PREFETCH or self._fetch_overridden():
+            for self._record in xrange(self.rowcount):
+                yield self._fetch()
+            return
+        nrows = self.rowcount
+        sizer = AdaptiveArraysize(self.arraysize, self._prefetch_rows())
+        start = 0
+        while start < nrows:
+            self._record = start
+            t0 = time.time()
+            block = self._fetchblock(sizer.size)
+            if not block:
+                return
+            sizer.update(len(block), time.time() - t0)
+            for row in block:
+                start += 1
+                self._record = start
+                yield row
+
+    @classmethod
+    def _fetch_overridden(cls):
+        """
+        Return bool of whether '_fetch' is overridden below the class
+        whose '_fetchblock' builds the rows, which would skip it
+        """
+        def owner(name):
+            for klass in cls.__mro__:
+                if name in vars(klass):
+                    return klass
+        fetch, fetchblock = owner('_fetch'), owner('_fetchblock')
+        return fetch is not fetchblock and issubclass(fetch, fetchblock)
+
+    def _fetchblock(self, size):
+        """Return list of up to 'size' rows from the pointer on"""
+        row_factory = self.row_factory
+        return [row_factory(self, values) for values in self._fill([], size)]
+
+    def _prefetch_rows(self):
+        """Return int of max rows in 'prefetch_bytes' for a prefetch block"""
+        row_bytes = sum(d[3] or 0 for d in self.description or [])
+        return max(1, self.prefetch_bytes // max(row_bytes, 1))
     
     @staticmethod
     def _convert_null(value, null):
@@ -190,6 +395,10 @@ class BaseCursor(object):
         """
         return self._executer(self)
 
+    def flush(self):
+        """Write any buffered changes, called by the Connection 'commit'"""
+        pass
+
     def executemany(self, operation, param_seq=[]):
         """Execute one command multiple times"""
         for params in param_seq:
@@ -227,7 +436,8 @@ class BaseCursor(object):
         
         Returns
         -------
-        list of tuples or row_factory-generated rows
+        list of tuples or row_factory-generated rows, or a
+        result_factory-generated container if set
 
         Notes
         -----
@@ -239,6 +449,8 @@ class BaseCursor(object):
         """
         if size is None:
             size = self.arraysize
+        if self.result_factory is not None:
+            return self._fill(self.result_factory(self), size)
         end = self.rownumber + size
         if end > self.rowcount:
             end = self.rowcount
@@ -250,10 +462,147 @@ class BaseCursor(object):
 
         Returns
         -------
-        list of tuples or row_factory-generated rows
+        list of tuples or row_factory-generated rows, or a
+        result_factory-generated container if set
         
         """
         return self.fetchmany(size=self.rowcount)
+
+    def _fill(self, result, size):
+        """
+        Append 'size' rows of values to a result container
+
+        Starts from the first record if the pointer is not on a row,
+        same as 'fetchone()'. The Connection lock is held for the block.
+        """
+        with self._lock:
+            if not 0 <= self.rownumber < self.rowcount:
+                self._record = 0
+            end = self.rownumber + size
+            if end > self.rowcount:
+                end = self.rowcount
+            for self._record in xrange(self.rownumber, end):
+                result.append(self._getrow())
+        return result
+
+    def fetchcolumns(self, size=None):
+        """
+        Return 'size' number of rows as a column-oriented ResultSet
+
+        Same as 'fetchmany()' with a ResultSet result_factory, and the
+        columnar fetch path for the DataFrame/export methods.
+        
+        """
+        if size is None:
+            size = self.arraysize
+        return self._fill(ResultSet(self), size)
+
+    def to_dataframe(self, chunksize=None):
+        """
+        Return the rest of the rows as a pandas DataFrame
+
+        Inputs
+        ------
+        chunksize : int of number of rows per DataFrame (None)
+
+        Returns
+        -------
+        pandas.DataFrame, or if 'chunksize' is given, a generator of
+        DataFrames of up to 'chunksize' rows
+
+        Notes
+        -----
+        DataFrames are built from the column buffers of 'fetchcolumns()',
+        numeric fields become numpy columns. If CONVERT_NULL is True,
+        NULLs are NaN (NaT) and if CONVERT_DATETIME is True, dbTIME
+        fields are datetime64 columns.
+
+        """
+        datetimes = self.CONVERT_DATETIME
+        if chunksize is None:
+            return self.fetchcolumns(self.rowcount).to_dataframe(datetimes)
+        return (result.to_dataframe(datetimes)
+                for result in self.iter_columns(chunksize))
+
+    def to_arrow(self, chunksize=None):
+        """
+        Return the rest of the rows as a pyarrow Table
+
+        Inputs
+        ------
+        chunksize : int of number of rows per RecordBatch (None)
+
+        Returns
+        -------
+        pyarrow.Table, or if 'chunksize' is given, a generator of
+        RecordBatches of up to 'chunksize' rows
+
+        Notes
+        -----
+        The schema is derived from 'description', see 'arrow_schema'.
+        If CONVERT_DATETIME is True, dbTIME fields are timestamps.
+
+        """
+        import pyarrow
+        schema = arrow_schema(self.description or [], self.CONVERT_DATETIME)
+        if chunksize is None:
+            batch = self.fetchcolumns(self.rowcount).to_arrow(schema)
+            return pyarrow.Table.from_batches([batch], schema=schema)
+        return (result.to_arrow(schema)
+                for result in self.iter_columns(chunksize))
+
+    def write_parquet(self, path, row_group_size=65536):
+        """
+        Write the rest of the rows to a Parquet file
+
+        Inputs
+        ------
+        path           : str of file name, or writable file object
+        row_group_size : int of number of rows per row group (65536)
+
+        Returns
+        -------
+        int of number of rows written
+
+        Notes
+        -----
+        Rows are fetched one row group at a time, so memory use is
+        bounded by 'row_group_size' regardless of the view size.
+
+        """
+        import pyarrow
+        import pyarrow.parquet
+        schema = arrow_schema(self.description or [], self.CONVERT_DATETIME)
+        nrows = 0
+        writer = pyarrow.parquet.ParquetWriter(path, schema)
+        try:
+            for batch in self.to_arrow(chunksize=row_group_size):
+                writer.write_table(pyarrow.Table.from_batches([batch]))
+                nrows += batch.num_rows
+        finally:
+            writer.close()
+        return nrows
+
+    def iter_columns(self, size=None):
+        """
+        Generator, yields column-oriented ResultSets of the rest of the rows
+
+        Inputs
+        ------
+        size : int of number of rows per ResultSet (arraysize)
+
+        Notes
+        -----
+        Each ResultSet is a 'fetchcolumns(size)', for processing a view of
+        any size a block of columns at a time (see curds2.export).
+
+        """
+        if size is None:
+            size = self.arraysize
+        if not 0 <= self.rownumber < self.rowcount:
+            self._record = 0
+        while self.rownumber < self.rowcount:
+            yield self.fetchcolumns(size)
         
     def scroll(self, value, mode='relative'):
         """
@@ -285,10 +634,14 @@ class BaseConnection(object):
     Base Connection class with generic methods/constructor
     """
     _database = None
+    _lock = NullLock()
+    _cursors = None     # WeakSet of Cursors made by this Connection
     dsn = None
+    description_cache = None    # DescriptionCache, made on first use
 
     cursor_factory = None
     row_factory  = BaseRow
+    result_factory = None
     CONVERT_NULL = False
     CONVERT_DATETIME = False
     
@@ -317,10 +670,30 @@ class BaseConnection(object):
 
     def __exit__(self, exc_type, exc_value, trackback):
         if self.is_open():
+            if exc_type is None:
+                self.commit()
             self.close()
     
+    def _descriptions(self):
+        """Return the DescriptionCache shared by Cursors of this Connection"""
+        with self._lock:
+            if self.description_cache is None:
+                self.description_cache = DescriptionCache()
+            return self.description_cache
+
+    def _add_cursor(self, cursor):
+        """Keep a weak reference to a Cursor for 'commit'"""
+        with self._lock:
+            if self._cursors is None:
+                self._cursors = weakref.WeakSet()
+            self._cursors.add(cursor)
+
     def commit(self):
-        pass
+        """Flush buffered changes of all Cursors of this Connection"""
+        with self._lock:
+            cursors = list(self._cursors or [])
+        for curs in cursors:
+            curs.flush()
 
     def cursor(self, **kwargs):
         return self.cursor_factory(connection=self, **kwargs)
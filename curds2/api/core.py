@@ -7,7 +7,7 @@ import logging
 
 # DBAPI top level attributes
 apilevel     = "2.0"      # 1.0 or 2.0
-threadsafety = 0          # Playing it safe (datascope??)
+threadsafety = 2          # Threads share module and Connections, not Cursors
 paramstyle   = "format"   # N/A right now, execute uses Dbptr API
 
 
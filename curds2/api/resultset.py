@@ -0,0 +1,238 @@
+#
+"""
+Column-oriented result container for the fetch* methods
+
+Use like this:
+>>> cursor.result_factory = ResultSet
+>>> rs = cursor.fetchall()
+>>> rs['time']          # column buffer
+>>> rs[0]               # row built by the cursor row_factory
+>>> df = rs.to_dataframe()
+
+"""
+import array
+import collections
+import numbers
+
+# Shim in hardcoded Datascope types, as in curds2.ws.dbapi2
+dbBOOLEAN = 1
+dbINTEGER = 2
+dbREAL = 3
+dbTIME = 4
+dbYEARDAY = 5
+
+# Datascope field type codes -> array typecodes. Other types (strings,
+# dbptrs) are stored in plain lists.
+ARRAY_TYPECODES = {
+    dbBOOLEAN: 'l',
+    dbINTEGER: 'l',
+    dbREAL: 'd',
+    dbTIME: 'd',
+    dbYEARDAY: 'l',
+}
+
+# Datascope field type codes -> pyarrow type factories. Other types are
+# stored as strings.
+ARROW_TYPES = {
+    dbBOOLEAN: 'int64',
+    dbINTEGER: 'int64',
+    dbREAL: 'float64',
+    dbTIME: 'float64',
+    dbYEARDAY: 'int64',
+}
+
+
+def _column(type_code):
+    """Return an empty column buffer for a Datascope type code"""
+    typecode = ARRAY_TYPECODES.get(type_code)
+    if typecode is None:
+        return []
+    return array.array(typecode)
+
+
+def arrow_schema(description, datetimes=False):
+    """
+    Return a pyarrow schema for a cursor 'description'
+
+    Inputs
+    ------
+    description : sequence of 7-item sequences
+    datetimes   : bool of whether dbTIME fields are timestamps (False)
+
+    Notes
+    -----
+    Periods in names (i.e. 'assoc.orid' of a join) are replaced with
+    underscores, as in NamedTupleRow, since Parquet and Arrow tools take
+    a dotted name for a nested column.
+    """
+    import pyarrow
+    fields = []
+    for d in description:
+        name, type_code = d[0].replace('.', '_'), d[1]
+        if datetimes and type_code == dbTIME:
+            type_ = pyarrow.timestamp('us')
+        else:
+            type_ = getattr(pyarrow, ARROW_TYPES.get(type_code, 'string'))()
+        fields.append(pyarrow.field(name, type_))
+    return pyarrow.schema(fields)
+
+
+class ResultSet(object):
+    """
+    Rows stored by column, in typed array.array buffers where possible
+
+    Row objects are only built by the row_factory on indexing or
+    iteration, so a result of floats costs 8 bytes per value instead of
+    a python object in a tuple.
+
+    Constructor
+    -----------
+    ResultSet(cursor) : uses the cursor 'description' and 'row_factory'
+
+    Notes
+    -----
+    Columns fall back to a plain list the first time a value does not
+    fit the typed buffer (NULLs as None, converted datetimes, etc).
+
+    The row_factory is called with the ResultSet in place of the cursor,
+    which carries the 'description' the rows were fetched with.
+
+    """
+    def __init__(self, cursor, columns=None):
+        self.description = [tuple(d) for d in cursor.description or []]
+        self.row_factory = cursor.row_factory
+        self._names = dict((d[0], n) for n, d in enumerate(self.description))
+        if columns is None:
+            columns = [_column(d[1]) for d in self.description]
+        self._columns = columns
+
+    @property
+    def names(self):
+        """List of column names"""
+        return [d[0] for d in self.description]
+
+    def append(self, row):
+        """Add a sequence of values as the last row"""
+        columns = self._columns
+        for n, value in enumerate(row):
+            try:
+                columns[n].append(value)
+            except (TypeError, OverflowError):
+                columns[n] = list(columns[n])
+                columns[n].append(value)
+
+    def column(self, name):
+        """Return the buffer holding column 'name'"""
+        return self._columns[self._names[name]]
+
+    def __len__(self):
+        if not self._columns:
+            return 0
+        return len(self._columns[0])
+
+    def __getitem__(self, key):
+        """
+        Index by row number, slice or column name
+
+        Returns a row, a new ResultSet, or a column buffer
+        """
+        if isinstance(key, slice):
+            return self.__class__(self, [c[key] for c in self._columns])
+        if key in self._names:
+            return self.column(key)
+        return self.row_factory(self, [c[key] for c in self._columns])
+
+    def __iter__(self):
+        for n in xrange(len(self)):
+            yield self[n]
+
+    def tolist(self):
+        """Return all rows as a list"""
+        return list(self)
+
+    def to_numpy(self, name):
+        """
+        Return column 'name' as a numpy array
+
+        Typed columns share memory with the array buffer, so don't
+        append to the ResultSet while the numpy array is in use.
+        """
+        return self._numpy(self.column(name))
+
+    @staticmethod
+    def _numpy(col):
+        import numpy
+        if isinstance(col, array.array):
+            if not col:
+                return numpy.array([], dtype=col.typecode)
+            return numpy.frombuffer(col, dtype=col.typecode)
+        if hasattr(col, '__array__'):
+            return numpy.asarray(col)
+        return numpy.array(col)
+
+    def to_dataframe(self, datetimes=False):
+        """
+        Return a pandas DataFrame of the result
+
+        Column buffers are handed to pandas as numpy views, with no
+        intermediate rows.
+
+        Inputs
+        ------
+        datetimes : bool of whether dbTIME fields become datetime64 (False)
+
+        Notes
+        -----
+        Numeric fields holding NULLs as None are NaN, dbTIME fields are
+        NaT for NULLs or times outside the datetime64 range.
+        """
+        import pandas
+        data = collections.OrderedDict()
+        for d, col in zip(self.description, self._columns):
+            name, type_code = d[0], d[1]
+            values = self._numpy(col)
+            if type_code in ARRAY_TYPECODES and values.dtype == object and \
+                    all(v is None or isinstance(v, numbers.Number)
+                        for v in values):
+                values = pandas.to_numeric(values, errors='coerce')
+            if datetimes and type_code == dbTIME:
+                if values.dtype.kind == 'f':
+                    values = pandas.to_datetime(values, unit='s',
+                                                errors='coerce')
+                else:
+                    values = pandas.to_datetime(values, errors='coerce')
+            data[name] = values
+        return pandas.DataFrame(data, columns=self.names, copy=False)
+
+    def to_arrow(self, schema=None, datetimes=False):
+        """
+        Return a pyarrow RecordBatch of the result
+
+        Inputs
+        ------
+        schema    : pyarrow.Schema to use, from 'arrow_schema' (None)
+        datetimes : bool of whether dbTIME fields are timestamps (False)
+
+        Notes
+        -----
+        Typed column buffers are handed to pyarrow as numpy views, NULLs
+        as None become Arrow nulls.
+        """
+        import pyarrow
+        if schema is None:
+            schema = arrow_schema(self.description, datetimes)
+        arrays = []
+        for n, field in enumerate(schema):
+            col = self._columns[n]
+            timestamps = pyarrow.types.is_timestamp(field.type)
+            if isinstance(col, array.array) or hasattr(col, '__array__'):
+                values = self._numpy(col)
+                if timestamps:
+                    values = (values * 1e6).round().astype('int64')
+            elif timestamps:
+                values = [int(round(v * 1e6)) if isinstance(v, float) else v
+                          for v in col]
+            else:
+                values = col
+            arrays.append(pyarrow.array(values, type=field.type))
+        return pyarrow.RecordBatch.from_arrays(arrays, schema=schema)
@@ -0,0 +1,185 @@
+#
+"""
+curds2.cache
+
+Change detection for the table files behind a Connection, for caches of
+schemas, views or results to know when to throw things out.
+
+Each table has a version number which goes up when its file changes.
+Changes are found with inotify where available, or else by comparing
+os.stat signatures (mtime, size, inode) at most every 'interval' seconds,
+so checking a version is cheap enough to do on every call.
+
+Use like this:
+>>> watcher = watch(conn, tables=['origin', 'arrival'])
+>>> v = watcher.version('origin')
+>>> ...
+>>> if watcher.version('origin') != v:
+...     # origin changed, drop anything cached from it
+
+"""
+import json
+import os
+import threading
+import time
+
+from curds2 import inotify
+from curds2.raw.dbapi2 import ds, _query
+
+
+def table_paths(dbptr, tables=None):
+    """
+    Return dict of table name -> path of table file
+
+    Inputs
+    ------
+    dbptr  : database pointer (list)
+    tables : list of str of table names (None for all schema tables)
+
+    """
+    if tables is None:
+        tables = _query(dbptr, ds.dbSCHEMA_TABLES)
+    paths = {}
+    for table in tables:
+        ptr = ds._dblookup(dbptr, '', table, '', '')
+        paths[table] = os.path.join(_query(ptr, ds.dbTABLE_DIR),
+                                    _query(ptr, ds.dbTABLE_FILENAME))
+    return paths
+
+
+def _signature(path):
+    """Return (mtime, size, inode) of a file, None if it doesn't exist"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size, st.st_ino)
+
+
+def read_sidecar(path):
+    """Return dict of a JSON sidecar file, empty if missing or unreadable"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_sidecar(path, data):
+    """
+    Replace a JSON sidecar file with dict 'data'
+
+    Returns bool of whether it was written, i.e. False in a read-only
+    directory, where summaries are just made again on the next call.
+    """
+    tmp = '{0}.{1}'.format(path, os.getpid())
+    try:
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp, path)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+class TableWatcher(object):
+    """
+    Monotonic version numbers for a set of table files
+
+    Constructor
+    -----------
+    TableWatcher(paths, **kwargs) : dict of table name -> file path
+
+    Attributes
+    ----------
+    interval : float of min seconds between stat checks (1.0)
+    INOTIFY  : bool of whether to use inotify where available (True)
+
+    """
+    interval = 1.0
+    INOTIFY = True
+
+    def __init__(self, paths, **kwargs):
+        for k, v in kwargs.items():
+            if hasattr(self, k):
+                self.__setattr__(k, v)
+        self._lock = threading.Lock()
+        self._paths = dict((t, os.path.abspath(p)) for t, p in paths.items())
+        self._tables = dict((p, t) for t, p in self._paths.items())
+        self._versions = dict((t, 0) for t in self._paths)
+        self._signatures = dict((t, _signature(p))
+                                for t, p in self._paths.items())
+        self._checked = time.time()
+        self._notify = None
+        if self.INOTIFY and inotify.available():
+            self._notify = inotify.Inotify()
+            for d in set(os.path.dirname(p) for p in self._paths.values()):
+                if os.path.isdir(d):
+                    self._notify.add_watch(d)
+
+    def _bump(self, table):
+        self._versions[table] += 1
+
+    def check(self):
+        """
+        Look for changed table files, update their versions
+
+        If inotify events were lost, all the versions are updated.
+        """
+        with self._lock:
+            if self._notify is not None:
+                changed = self._notify.read(0)
+                while changed:
+                    if inotify.OVERFLOW in changed:
+                        changed = self._paths.values()
+                    for path in changed:
+                        if path in self._tables:
+                            self._bump(self._tables[path])
+                    changed = self._notify.read(0)
+                return
+            now = time.time()
+            if now - self._checked < self.interval:
+                return
+            self._checked = now
+            for table, path in self._paths.items():
+                signature = _signature(path)
+                if signature != self._signatures[table]:
+                    self._signatures[table] = signature
+                    self._bump(table)
+
+    def version(self, table):
+        """Return int of version of 'table', higher after any change"""
+        self.check()
+        return self._versions[table]
+
+    def versions(self):
+        """Return dict of table name -> version"""
+        self.check()
+        return dict(self._versions)
+
+    def close(self):
+        if self._notify is not None:
+            self._notify.close()
+            self._notify = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def watch(connection, tables=None, **kwargs):
+    """
+    Return a TableWatcher for the table files of an open Connection
+
+    Inputs
+    ------
+    connection : curds2 raw or Dbptr Connection
+    tables     : list of str of table names (None for all schema tables)
+    **kwargs   : TableWatcher attributes
+
+    """
+    with connection._lock:
+        paths = table_paths(connection._dbptr, tables)
+    return TableWatcher(paths, **kwargs)
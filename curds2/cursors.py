@@ -2,20 +2,37 @@
 """
 curds2.cursors
 """
+import os
+import time
+
+from curds2 import inotify
+from curds2.api.base import NullLock
+from curds2.cache import table_paths
 from curds2.dbapi2 import Cursor, ds
-from curds2.raw.dbapi2 import _select, _query
+from curds2.raw.dbapi2 import _select, _query, Cursor as RawCursor, \
+                              _Executer as _RawExecuter
 
 
 class RowPointerDict(dict):
     """
     Row class to map db fields to dict keys
+
+    Calls to the database hold 'lock', the Connection lock of the Cursor
+
+    If a 'cursor' is given, field assignments are buffered and written
+    with one _dbputv on 'flush', which the Cursor calls (see
+    InteractiveCursor.BUFFER_WRITES)
     """
-    __slots__ = ['_dbptr', '_tbl', '_keys']
+    __slots__ = ['_dbptr', '_tbl', '_keys', '_lock', '_cursor', '_pending']
 
-    def __init__(self, db=None, keys=[]):
+    def __init__(self, db=None, keys=[], lock=None, cursor=None):
         self._dbptr = db
-        self._tbl = _query(self._dbptr, ds.dbTABLE_NAME)
+        self._lock = lock or NullLock()
+        with self._lock:
+            self._tbl = _query(self._dbptr, ds.dbTABLE_NAME)
         self._keys = keys
+        self._cursor = cursor
+        self._pending = {}
     
     def __contains__(self, k):
         """
@@ -27,20 +44,52 @@ class RowPointerDict(dict):
             return False
 
     def __getitem__(self, key):
-        return _select(self._dbptr, self._tbl, key)[0]
+        if key in self._pending:
+            return self._pending[key]
+        with self._lock:
+            return _select(self._dbptr, self._tbl, key)[0]
 
     def __setitem__(self, key, value):
-        ds._dbputv(self._dbptr, self._tbl, key, value)
+        if self._cursor is not None:
+            self._buffer([(key, value)])
+            return
+        with self._lock:
+            ds._dbputv(self._dbptr, self._tbl, key, value)
 
     def __len__(self):
-        return _query(self._dbptr, ds.dbRECORD_COUNT)
+        with self._lock:
+            return _query(self._dbptr, ds.dbRECORD_COUNT)
 
     def update(self, dict_):
+        if self._cursor is not None:
+            self._buffer([i for i in dict_.items() if self.__contains__(i[0])])
+            return
         args = []
         for i in dict_.items():
             if self.__contains__(i[0]):
                 args.extend(i)
-        ds._dbputv(self._dbptr, self._tbl, *args)
+        with self._lock:
+            ds._dbputv(self._dbptr, self._tbl, *args)
+
+    def _buffer(self, items):
+        """Hold field values until flush, register with Cursor if new"""
+        if not items:
+            return
+        dirty = bool(self._pending)
+        self._pending.update(items)
+        if not dirty:
+            self._cursor._dirty(self)
+
+    def flush(self):
+        """Write buffered field values with one _dbputv"""
+        if not self._pending:
+            return
+        args = []
+        for i in self._pending.items():
+            args.extend(i)
+        with self._lock:
+            ds._dbputv(self._dbptr, self._tbl, *args)
+        self._pending = {}
 
     def keys(self):
         return self._keys
@@ -62,10 +111,52 @@ class InteractiveCursor(Cursor):
     """
     Cursor class that returns non-standard interactive rows which point
     to rows in the database and contain no data
+
+    Additional attributes
+    ---------------------
+    BUFFER_WRITES : bool of whether to hold field assignments to rows and
+                    write all changed fields of a row in one _dbputv
+    buffer_size   : int of max rows with held writes before a flush (100)
+
+    Held writes are flushed when the Cursor moves on to another row, when
+    'buffer_size' rows are waiting, on 'flush()', or on the Connection
+    'commit()'. Rows hold no values, so iteration goes a row at a time.
     """
+    BUFFER_WRITES = False
+    buffer_size = 100
+
+    def __init__(self, *args, **kwargs):
+        super(InteractiveCursor, self).__init__(*args, **kwargs)
+        self._dirty_rows = []
+
+    def _dirty(self, row):
+        """Register a row with held writes"""
+        self._dirty_rows.append(row)
+        if len(self._dirty_rows) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Write held field assignments, one _dbputv per row
+
+        If a write fails, the rows not yet written stay held.
+        """
+        rows, self._dirty_rows = self._dirty_rows, []
+        done = 0
+        try:
+            for row in rows:
+                row.flush()
+                done += 1
+        finally:
+            self._dirty_rows[:0] = rows[done:]
+
     def _fetch(self):
+        if self._dirty_rows:
+            self.flush()
         k = [d[0] for d in self.description]
-        row = RowPointerDict(self._dbptr, keys=k)
+        cursor = self if self.BUFFER_WRITES else None
+        row = RowPointerDict(list(self._dbptr), keys=k, lock=self._lock,
+                             cursor=cursor)
         self._record += 1
         return row
 
@@ -75,3 +166,172 @@ class InteractiveCursor(Cursor):
         newrow = self.fetchone()
         newrow.update(row)
         
+
+
+class _TailExecuter(_RawExecuter):
+    """
+    Executer which remembers the last operation that set the pointer
+    """
+    def execute(self, operation, *args):
+        start = list(self.cursor._dbptr)
+        result = super(_TailExecuter, self).execute(operation, *args)
+        if self.cursor._dbptr != start:
+            self.cursor._replay = (start, operation, args)
+            self.cursor.mark  # start counting from here
+        return result
+
+
+class TailCursor(RawCursor):
+    """
+    Raw Cursor which yields only records appended since it last looked
+
+    The last operation run through 'execute' (i.e. a dblookup or a
+    dbprocess) is re-run to refresh the view, and records past the count
+    seen before are new. The count is kept per table (or view operation),
+    starting at the count when the table is first executed.
+
+    Views must keep table order for this, i.e. lookups and subsets, but
+    not sorts or joins on tables other than the one being appended.
+
+    Additional attributes
+    ---------------------
+    interval : float of max seconds between polls when waiting (1.0)
+    INOTIFY  : bool of whether to wait on inotify events for the table
+               files rather than sleeping, where available (True)
+
+    Use like this:
+    >>> curs = connect(dbname, cursor_factory=TailCursor).cursor()
+    >>> nrecs = curs.execute('dblookup', ('', 'origin', '', ''))
+    >>> for row in curs.tail():
+    ...     process(row)
+
+    """
+    _executer = _TailExecuter
+    interval = 1.0
+    INOTIFY = True
+
+    def __init__(self, *args, **kwargs):
+        super(TailCursor, self).__init__(*args, **kwargs)
+        self._replay = None
+        self._marks = {}
+        self._notify = None
+
+    def _key(self):
+        """Key of the mark for the current table or view"""
+        if self._replay is not None:
+            start, operation, args = self._replay
+            return (operation, repr(args))
+        with self._lock:
+            return _query(self._dbptr, ds.dbTABLE_NAME)
+
+    @property
+    def mark(self):
+        """Number of records already seen in the current table"""
+        key = self._key()
+        if key not in self._marks:
+            self._marks[key] = self.rowcount
+        return self._marks[key]
+
+    @mark.setter
+    def mark(self, value):
+        self._marks[self._key()] = value
+
+    def refresh(self):
+        """Re-run the last operation to pick up appended records"""
+        if self._replay is None:
+            return self.rowcount
+        start, operation, args = self._replay
+        old = list(self._dbptr)
+        self._dbptr = start
+        nrecs = self.execute(operation, args)
+        with self._lock:
+            if old != self._dbptr and _query(old, ds.dbTABLE_IS_VIEW):
+                ds._dbfree(old)
+        return nrecs
+
+    def poll(self):
+        """Refresh, return int of number of new records"""
+        mark = self.mark
+        return max(self.refresh() - mark, 0)
+
+    def fetchnew(self):
+        """
+        Return new records since the mark and move the mark past them
+
+        Returns
+        -------
+        list of tuples or row_factory-generated rows, or a
+        result_factory-generated container if set
+
+        """
+        mark = self.mark
+        nrecs = self.rowcount
+        if nrecs <= mark:
+            return []
+        self._record = mark
+        rows = self.fetchmany(nrecs - mark)
+        self.mark = nrecs
+        return rows
+
+    def _table_files(self):
+        """Return list of paths of the table files behind the view"""
+        with self._lock:
+            if _query(self._dbptr, ds.dbTABLE_IS_VIEW):
+                tables = _query(self._dbptr, ds.dbVIEW_TABLES)
+            else:
+                tables = [_query(self._dbptr, ds.dbTABLE_NAME)]
+            return table_paths(self._dbptr, tables).values()
+
+    def _sleep(self, seconds):
+        """Wait up to 'seconds', returning early if a table file changes"""
+        if not (self.INOTIFY and inotify.available()):
+            time.sleep(seconds)
+            return
+        if self._notify is None:
+            self._notify = inotify.Inotify()
+            for d in set(os.path.dirname(p) for p in self._table_files()):
+                self._notify.add_watch(d)
+        self._notify.read(seconds)
+
+    def wait_for_new(self, timeout=None):
+        """
+        Block until new records are appended
+
+        Inputs
+        ------
+        timeout : float of max seconds to wait (None waits forever)
+
+        Returns
+        -------
+        int of number of new records, 0 if none before the timeout
+
+        """
+        if timeout is not None:
+            deadline = time.time() + timeout
+        while True:
+            nnew = self.poll()
+            if nnew:
+                return nnew
+            wait = self.interval
+            if timeout is not None:
+                wait = min(wait, deadline - time.time())
+                if wait <= 0:
+                    return 0
+            self._sleep(wait)
+
+    def tail(self, timeout=None):
+        """
+        Generator, yields new rows as they are appended
+
+        Stops when no new records arrive within 'timeout' seconds, or
+        never if None
+        """
+        while self.wait_for_new(timeout):
+            for row in self.fetchnew():
+                yield row
+
+    def close(self):
+        if self._notify is not None:
+            self._notify.close()
+            self._notify = None
+        super(TailCursor, self).close()
@@ -16,8 +16,7 @@ So any commands sent through 'execute' should be Dbptr methods, rather than
 from curds2.api.core import *
 from curds2.raw.dbapi2 import (
     ds, Connection as RawConnection, Cursor as RawCursor, BaseExecuter,
-    STRING, BINARY, NUMBER, DATETIME, ROWID)
-from antelope.datascope import Dbptr
+    STRING, BINARY, NUMBER, DATETIME, ROWID, threadsafety)
 
 
 class _Executer(BaseExecuter):
@@ -41,21 +40,23 @@ class _Executer(BaseExecuter):
         """
         Based on original execute function
         """
+        from antelope.datascope import Dbptr  # deferred, slow to import
         dbptr = Dbptr(self.cursor._dbptr)
         if not hasattr(dbptr, operation):
             raise ProgrammingError("No such command available: " + operation)
         proc = getattr(dbptr, operation)
-        result = proc(*args, **kwargs) 
+        with self.cursor._lock:
+            result = proc(*args, **kwargs) 
         
-        # Return depends on result
-        if isinstance(result, Dbptr):
-            ptr = self._raw(result)
-            if ds.dbINVALID in ptr:
-                raise DatabaseError("Invalid value in pointer: {0}".format(ptr))
-            self.cursor._dbptr = ptr
-            return self.cursor.rowcount
-        else:
-            return result
+            # Return depends on result
+            if isinstance(result, Dbptr):
+                ptr = self._raw(result)
+                if ds.dbINVALID in ptr:
+                    raise DatabaseError("Invalid value in pointer: {0}".format(ptr))
+                self.cursor._dbptr = ptr
+                return self.cursor.rowcount
+            else:
+                return result
 
 
 class Cursor(RawCursor):
@@ -75,6 +76,7 @@ class Cursor(RawCursor):
     CONVERT_NULL : bool of whether to try and change Nulls to None
     CONVERT_DATETIME : bool of whether to convert timestamps to datetimes
     row_factory  : function handle to build more complex rows
+    result_factory : class to build fetchmany/fetchall results (list)
     
     Methods (DBAPI standard)
     -------
@@ -0,0 +1,111 @@
+#
+"""
+curds2.export
+
+Bulk export of a Cursor view to delimited text files
+
+Rows are fetched in chunks through the columnar 'fetchcolumns' path and
+formatted column by column with a formatter chosen once per field from
+the 'description' type codes, so at most one chunk is held in memory.
+
+Use like this:
+>>> with open('origin.csv', 'wb') as f:
+...     nrows = export_csv(curs, f, fields=['orid', 'time', 'ml'])
+
+"""
+import csv
+import re
+from itertools import izip
+
+from curds2.api.resultset import dbBOOLEAN, dbINTEGER, dbREAL, dbTIME, \
+                                 dbYEARDAY
+
+CHUNK = 10000
+
+# Datascope field format, i.e. '%17.5f', '%8ld', '%-15s'
+_FIELD_FORMAT = re.compile(r'%[-+ #0]*\d*(\.\d+)?l?([a-zA-Z])')
+
+
+def _format_string(type_code, field_format=None):
+    """
+    Return a %-format string for a Datascope field type
+
+    Times are written at fixed precision, reals at the precision of the
+    field format (without padding), falling back to repr.
+    """
+    if type_code == dbTIME:
+        return '%.5f'
+    if type_code in (dbBOOLEAN, dbINTEGER, dbYEARDAY):
+        return '%d'
+    if type_code == dbREAL:
+        match = _FIELD_FORMAT.match(field_format or '')
+        if match and match.group(2) in 'feEgG':
+            return '%' + (match.group(1) or '') + match.group(2)
+        return '%r'
+    return '%s'
+
+
+def formatter(type_code, field_format=None):
+    """
+    Return a function formatting values of a Datascope field as str
+
+    NULLs as None are empty strings, values not matching the type
+    (i.e. converted datetimes) use 'str'.
+    """
+    fmt = _format_string(type_code, field_format)
+
+    def _format(value):
+        if value is None:
+            return ''
+        try:
+            return fmt % value
+        except TypeError:
+            return str(value)
+    return _format
+
+
+def export_csv(cursor, fileobj, fields=None, chunk=CHUNK, delimiter=',',
+               header=True):
+    """
+    Write the rest of the rows of a cursor as delimited text
+
+    Inputs
+    ------
+    cursor    : curds2 Cursor with a view to export
+    fileobj   : file-like object to write to
+    fields    : list of str of field names to export (None for all)
+    chunk     : int of number of rows fetched at a time (10000)
+    delimiter : str of field delimiter (',')
+    header    : bool of whether to write a row of field names (True)
+
+    Returns
+    -------
+    int of number of rows written
+
+    """
+    description = cursor.description
+    if fields is None:
+        fields = [d[0] for d in description]
+    desc = dict((d[0], d) for d in description)
+    formatters = [formatter(desc[f][1], desc[f][4]) for f in fields]
+
+    writer = csv.writer(fileobj, delimiter=delimiter, lineterminator='\n')
+    if header:
+        writer.writerow(fields)
+    nrows = 0
+    for result in cursor.iter_columns(chunk):
+        columns = [map(fmt, result.column(f))
+                   for f, fmt in izip(fields, formatters)]
+        writer.writerows(izip(*columns))
+        nrows += len(result)
+    return nrows
+
+
+def export_tsv(cursor, fileobj, fields=None, chunk=CHUNK, header=True):
+    """
+    Write the rest of the rows of a cursor as tab-separated text
+
+    See 'export_csv'
+    """
+    return export_csv(cursor, fileobj, fields=fields, chunk=chunk,
+                      delimiter='\t', header=header)
@@ -0,0 +1,227 @@
+#
+"""
+curds2.index -- zone maps of table files, to skip blocks on range subsets
+
+A zone map keeps the min and max of each numeric and time field for
+every block of BLOCK records of a table, in a sidecar file next to the
+table file ('<dbname>.<table>.curds-index'). A range subset only reads
+the blocks whose [min, max] overlaps the range, so a query on an hour
+of a year-long arrival table reads a few blocks instead of the file.
+
+Build the zone maps of a database once (and again after it changes):
+
+    python -m curds2.index build <dbname> [table ...]
+
+and read a range through a raw Cursor on a table:
+
+>>> curs.execute('dblookup', ('', 'arrival', '', ''))
+>>> for row in subset(curs, 'time', t0, t1):
+...     # rows with t0 <= time <= t1
+
+A zone map is only used while the table file has the size, mtime and
+inode it was built from, else all the records are read.
+"""
+import os
+import sys
+
+import curds2.raw.dbapi2
+from curds2.api.resultset import ResultSet, dbINTEGER, dbREAL, dbTIME, \
+                                 dbYEARDAY
+from curds2.cache import table_paths, read_sidecar, write_sidecar, \
+                         _signature
+from curds2.raw.dbapi2 import ds, _query, _select
+
+BLOCK = 4096
+SIDECAR = '.curds-index'
+ZONE_TYPES = (dbINTEGER, dbREAL, dbTIME, dbYEARDAY)
+
+
+class ZoneMap(object):
+    """
+    Per-block min/max of the numeric fields of a table file
+
+    Attributes
+    ----------
+    path      : str of table file
+    signature : list of (mtime, size, inode) of the table file
+    nrecs     : int of number of records
+    block     : int of number of records per block
+    zones     : dict of field name -> list of [min, max] per block, None
+                for blocks with only NULLs
+
+    """
+    def __init__(self, path, signature, nrecs, block=BLOCK, zones=None):
+        self.path = path
+        self.signature = signature and list(signature)
+        self.nrecs = nrecs
+        self.block = block
+        self.zones = zones or {}
+
+    @classmethod
+    def load(cls, path):
+        """Return ZoneMap of a table file, None if none or out of date"""
+        data = read_sidecar(path + SIDECAR)
+        if not data:
+            return None
+        zonemap = cls(**data)
+        if not zonemap.valid():
+            return None
+        return zonemap
+
+    def save(self):
+        """Write the sidecar file, return bool of whether it was written"""
+        return write_sidecar(self.path + SIDECAR, self.__dict__)
+
+    def valid(self):
+        """Return bool of whether the table file is unchanged"""
+        signature = _signature(self.path)
+        return signature is not None and list(signature) == self.signature
+
+    def blocks(self, field, low, high):
+        """
+        Return list of [start, end) record ranges that may have values of
+        'field' in [low, high], all records if 'field' has no zones
+        """
+        if field not in self.zones:
+            return [[0, self.nrecs]]
+        ranges = []
+        for n, zone in enumerate(self.zones[field]):
+            if zone is None or zone[0] > high or zone[1] < low:
+                continue
+            start = n * self.block
+            end = min(start + self.block, self.nrecs)
+            if ranges and ranges[-1][1] == start:
+                ranges[-1][1] = end
+            else:
+                ranges.append([start, end])
+        return ranges
+
+
+def _zones(cursor, block):
+    """Return dict of field -> [min, max] per block of a Cursor's view"""
+    names = [d[0] for d in cursor.description if d[1] in ZONE_TYPES]
+    zones = dict((name, []) for name in names)
+    for result in cursor.iter_columns(block):
+        for name in names:
+            values = [v for v in result.column(name) if v is not None]
+            zones[name].append(values and [min(values), max(values)] or None)
+    return zones
+
+
+def build(dsn, tables=None, block=BLOCK):
+    """
+    Build and save the zone maps of the tables of a database
+
+    Inputs
+    ------
+    dsn    : str of database name
+    tables : list of str of table names (None for all with a table file)
+    block  : int of number of records per block (BLOCK)
+
+    Returns
+    -------
+    dict of table name -> ZoneMap
+
+    """
+    conn = curds2.raw.dbapi2.connect(dsn)
+    try:
+        with conn._lock:
+            paths = table_paths(conn._dbptr, tables)
+        if tables is None:
+            tables = sorted(t for t, p in paths.items() if os.path.exists(p))
+        curs = conn.cursor(CONVERT_NULL=True)
+        zonemaps = {}
+        for table in tables:
+            path = paths[table]
+            signature = _signature(path)
+            nrecs = curs.execute('dblookup', ('', table, '', ''))
+            zonemap = ZoneMap(path, signature, nrecs, block,
+                              _zones(curs, block))
+            zonemap.save()
+            zonemaps[table] = zonemap
+    finally:
+        conn.close()
+    return zonemaps
+
+
+def _ranges(cursor, field, low, high, zonemap=None):
+    """
+    Generator, yields values of the records of a Cursor's table with
+    'field' in [low, high], reading only blocks the zone map allows
+
+    The range is compared to the values as read, before the Cursor's
+    NULL and datetime conversions, and NULLs never match, as in the
+    zone maps.
+    """
+    with cursor._lock:
+        dbptr = cursor._dbptr
+        is_view = _query(dbptr, ds.dbTABLE_IS_VIEW)
+        if zonemap is None and not is_view:
+            table = _query(dbptr, ds.dbTABLE_NAME)
+            zonemap = ZoneMap.load(table_paths(dbptr, [table])[table])
+    nrecs = cursor.rowcount
+    if is_view or zonemap is None or zonemap.nrecs != nrecs:
+        ranges = [[0, nrecs]]
+    else:
+        ranges = zonemap.blocks(field, low, high)
+    index = [d[0] for d in cursor.description].index(field)
+    builder = cursor._builder()
+    with cursor._lock:
+        null = _select(cursor._nullptr, builder.table, field)[0]
+    for start, end in ranges:
+        for cursor._record in xrange(start, end):
+            values = cursor._getvalues(builder)
+            value = values[index]
+            if value != null and low <= value <= high:
+                yield builder.values(values)
+    cursor._record = nrecs
+
+
+def subset(cursor, field, low, high, zonemap=None):
+    """
+    Generator, yields rows of a raw Cursor on a table with 'field' in
+    [low, high], built by the Cursor 'row_factory'
+
+    Inputs
+    ------
+    cursor  : curds2.raw.dbapi2.Cursor on a table (i.e. after a dblookup)
+    field   : str of name of numeric or time field
+    low     : number of lowest value
+    high    : number of highest value
+    zonemap : ZoneMap of the table (None to load its sidecar)
+
+    Notes
+    -----
+    Views (subsets, joins, sorts) don't have the records of the table
+    file in order, so all their records are read.
+
+    """
+    row_factory = cursor.row_factory
+    for values in _ranges(cursor, field, low, high, zonemap):
+        yield row_factory(cursor, values)
+
+
+def subset_columns(cursor, field, low, high, zonemap=None):
+    """
+    Return ResultSet of the records of a raw Cursor on a table with
+    'field' in [low, high], see 'subset'
+    """
+    result = ResultSet(cursor)
+    for values in _ranges(cursor, field, low, high, zonemap):
+        result.append(values)
+    return result
+
+
+def main(argv=None):
+    """Command line: python -m curds2.index build <dbname> [table ...]"""
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2 or argv[0] != 'build':
+        sys.exit("Usage: python -m curds2.index build <dbname> [table ...]")
+    zonemaps = build(argv[1], argv[2:] or None)
+    for table, zonemap in sorted(zonemaps.items()):
+        print('{0}: {1} records, {2} fields'.format(
+            table, zonemap.nrecs, len(zonemap.zones)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+#
+"""
+curds2.inotify
+
+Minimal ctypes binding to Linux inotify, to wait for changes to table
+files without busy polling. On other platforms 'available()' is False
+and callers fall back to polling with os.stat.
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+
+# In the set from 'Inotify.read' when the event queue overflowed, so
+# changes to any of the watched files may have been missed
+OVERFLOW = None
+
+# Events on files in a watched directory that may change a table
+TABLE_EVENTS = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_TO |
+                IN_CREATE | IN_DELETE)
+
+_EVENT = struct.Struct('iIII')   # wd, mask, cookie, len
+_libc = None
+
+
+def _load():
+    """Return libc with inotify functions, or None"""
+    global _libc
+    if _libc is None:
+        _libc = False
+        if sys.platform.startswith('linux'):
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or
+                                   'libc.so.6', use_errno=True)
+                libc.inotify_init
+                _libc = libc
+            except (OSError, AttributeError):
+                pass
+    return _libc or None
+
+
+def available():
+    """Return bool of whether inotify can be used on this platform"""
+    return _load() is not None
+
+
+class Inotify(object):
+    """
+    Watch directories for changes to the files in them
+
+    Use like this:
+    >>> notify = Inotify()
+    >>> notify.add_watch('/data/db')
+    >>> changed = notify.read(timeout=5.0)   # set of changed file paths
+    >>> notify.close()
+
+    """
+    def __init__(self):
+        libc = _load()
+        if libc is None:
+            raise OSError(errno.ENOSYS, "inotify not available")
+        self._libc = libc
+        self.fd = libc.inotify_init()
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+        self._watches = {}   # wd -> directory
+
+    def add_watch(self, path, mask=TABLE_EVENTS):
+        """Watch directory 'path', return the watch descriptor"""
+        wd = self._libc.inotify_add_watch(self.fd, path, mask)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+        self._watches[wd] = path
+        return wd
+
+    def read(self, timeout=None):
+        """
+        Wait for events, return set of paths of changed files
+
+        Returns an empty set if nothing changed within 'timeout' seconds.
+        The set has OVERFLOW if events were dropped by the kernel.
+        """
+        ready = select.select([self.fd], [], [], timeout)[0]
+        if not ready:
+            return set()
+        data = os.read(self.fd, 65536)
+        paths = set()
+        pos = 0
+        while pos + _EVENT.size <= len(data):
+            wd, mask, cookie, length = _EVENT.unpack_from(data, pos)
+            pos += _EVENT.size
+            name = data[pos:pos + length].rstrip('\0')
+            pos += length
+            if mask & IN_Q_OVERFLOW:
+                paths.add(OVERFLOW)
+            elif wd in self._watches:
+                paths.add(os.path.join(self._watches[wd], name))
+        return paths
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,377 @@
+#
+"""
+curds2.multi -- run the same query over many Datascope databases
+
+A MultiConnection holds a list (or glob) of database names. Its Cursors
+'execute' an operation on each database, on a pool of worker threads,
+and iterate over the rows of all the results as one:
+
+>>> conn = connect('/data/db/day/db_2014_*')
+>>> curs = conn.cursor(order_by='time')
+>>> curs.execute('dbprocess', [['dbopen origin', 'dbsort time']])
+>>> for row in curs:
+...     # rows of every day, in time order
+
+Rows are read in blocks of 'blocksize' and handed over through bounded
+queues, so memory use does not grow with the number of databases or
+the size of the results.
+"""
+import glob
+import heapq
+import itertools
+import Queue
+import threading
+from multiprocessing.pool import ThreadPool
+
+from curds2.api.core import ProgrammingError, NotSupportedError
+from curds2.api.base import BaseConnection, BaseCursor
+import curds2.raw.dbapi2
+
+def _blocks(cursor, size):
+    """Generator, yields lists of up to 'size' rows of a Cursor to the end"""
+    nrows = cursor.rowcount
+    cursor._record = 0
+    while cursor._record < nrows:
+        block = cursor._fetchblock(size)
+        if not block:
+            return
+        yield block
+
+
+def _prefetched(pool, blocks):
+    """Generator, yields blocks while the next one is read on 'pool'"""
+    pending = pool.apply_async(next, (blocks, None))
+    while True:
+        block = pending.get()
+        if block is None:
+            return
+        pending = pool.apply_async(next, (blocks, None))
+        yield block
+
+
+def _sort_key(order_by, description):
+    """
+    Return function of a row for the merge order
+
+    'order_by' is a function of a row, or the str name of a field, for
+    rows that are sequences (tuples, namedtuples) or mappings.
+    """
+    if callable(order_by):
+        return order_by
+    names = [d[0] for d in description or []]
+    if order_by not in names:
+        raise ProgrammingError("No such field to order by: " + order_by)
+    index = names.index(order_by)
+
+    def key(row):
+        if isinstance(row, dict):
+            return row[order_by]
+        return row[index]
+    return key
+
+
+class MultiCursor(BaseCursor):
+    """
+    Cursor over the union of the results of many databases
+
+    Additional attributes
+    ---------------------
+    order_by  : str of field name, or function of a row, to k-way merge
+                the results on (None, rows come as results are ready)
+    blocksize : int of number of rows read from a database at a time
+
+    Notes
+    -----
+    The operation must return a view ('dbprocess', 'lookup', ...) on
+    every database, and the views should have the same fields. Rows are
+    built by the Cursors of each database, with this Cursor's
+    'row_factory' and CONVERT_* settings.
+
+    With 'order_by', each result must already be in that order (sort
+    in the operation) and all the databases are open until read to the
+    end. Without it, only 'workers' databases are open at once.
+
+    Like a streaming Cursor this one only goes forward: 'rowcount' is -1
+    until the last row is read, and 'scroll' is not supported.
+
+    """
+    _settings = ('CONVERT_NULL', 'CONVERT_DATETIME', 'row_factory')
+    _rowcount = 0
+    _rows = iter(())        # iterator of the rows of the current query
+    _pool = None            # ThreadPool of the current query
+    _stop = None            # Event set to stop its workers
+
+    description = None
+    order_by = None
+    blocksize = 1024
+
+    def __init__(self, *args, **kwargs):
+        """Constructor"""
+        super(MultiCursor, self).__init__(**kwargs)
+        self._connections = []  # Connections open for a merge
+
+        # Attributes
+        for k, v in kwargs.items():
+            if hasattr(self, k):
+                self.__setattr__(k, v)
+
+    @property
+    def rowcount(self):
+        if self._pool is not None:
+            return -1
+        return self._rowcount
+
+    def _getrow(self):
+        raise NotSupportedError("Rows of a MultiCursor only go forward")
+
+    def scroll(self, value, mode='relative'):
+        raise NotSupportedError("Rows of a MultiCursor only go forward")
+
+    def _open(self, dsn, operation, params):
+        """Open a database, return (Connection, Cursor) of the operation"""
+        conn = self.connection.connection_factory(dsn, self.connection.perm)
+        try:
+            settings = dict((s, getattr(self, s)) for s in self._settings)
+            curs = conn.cursor(**settings)
+            curs.execute(operation, params)
+        except Exception:
+            conn.close()
+            raise
+        return conn, curs
+
+    def _put(self, queue, item):
+        """Put 'item' on 'queue' unless stopped, return False if stopped"""
+        while not self._stop.is_set():
+            try:
+                queue.put(item, timeout=0.1)
+                return True
+            except Queue.Full:
+                pass
+        return False
+
+    def _work(self, dsns, lock, queue, operation, params):
+        """Run the operation on databases from 'dsns', queue their rows"""
+        try:
+            while not self._stop.is_set():
+                with lock:
+                    dsn = next(dsns, None)
+                if dsn is None:
+                    return
+                conn, curs = self._open(dsn, operation, params)
+                try:
+                    if not self._put(queue, ('description', curs.description)):
+                        return
+                    for block in _blocks(curs, self.blocksize):
+                        if not self._put(queue, ('rows', block)):
+                            return
+                finally:
+                    conn.close()
+        except Exception as e:
+            self._put(queue, ('error', e))
+        finally:
+            self._put(queue, ('done', None))
+
+    def _union(self, dsns, operation, params):
+        """Generator, yields the rows of all databases as they are read"""
+        workers = self.connection.workers
+        queue = Queue.Queue(2 * workers)
+        dsns, lock = iter(dsns), threading.Lock()
+        for n in range(workers):
+            self._pool.apply_async(self._work,
+                                   (dsns, lock, queue, operation, params))
+        running = workers
+        while running:
+            kind, value = queue.get()
+            if kind == 'rows':
+                for row in value:
+                    yield row
+            elif kind == 'description':
+                if self.description is None:
+                    self.description = value
+                yield None
+            elif kind == 'error':
+                raise value
+            else:
+                running -= 1
+
+    def _merge(self, dsns, operation, params):
+        """Generator, yields the rows of all databases merged in order"""
+        opening = [self._pool.apply_async(self._open,
+                                          (dsn, operation, params))
+                   for dsn in dsns]
+        cursors, error = [], None
+        for result in opening:
+            try:
+                conn, curs = result.get()
+            except Exception as e:
+                error = error or e
+                continue
+            self._connections.append(conn)
+            cursors.append(curs)
+        if error is not None:
+            raise error
+        if cursors:
+            self.description = cursors[0].description
+        yield None
+        key = _sort_key(self.order_by, self.description)
+
+        def keyed(n, conn, curs):
+            blocks = _prefetched(self._pool, _blocks(curs, self.blocksize))
+            for block in blocks:
+                for row in block:
+                    yield key(row), n, row
+            conn.close()
+            self._connections.remove(conn)
+
+        sources = [keyed(n, conn, curs) for n, (conn, curs) in
+                   enumerate(zip(list(self._connections), cursors))]
+        for k, n, row in heapq.merge(*sources):
+            yield row
+
+    def _iterrows(self, rows):
+        """Generator, yields rows, counting them and cleaning up at the end
+
+        'rows' may yield None when a result is ready, which is skipped
+        """
+        try:
+            for row in rows:
+                if row is not None:
+                    self._rowcount += 1
+                    self._record += 1
+                    yield row
+        finally:
+            self._finish()
+
+    def execute(self, operation, params=[]):
+        """
+        Execute an operation on every database
+
+        Inputs
+        ------
+        operation : str name of a Dbptr method
+        params    : sequence of parameters for the method
+
+        Returns
+        -------
+        int of -1, the number of rows is known once they are all read
+
+        Notes
+        -----
+        Returns once the first result is ready (or failed), which sets
+        'description'. Rows are read while the Cursor is iterated.
+
+        """
+        self.close()
+        self.description = None
+        self._rowcount = self._record = 0
+        self._stop = threading.Event()
+        self._pool = ThreadPool(self.connection.workers)
+        dsns = self.connection.dsns
+        if self.order_by is None:
+            rows = self._union(dsns, operation, params)
+        else:
+            rows = self._merge(dsns, operation, params)
+        try:
+            next(rows, None)    # up to the first result, for 'description'
+        except Exception:
+            self._finish()
+            raise
+        self._rows = self._iterrows(rows)
+        return self.rowcount
+
+    def __iter__(self):
+        """Generator, yields the rest of the rows"""
+        return self._rows
+
+    def fetchone(self):
+        return next(self._rows, None)
+
+    def _fetchrows(self, size):
+        """Return up to 'size' rows (None for the rest)"""
+        rows = itertools.islice(self._rows, size)
+        if self.result_factory is not None:
+            result = self.result_factory(self)
+            for row in rows:
+                result.append(row)
+            return result
+        return list(rows)
+
+    def fetchmany(self, size=None):
+        if size is None:
+            size = self.arraysize
+        return self._fetchrows(size)
+
+    def fetchall(self):
+        return self._fetchrows(None)
+
+    def _finish(self):
+        """Stop the workers of the current query, close its databases"""
+        if self._stop is not None:
+            self._stop.set()
+        if self._pool is not None:
+            self._pool.close()
+            if self._connections:
+                self._pool.join()   # for reads ahead on the databases
+            self._pool = None
+        for conn in self._connections:
+            conn.close()
+        self._connections = []
+
+    def close(self):
+        """Stop reading rows, close any open databases"""
+        rows, self._rows = self._rows, iter(())
+        if hasattr(rows, 'close'):
+            rows.close()
+        self._finish()
+
+
+class MultiConnection(BaseConnection):
+    """
+    Connection to a set of Datascope databases
+
+    Attributes
+    ----------
+    dsns               : list of str of database names
+    perm               : str of permission to open them with ('r')
+    workers            : int of number of worker threads (4)
+    connection_factory : function of (dsn, perm) returning a Connection
+                         (curds2.raw.dbapi2.connect)
+
+    """
+    cursor_factory = MultiCursor
+    connection_factory = staticmethod(curds2.raw.dbapi2.connect)
+    perm = 'r'
+    workers = 4
+
+    def __init__(self, dsns, **kwargs):
+        """
+        Inputs
+        ------
+        dsns : list of str of database names, or str of a glob pattern
+               matching database descriptor files
+
+        """
+        if isinstance(dsns, basestring):
+            pattern, dsns = dsns, sorted(glob.glob(dsns))
+            if not dsns:
+                raise ProgrammingError("No databases match: " + pattern)
+        super(MultiConnection, self).__init__(list(dsns), **kwargs)
+        self.dsns = self.dsn
+
+    def close(self):
+        """Close any open Cursors"""
+        for curs in list(self._cursors or []):
+            curs.close()
+
+
+def connect(dsns, perm='r', **kwargs):
+    """
+    Return a MultiConnection to a set of Datascope databases
+
+    Inputs
+    ------
+    dsns : list of str of database names, or str of a glob pattern
+    perm : str of permission - passed to Datascope API ('r')
+
+    """
+    return MultiConnection(dsns, perm=perm, **kwargs)
@@ -0,0 +1,169 @@
+#
+"""
+curds2.partition -- prune day-volume databases by a time range
+
+Archives are often kept as one database per day, named '..._YYYY_MM_DD'.
+For a query on a time range only the volumes that can have rows in it
+need to be opened:
+
+>>> conn = connect('/data/db/day/db_2014_*', start, end)
+>>> curs = conn.cursor(order_by='time')
+>>> curs.execute('dbprocess', [['dbopen origin', 'dbsort time',
+...     'dbsubset time >= {0} && time < {1}'.format(start, end)]])
+
+Volumes are pruned in two steps:
+
+1. By name, volumes whose day is more than 'margin' seconds from the
+   range are skipped without touching any file.
+2. By summary, the min and max of the time field of the table, kept in
+   a sidecar file next to the descriptor ('<dbname>.curds-range'). The
+   summary is checked against the table file's signature (mtime, size,
+   inode) and made again when the table changes, which opens the volume.
+
+"""
+import calendar
+import glob
+import re
+
+from curds2.api.core import ProgrammingError
+from curds2.cache import table_paths, read_sidecar, write_sidecar, \
+                         _signature
+from curds2.multi import MultiConnection
+import curds2.raw.dbapi2
+from curds2.raw.dbapi2 import ds, _query
+
+SIDECAR = '.curds-range'
+DAY = 86400.0
+
+_DAY_NAME = re.compile(r'_(\d{4})_(\d{2})_(\d{2})$')
+
+
+def day_range(dsn):
+    """Return (start, end) epoch seconds of the day in a volume name, or None"""
+    match = _DAY_NAME.search(dsn)
+    if match is None:
+        return None
+    start = float(calendar.timegm([int(g) for g in match.groups()] +
+                                  [0, 0, 0]))
+    return start, start + DAY
+
+
+def volumes(pattern):
+    """Return sorted list of day-volume descriptors matching a glob"""
+    return sorted(p for p in glob.glob(pattern) if day_range(p) is not None)
+
+
+def _eval(dbptr, expr):
+    """Evaluate a Datascope expression, 5.4 returns (retcode, value)"""
+    value = ds._dbex_eval(dbptr, expr)
+    if isinstance(value, tuple) and len(value) == 2:
+        if value[0]:
+            raise curds2.raw.dbapi2.DatabaseError(
+                "Database returned error: {0}".format(value))
+        value = value[1]
+    return value
+
+
+def summarize(dsn, table='origin', field='time'):
+    """
+    Return summary dict of the time range of a table of a database
+
+    Returns
+    -------
+    dict of 'path' and 'signature' of the table file, 'min' and 'max'
+    of 'field', both None if the table has no rows
+
+    """
+    conn = curds2.raw.dbapi2.connect(dsn)
+    try:
+        with conn._lock:
+            path = table_paths(conn._dbptr, [table])[table]
+            dbptr = ds._dblookup(conn._dbptr, '', table, field, '')
+            if _query(dbptr, ds.dbFIELD_TYPE) != ds.dbTIME:
+                raise ProgrammingError("Not a dbTIME field: {0}.{1}".format(
+                    table, field))
+            summary = {'path': path, 'signature': _signature(path),
+                       'min': None, 'max': None}
+            if _query(dbptr, ds.dbRECORD_COUNT):
+                dbptr[3] = 0
+                summary['min'] = _eval(dbptr, 'min_table({0})'.format(field))
+                summary['max'] = _eval(dbptr, 'max_table({0})'.format(field))
+    finally:
+        conn.close()
+    return summary
+
+
+def time_range(dsn, table='origin', field='time'):
+    """
+    Return (min, max) of a time field of a table, None if it has no rows
+
+    Uses the sidecar summary of the volume, made again (and saved if the
+    directory is writable) if the table file has changed. A volume with
+    no table file has a summary with no signature, kept until the file
+    is made.
+    """
+    path = dsn + SIDECAR
+    key = '{0}.{1}'.format(table, field)
+    summaries = read_sidecar(path)
+    summary = summaries.get(key)
+    signature = summary and _signature(summary['path'])
+    if summary is None or \
+            (signature and list(signature)) != summary['signature']:
+        summary = summaries[key] = summarize(dsn, table, field)
+        write_sidecar(path, summaries)
+    if summary['min'] is None:
+        return None
+    return summary['min'], summary['max']
+
+
+def prune(dsns, start, end, table='origin', field='time', margin=DAY):
+    """
+    Return list of the databases that can have rows in a time range
+
+    Inputs
+    ------
+    dsns   : list of str of database names, or str of a glob pattern
+             of day volumes
+    start  : float of epoch seconds of start of range
+    end    : float of epoch seconds of end of range
+    table  : str of name of table ('origin')
+    field  : str of name of dbTIME field of 'table' ('time')
+    margin : float of seconds a volume's rows can be outside its day,
+             None to not prune by name (DAY)
+
+    """
+    if isinstance(dsns, basestring):
+        dsns = volumes(dsns)
+    kept = []
+    for dsn in dsns:
+        day = margin is not None and day_range(dsn)
+        if day and (day[1] + margin < start or day[0] - margin > end):
+            continue
+        times = time_range(dsn, table, field)
+        if times is not None and times[0] <= end and times[1] >= start:
+            kept.append(dsn)
+    return kept
+
+
+def connect(dsns, start, end, table='origin', field='time', perm='r',
+            **kwargs):
+    """
+    Return a MultiConnection to the databases with rows in a time range
+
+    Inputs
+    ------
+    dsns  : list of str of database names, or str of a glob pattern
+    start : float of epoch seconds of start of range
+    end   : float of epoch seconds of end of range
+    table : str of name of table ('origin')
+    field : str of name of dbTIME field of 'table' ('time')
+    perm  : str of permission - passed to Datascope API ('r')
+
+    Notes
+    -----
+    Only prunes databases, the query still needs a subset on the range.
+
+    """
+    margin = kwargs.pop('margin', DAY)
+    return MultiConnection(prune(dsns, start, end, table, field, margin),
+                           perm=perm, **kwargs)
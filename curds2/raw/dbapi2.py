@@ -4,6 +4,7 @@ curds2.raw.dbapi2 module for Datascope
 
 Uses the base python wrappers
 """
+import threading
 try:
     import collections
 except ImportError:
@@ -11,29 +12,86 @@ except ImportError:
 
 from curds2.api.core import ProgrammingError, DatabaseError, \
                             TimestampFromTicks, DBAPITypeObject
-from curds2.api.base import BaseConnection, BaseCursor, BaseExecuter
+from curds2.api.base import BaseConnection, BaseCursor, BaseExecuter, \
+                            BaseRow, NullLock
 from curds2.raw.util import patch_oldversion
+from curds2.rows import NamedTupleRow, OrderedDictRow
 
 # Antelope/Datascope
 # ----------------------------------------------------------------------------#
-try:
-    from antelope import __path__ as antpath, _datascope as ds
-except ImportError:
-    import sys
-    import os
-    sys.path.append(os.path.join(os.environ['ANTELOPE'], 'data', 'python'))
-    from antelope import __path__ as antpath, _datascope as ds
-finally:
+version = None  # Antelope version, set on import of the C library
+
+
+def _import_datascope():
+    """
+    Import the antelope._datascope C library, patch for old versions
+    """
+    global version
+    try:
+        from antelope import __path__ as antpath, _datascope
+    except ImportError:
+        import sys
+        import os
+        sys.path.append(os.path.join(os.environ['ANTELOPE'], 'data', 'python'))
+        from antelope import __path__ as antpath, _datascope
     version = antpath[0].strip('/').split('/')[2]
     if float(version) < 5.4:
-        patch_oldversion(ds, methods=('_dbopen', '_dbgetv'))
+        patch_oldversion(_datascope, methods=('_dbopen', '_dbgetv'))
+    return _datascope
+
+
+class _Datascope(object):
+    """
+    Stand-in for antelope._datascope, imported on first attribute use
+
+    Importing Antelope is slow, so it waits for the first connect (or
+    anything else needing the library). The module attributes are then
+    copied to the instance, so later lookups are plain attribute hits.
+    """
+    _lock = threading.Lock()
+
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        with self._lock:
+            if '_module' not in self.__dict__:
+                module = _import_datascope()
+                self.__dict__.update(vars(module))
+                self.__dict__['_module'] = module
+        return getattr(self.__dict__['_module'], name)
+
+ds = _Datascope()
 
-STRING = DBAPITypeObject(ds.dbSTRING)
+
+class _TypeObject(DBAPITypeObject):
+    """
+    DBAPITypeObject of Datascope type names, looked up on first compare
+    """
+    def __init__(self, *names):
+        self.names = names
+
+    def __getattr__(self, name):
+        if name != 'values':
+            raise AttributeError(name)
+        self.values = tuple(getattr(ds, n) for n in self.names)
+        return self.values
+
+STRING = _TypeObject('dbSTRING')
 BINARY = DBAPITypeObject(None)
-NUMBER = DBAPITypeObject(ds.dbINTEGER, ds.dbREAL, ds.dbBOOLEAN, ds.dbTIME,
-                         ds.dbYEARDAY)
-DATETIME = DBAPITypeObject(ds.dbTIME, ds.dbYEARDAY)
-ROWID = DBAPITypeObject(ds.dbDBPTR)
+NUMBER = _TypeObject('dbINTEGER', 'dbREAL', 'dbBOOLEAN', 'dbTIME',
+                     'dbYEARDAY')
+DATETIME = _TypeObject('dbTIME', 'dbYEARDAY')
+ROWID = _TypeObject('dbDBPTR')
+
+# Item of a Cursor 'description'
+Column = collections.namedtuple('Column', ('name', 'type_code',
+                                           'display_size', 'internal_size',
+                                           'precision', 'scale', 'null_ok'))
+
+# Threads may share the module and Connections, but not Cursors. Calls to
+# Datascope on a shared database are serialized by the Connection lock,
+# unless it is made with threadsafe=False (see Connection).
+threadsafety = 2
 
 
 # Utility
@@ -97,17 +155,94 @@ class _Executer(BaseExecuter):
         if not hasattr(ds, fxn):
             raise ProgrammingError("No such command available: " + fxn)
         proc = getattr(ds, fxn)
-        result = proc(self.cursor._dbptr, *args)
-
-        # Return depends on result
-        if isinstance(result, list) and len(result) == 4:
-            if ds.dbINVALID in result:
-                raise DatabaseError(
-                    "Invalid value in pointer: {0}".format(result))
-            self.cursor._dbptr = result
-            return self.cursor.rowcount
+        with self.cursor._lock:
+            result = proc(self.cursor._dbptr, *args)
+
+            # Return depends on result
+            if isinstance(result, list) and len(result) == 4:
+                if ds.dbINVALID in result:
+                    raise DatabaseError(
+                        "Invalid value in pointer: {0}".format(result))
+                self.cursor._dbptr = result
+                return self.cursor.rowcount
+            else:
+                return result
+
+class _RowBuilder(object):
+    """
+    Functions building rows of one view with one set of Cursor options
+
+    NULL and datetime conversion and the row_factory are compiled into
+    one expression per field, so a row is built in one pass from the
+    values of '_dbgetv'. The table name, field names and NULL values are
+    looked up once, not per row.
+
+    Attributes
+    ----------
+    key    : tuple of the pointer and options the functions are made for
+    table  : str of table name for '_dbgetv'
+    fields : list of str of field names for '_dbgetv'
+    values : function(values) -> converted values, as from '_getrow'
+    row    : function(cursor, values) -> row, as from '_fetch'
+
+    Notes
+    -----
+    BaseRow, NamedTupleRow and OrderedDictRow are built inline, other
+    row factories are called with the converted values.
+
+    """
+    def __init__(self, cursor, key):
+        self.key = key
+        desc = cursor.description
+        self.fields = [d[0] for d in desc]
+        with cursor._lock:
+            self.table = _query(cursor._dbptr, ds.dbTABLE_NAME)
+            nulls = None
+            if cursor.CONVERT_NULL:
+                nulls = _select(cursor._nullptr, self.table, *self.fields)
+
+        exprs = []
+        for n, d in enumerate(desc):
+            expr = value = 'v[{0}]'.format(n)
+            if cursor.CONVERT_DATETIME and d[1] == DATETIME:
+                expr = '(TimestampFromTicks({0}) if isinstance({0}, float) ' \
+                       'else {0})'.format(value)
+            if nulls is not None:
+                expr = '(None if {0} == _n[{1}] else {2})'.format(value, n,
+                                                                 expr)
+            exprs.append(expr)
+        converted = exprs != ['v[{0}]'.format(n) for n in range(len(desc))]
+        values = converted and '[{0}]'.format(', '.join(exprs)) or 'v'
+
+        factory = cursor.row_factory
+        if factory is BaseRow:
+            row = converted and '({0},)'.format(', '.join(exprs)) or 'tuple(v)'
+        elif factory is NamedTupleRow:
+            row = '_T({0})'.format(', '.join(exprs))
+        elif factory is OrderedDictRow:
+            row = '_OD([{0}])'.format(', '.join(
+                '(_k[{0}], {1})'.format(n, e) for n, e in enumerate(exprs)))
         else:
-            return result
+            row = '_f(cursor, {0})'.format(values)
+
+        source = ('def values(v, _n=_n):\n'
+                  '    return {0}\n'
+                  'def row(cursor, v, _n=_n, _k=_k, _T=_T, _OD=_OD, _f=_f):\n'
+                  '    return {1}\n').format(values, row)
+        namespace = {
+            '_n': nulls,
+            '_k': tuple(self.fields),
+            '_T': collections.namedtuple(
+                'NamedTupleRow', [f.replace('.', '_') for f in self.fields])
+                if factory is NamedTupleRow else None,
+            '_OD': collections.OrderedDict,
+            '_f': factory,
+            }
+        # Module globals, so TimestampFromTicks can still be swapped out
+        exec(source, globals(), namespace)
+        self.values = namespace['values']
+        self.row = namespace['row']
+
 
 # DBAPI Classes
 # ----------------------------------------------------------------------------
@@ -129,6 +264,7 @@ class Cursor(BaseCursor):
     ---------------------
     CONVERT_NULL : bool of whether to try and change Nulls to None
     row_factory  : function handle to build more complex rows
+    result_factory : class to build fetchmany/fetchall results (list)
 
     Methods (DBAPI standard)
     -------
@@ -142,13 +278,26 @@ class Cursor(BaseCursor):
     Extension methods
     -----------------
     scroll(record, mode="relative") : Move cursor pointer to a record
+    fetchcolumns(size=cursor.arraysize) : Get multiple as a ResultSet
+    iter_columns(size=cursor.arraysize) : Generator of ResultSets to end
 
     Built-ins
     ---------
-    __iter__ : Cursor is a generator which can be iterated over
+    __iter__ : Cursor is a generator which can be iterated over, rows are
+               prefetched in blocks (see 'PREFETCH')
 
     """
     _executer = _Executer
+    _rowbuilder = None  # _RowBuilder of the current view
+
+    @property
+    def _dbptr(self):
+        return self._ptr
+
+    @_dbptr.setter
+    def _dbptr(self, value):
+        self._ptr[:] = value
+        self._rowbuilder = None
 
     @property
     def _nullptr(self):
@@ -156,7 +305,7 @@ class Cursor(BaseCursor):
         Return current pointer's NULL record
 
         """
-        null = self._dbptr  # dep 'copy'
+        null = list(self._dbptr)
         null[3] = ds.dbNULL
         return null
 
@@ -170,40 +319,55 @@ class Cursor(BaseCursor):
 
         Notes
         -----
-        Will return a namedtuple if available
+        Items are Column namedtuples. Descriptions are kept in the
+        Connection's DescriptionCache, keyed by the database, the view,
+        its field names, base tables and primary key, so Cursors on the
+        same view build it once, and a view index Datascope reuses for
+        another view gets a new description.
 
         """
         if self._table == ds.dbALL or ds.dbINVALID in self._dbptr:
             return None
-        if 'collections' in globals() and hasattr(collections, 'namedtuple'):
-            Tuple = collections.namedtuple('Column',
-                                           ('name', 'type_code',
-                                            'display_size', 'internal_size',
-                                            'precision', 'scale', 'null_ok'))
-        else:
-            Tuple = tuple
         dbptr = self._nullptr
-        table_fields = _query(dbptr, ds.dbTABLE_FIELDS)
-        description = []
-        for dbptr[2], name in enumerate(table_fields):
-            if name in table_fields[:dbptr[2]]:
-                name = '.'.join([_query(dbptr, ds.dbFIELD_BASE_TABLE), name])
-            type_code = _query(dbptr, ds.dbFIELD_TYPE)
-            display_size = _query(dbptr, ds.dbFORMAT)
-            internal_size = _query(dbptr, ds.dbFIELD_SIZE)
-            precision = _query(dbptr, ds.dbFIELD_FORMAT)
-            scale = None
-            null_ok = name not in _query(dbptr, ds.dbPRIMARY_KEY)
-
-            dtup = Tuple(name, type_code, display_size, internal_size,
-                         precision, scale, null_ok)
-            description.append(dtup)
+        with self._lock:
+            table_fields = _query(dbptr, ds.dbTABLE_FIELDS)
+            cache = key = None
+            if self.connection is not None:
+                cache = self.connection._descriptions()
+                if _query(dbptr, ds.dbTABLE_IS_VIEW):
+                    tables = _query(dbptr, ds.dbVIEW_TABLES)
+                else:
+                    tables = [_query(dbptr, ds.dbTABLE_NAME)]
+                key = (self.connection.dsn, dbptr[0], dbptr[1],
+                       tuple(table_fields), tuple(tables),
+                       tuple(_query(dbptr, ds.dbPRIMARY_KEY)))
+                description = cache.get(key)
+                if description is not None:
+                    return description
+            description = []
+            for dbptr[2], name in enumerate(table_fields):
+                if name in table_fields[:dbptr[2]]:
+                    name = '.'.join([_query(dbptr, ds.dbFIELD_BASE_TABLE),
+                                     name])
+                type_code = _query(dbptr, ds.dbFIELD_TYPE)
+                display_size = _query(dbptr, ds.dbFORMAT)
+                internal_size = _query(dbptr, ds.dbFIELD_SIZE)
+                precision = _query(dbptr, ds.dbFIELD_FORMAT)
+                scale = None
+                null_ok = name not in _query(dbptr, ds.dbPRIMARY_KEY)
+
+                description.append(Column(name, type_code, display_size,
+                                          internal_size, precision, scale,
+                                          null_ok))
+        if cache is not None:
+            cache.put(key, description)
         return description
 
     @property
     def rowcount(self):
         if self._table >= 0:
-            return _query(self._dbptr, ds.dbRECORD_COUNT)
+            with self._lock:
+                return _query(self._dbptr, ds.dbRECORD_COUNT)
         else:
             return -1
 
@@ -220,18 +384,13 @@ class Cursor(BaseCursor):
         """
         super(Cursor, self).__init__(**kwargs)
 
-        self._dbptr = dbptr  # dep 'copy'
+        self._dbptr = dbptr
 
         # Attributes
         for k, v in kwargs.items():
             if hasattr(self, k):
                 self.__setattr__(k, v)
 
-    def __iter__(self):
-        """Generator, yields a row from 0 to rowcount"""
-        for self._record in xrange(self.rowcount):
-            yield self._fetch()
-
     @staticmethod
     def _convert_dt(value, type_code):
         if type_code == DATETIME and value is not None \
@@ -239,32 +398,81 @@ class Cursor(BaseCursor):
             return TimestampFromTicks(value)
         return value
 
+    def _builder(self):
+        """
+        Return the _RowBuilder for the current view and options
+
+        A new one is made when the pointer moves to another view or the
+        CONVERT_* flags or row_factory change.
+        """
+        key = (self._database, self._table, self.CONVERT_NULL,
+               self.CONVERT_DATETIME, self.row_factory)
+        builder = self._rowbuilder
+        if builder is None or builder.key != key:
+            builder = self._rowbuilder = _RowBuilder(self, key)
+        return builder
+
+    def _getvalues(self, builder):
+        """Return the values of the current record"""
+        with self._lock:
+            return _select(self._dbptr, builder.table, *builder.fields)
+
+    def _getrow(self):
+        """Pull out a row of values from DB and increment pointer"""
+        builder = self._builder()
+        row = builder.values(self._getvalues(builder))
+        self._record += 1
+        return row
+
     def _fetch(self):
-        """Pull out a row from DB and increment pointer"""
-        tbl = _query(self._dbptr, ds.dbTABLE_NAME)  # TODO: check view compat
-        desc = self.description
-        fields = [d[0] for d in desc]
-        row = _select(self._dbptr, tbl, *fields)
-        if self.CONVERT_NULL:
-            row = [self._convert_null(row[n], null)
-                   for n, null in enumerate(_select(self._nullptr,
-                                                    tbl, *fields))]
-        if self.CONVERT_DATETIME:
-            row = [self._convert_dt(row[n], d[1]) for n, d in enumerate(desc)]
+        """Fetch row, built in one pass by the _RowBuilder"""
+        builder = self._builder()
+        row = builder.row(self, self._getvalues(builder))
         self._record += 1
-        return self.row_factory(self, row)
+        return row
+
+    def _fetchblock(self, size):
+        """Return list of up to 'size' rows from the pointer on"""
+        builder = self._builder()
+        build = builder.row
+        rows = []
+        with self._lock:
+            end = min(self._record + size, self.rowcount)
+            for self._record in xrange(self._record, end):
+                rows.append(build(self, self._getvalues(builder)))
+            self._record = end
+        return rows
 
     def close(self):
-        """Close database connection"""
-        ds._dbclose(self._dbptr)
+        """
+        Free the Cursor's view, if it points to one
+
+        The database is shared by the Cursors of a Connection, and is
+        closed by the Connection 'close'.
+        """
+        with self._lock:
+            dbptr = list(self._dbptr)
+            if self._table >= 0 and ds.dbINVALID not in dbptr and \
+                    _query(dbptr, ds.dbTABLE_IS_VIEW):
+                ds._dbfree(dbptr)
+            self._dbptr = [self._database, ds.dbALL, ds.dbALL, ds.dbALL]
 
 
 class Connection(BaseConnection):
     """
     DBAPI compatible Connection type for Datascope
 
+    Attributes
+    ----------
+    threadsafe : bool of whether to serialize calls to Datascope from
+                 Cursors of this Connection with a lock, so the open
+                 database can be shared by threads (True). Without it
+                 the Connection is only safe in one thread, i.e. it
+                 doesn't have the module's 'threadsafety' of 2.
+
     """
     cursor_factory = Cursor
+    threadsafe = True
 
     @property
     def _dbptr(self):
@@ -287,6 +495,7 @@ class Connection(BaseConnection):
         schema   : str of temp schema
 
         """
+        self.dsn = database
         if database == ":memory:":
             self._dbptr = ds._dbtmp(schema)
         else:
@@ -294,12 +503,18 @@ class Connection(BaseConnection):
         for k in kwargs.keys():
             if hasattr(self, k):
                 self.__setattr__(k, kwargs.pop(k))
+        if self.threadsafe:
+            self._lock = threading.RLock()
+        else:
+            self._lock = NullLock()
 
     def close(self):
-        ds._dbclose(self._dbptr)
+        with self._lock:
+            ds._dbclose(self._dbptr)
 
     def is_open(self):
-        return _query(self._dbptr, ds.dbDATABASE_COUNT) != 0
+        with self._lock:
+            return _query(self._dbptr, ds.dbDATABASE_COUNT) != 0
 
     def cursor(self, **kwargs):
         """
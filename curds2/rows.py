@@ -75,27 +75,50 @@ class OrderedDictRow_old(collections.OrderedDict):
     def __init__(self, cursor, row):
         super(OrderedDictRow,self).__init__([(d[0], row[n]) for n, d in enumerate(cursor.description)])
 
+
+_UTCDateTime = None
+
+
+def _utcdatetime():
+    """Return the ObsPy UTCDateTime class, imported on first call"""
+    global _UTCDateTime
+    if _UTCDateTime is None:
+        from obspy.core.utcdatetime import UTCDateTime
+        _UTCDateTime = UTCDateTime
+    return _UTCDateTime
+
+
+def UTCDateTime(*args, **kwargs):
+    """
+    Return an ObsPy UTCDateTime, importing ObsPy on first call
+
+    Stands in for the class this module used to import from ObsPy, so
+    'curds2.rows.UTCDateTime' still makes UTCDateTimes without ObsPy
+    being imported with the module. It is a function, not the class,
+    so use 'isinstance' with obspy.UTCDateTime itself.
+    """
+    return _utcdatetime()(*args, **kwargs)
+
+
 #
 # UTCOrdDictRow can now be constructed with an OrderedDictRow and
 # the CONVERT_DATETIME cursor option by monkey-patching the
 # TimestampFromTicks function, for example:
-# >>> curds2.dbapi2.TimestampFromTicks = UTCDateTime
+# >>> curds2.dbapi2.TimestampFromTicks = curds2.rows.UTCDateTime
 # >>> curs = conn.cursor(CONVERT_DATETIME=True, row_factory=OrderedDictRow)
 #
-try:
-    from obspy.core.utcdatetime import UTCDateTime
-except ImportError:
-    pass
-
 class UTCOrdDictRow(collections.OrderedDict):
     """
     A row_factory function to make OrderedDict rows from row tuple
    
     This uses the UTCDateTime class to convert any type object that
     compares to dbTIME to a utcdatetime object.
+
+    ObsPy is slow to import, so it is only imported on first use.
     """
     def __init__(self, cursor, row):
-        kv = [(d[0], (d[1]==4 and row[n] is not None) and UTCDateTime(row[n]) or row[n]) for n, d in enumerate(cursor.description)]
+        utcdatetime = _utcdatetime()
+        kv = [(d[0], (d[1]==4 and row[n] is not None) and utcdatetime(row[n]) or row[n]) for n, d in enumerate(cursor.description)]
         super(UTCOrdDictRow, self).__init__(kv)
 
 #
@@ -0,0 +1,269 @@
+#
+"""
+Event loop server of the curds2 JSONRPC endpoint, with cancellation
+
+Serves 'POST /<dbname>' like curds2.ws.flaskapp, replies as from
+'Service.run', but each request runs in a child process:
+
+* the connection is watched while the request runs, and if the client
+  hangs up the child is killed, rather than finishing a join nobody
+  will read;
+* a request taking more than 'timeout' seconds (or its own 'timeout'
+  param, if less) is killed and gets an OperationalError reply.
+
+Datascope calls block in C, where a thread can't be stopped, so the
+executor is processes: at most 'workers' at once, one per request,
+forked from the server after it has imported Datascope (see 'preload').
+The event loop is gevent's (see 'gevent_main'). Waiting is done with a
+'select' function, so a Server also runs under a threading server with
+'select.select'.
+
+Replies are whole JSON documents, for streamed rows use flaskapp.
+"""
+import json
+import multiprocessing
+import os
+import pickle
+import select
+import socket
+import threading
+import time
+
+from curds2.api.core import OperationalError
+from curds2.raw.dbapi2 import ds
+from curds2.ws.service import Service, _error
+
+PORT = 5150
+WORKERS = 4
+TIMEOUT = 300.0     # max seconds per request
+READ = 65536        # bytes per read of a reply from a child
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 405: 'Method Not Allowed',
+            411: 'Length Required', 417: 'Expectation Failed'}
+
+
+def _child(fd, service, dbname, request):
+    """Run a request in the child process, write the pickled reply to fd"""
+    try:
+        data = pickle.dumps(service(dbname).run(request),
+                            pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        data = pickle.dumps(_error(request, e), pickle.HIGHEST_PROTOCOL)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(data)
+
+
+class Job(object):
+    """
+    Service request running in a child process
+
+    The Job is readable (see 'fileno') when the reply is ready, or the
+    child died. The reply is read in chunks, waiting on 'select' before
+    each, so a large reply doesn't block the event loop.
+    """
+    def __init__(self, dbname, request, service=Service,
+                 select=select.select):
+        self._fd, child_fd = os.pipe()
+        self._select = select
+        self._process = multiprocessing.Process(
+            target=_child, args=(child_fd, service, dbname, request))
+        self._process.daemon = True
+        self._process.start()
+        os.close(child_fd)
+
+    def fileno(self):
+        return self._fd
+
+    def result(self):
+        """Return the reply, raise OperationalError if the child died"""
+        chunks = []
+        try:
+            while True:
+                self._select([self._fd], [], [], None)
+                data = os.read(self._fd, READ)
+                if not data:
+                    break
+                chunks.append(data)
+            try:
+                return pickle.loads(b''.join(chunks))
+            except Exception:
+                self._process.join()
+                raise OperationalError("Request process exited: {0}".format(
+                    self._process.exitcode))
+        finally:
+            self.cancel()
+
+    def cancel(self):
+        """Kill the child if it is still running"""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process.join()
+
+
+def _hung_up(sock):
+    """Return bool of whether a readable client socket is closed"""
+    try:
+        return not sock.recv(1, socket.MSG_PEEK)
+    except socket.error:
+        return True
+
+
+class Server(object):
+    """
+    Handler of client connections, one request per connection
+
+    Attributes
+    ----------
+    workers : int of max requests running at once (WORKERS)
+    timeout : float of max seconds per request (TIMEOUT)
+    service : Service class run in the child processes
+    select  : function like 'select.select', gevent's for the event loop
+    slots   : Semaphore of running requests, gevent's for the event loop
+
+    """
+    workers = WORKERS
+    timeout = TIMEOUT
+    service = Service
+    select = staticmethod(select.select)
+    slots = None
+
+    def __init__(self, **kwargs):
+        for k, v in kwargs.items():
+            if hasattr(self, k):
+                self.__setattr__(k, v)
+        if self.slots is None:
+            self.slots = threading.BoundedSemaphore(self.workers)
+
+    def _timeout(self, request):
+        """Return float of seconds allowed for a request"""
+        params = isinstance(request, dict) and request.get('params') or {}
+        try:
+            return min(float(params.get('timeout', self.timeout)),
+                       self.timeout)
+        except (AttributeError, TypeError, ValueError):
+            return self.timeout
+
+    def run(self, sock, dbname, request):
+        """
+        Run a request in a Job, return the reply, or None if the client
+        hung up first
+        """
+        timeout = self._timeout(request)
+        deadline = time.time() + timeout
+        with self.slots:
+            job = Job(dbname, request, self.service, self.select)
+            try:
+                watch = [job, sock]
+                while True:
+                    wait = deadline - time.time()
+                    if wait <= 0:
+                        return _error(request, OperationalError(
+                            "Request timed out after {0} s".format(timeout)))
+                    ready = self.select(watch, [], [], wait)[0]
+                    if job in ready:
+                        return job.result()
+                    if sock in ready:
+                        if _hung_up(sock):
+                            return None
+                        watch = [job]   # pipelined data, not a hang-up
+            finally:
+                job.cancel()
+
+    def handle(self, sock, address=None):
+        """Serve one HTTP request on a connected socket"""
+        rfile = sock.makefile('rb')
+        try:
+            status, reply = self._read(rfile)
+            if status == 200:
+                dbname, request = reply
+                reply = self.run(sock, dbname, request)
+                if reply is None:
+                    return
+            body = json.dumps(reply)
+            head = ['HTTP/1.1 {0} {1}'.format(status, _REASONS[status]),
+                    'Content-Type: application/json',
+                    'Content-Length: {0}'.format(len(body)),
+                    'Connection: close', '', '']
+            sock.sendall('\r\n'.join(head) + body)
+        except socket.error:
+            pass
+        finally:
+            rfile.close()
+            sock.close()
+
+    def _read(self, rfile):
+        """
+        Return (200, (dbname, request)) of an HTTP request, or an error
+        status and message
+
+        Bodies must have a Content-Length, chunked ones get a 411, and
+        'Expect: 100-continue' a 417 so the client sends the body with
+        the headers.
+        """
+        line = rfile.readline(65537).split()
+        if len(line) != 3:
+            return 400, {'message': 'Bad request line'}
+        method, path, version = line
+        headers = {}
+        for header in iter(lambda: rfile.readline(65537).strip(), ''):
+            name, sep, value = header.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        dbname = os.path.join(os.sep, path.split('?')[0].lstrip('/'))
+        if method == 'GET':
+            return 200, (dbname, {})
+        if method != 'POST':
+            return 405, {'message': 'Method not allowed: ' + method}
+        if 'transfer-encoding' in headers:
+            return 411, {'message': 'Chunked request bodies not supported'}
+        if 'expect' in headers:
+            return 417, {'message': 'Expect not supported: ' +
+                         headers['expect']}
+        try:
+            body = rfile.read(int(headers.get('content-length', 0)))
+            return 200, (dbname, json.loads(body))
+        except ValueError:
+            return 400, {'message': 'Failed to decode JSON object'}
+
+
+def preload():
+    """
+    Import Datascope in the server process
+
+    The request processes are forked, so they start with the library
+    loaded instead of each importing it again.
+    """
+    ds.dbALL
+
+
+def gevent_main(socket_path=None, **kwargs):
+    """
+    Gevent event loop standalone server
+
+    Listens on TCP PORT, or on the Unix domain socket 'socket_path' if
+    given. Keyword args are Server attributes.
+    """
+    from gevent.server import StreamServer
+    from gevent.select import select as gselect
+    from gevent.lock import BoundedSemaphore
+    from curds2.ws.unix import listener
+    kwargs.setdefault('select', gselect)
+    kwargs.setdefault('slots',
+                      BoundedSemaphore(kwargs.get('workers', WORKERS)))
+    server = Server(**kwargs)
+    preload()
+    if socket_path:
+        stream_server = StreamServer(listener(socket_path), server.handle)
+    else:
+        stream_server = StreamServer(('', PORT), server.handle)
+    try:
+        stream_server.serve_forever()
+    finally:
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
+
+
+if __name__ == "__main__":
+    gevent_main()
@@ -5,11 +5,15 @@ curds2.dbapi2 module for Datascope
 Uses the base python wrappers
 """
 #import urlparse
+import itertools
 import urllib2
 import json
 
 from curds2.api.core import *
 from curds2.api.base import *
+from curds2.api.resultset import ResultSet
+from curds2.ws import shm, unix
+from curds2.ws.stream import NDJSON, LineReader, ReplyReader
 
 # Shim in hardcoded Datascope types for now
 dbBOOLEAN = 1
@@ -26,22 +30,71 @@ NUMBER   = DBAPITypeObject(dbINTEGER, dbREAL, dbBOOLEAN, dbTIME, dbYEARDAY)
 DATETIME = DBAPITypeObject(dbTIME, dbYEARDAY)
 ROWID    = DBAPITypeObject(dbDBPTR)
 
+# urllib2 opener of 'http' and 'unix' URLs
+_opener = urllib2.build_opener(unix.UnixHandler)
+
+class _PreparedRequest(object):
+    """
+    JSONRPC request of one operation with fixed Cursor settings
+
+    The envelope, method and settings are serialized once, only the
+    operation args are encoded for each call.
+    """
+    __slots__ = ['_head', '_tail']
+
+    def __init__(self, operation, settings, id=1, transport=None):
+        transport = transport and '"transport": {0}, '.format(
+            json.dumps(transport)) or ''
+        self._head = '{{"jsonrpc": "2.0", "id": {0}, "method": {1}, ' \
+                     '"params": {{"cursor": {2}, {3}"args": '.format(
+                         json.dumps(id), json.dumps(operation),
+                         json.dumps(settings), transport)
+        self._tail = '}}'
+
+    def __call__(self, args):
+        """Return str of JSON text of the request with 'args'"""
+        return self._head + json.dumps(args) + self._tail
+
+
 # implement Connection, Cursor, etc
 class Cursor(BaseCursor):
     """
     Stub Cursor class for a remote client
+
+    Additional attributes
+    ---------------------
+    STREAM : bool of whether to read rows from a newline-delimited stream
+             as they are used, instead of loading them all on 'execute'
+    MMAP   : bool of whether to get results in a memory-mapped file from
+             a server on the same host, see 'curds2.ws.shm'
+
+    Notes
+    -----
+    A streaming Cursor only goes forward: 'rowcount' is -1 until the last
+    row is read, and 'scroll' is not supported.
+
+    All request and result state belongs to the Cursor, so Cursors of one
+    Connection can run in different threads (or greenlets) at once.
     """
-    _request = {'jsonrpc': '2.0'}
     _headers = {'content-type': 'application/json'}
-    _rows = []
+    _settings = ('CONVERT_NULL',)  # to forward to server Cursor
+    _stream = None      # LineReader of a streamed result
+    _streamrows = None  # iterator of its rows
+    _mapped = None      # columns of a memory-mapped result
     
-    description = []
+    description = []    # per Cursor, set in __init__ and by 'execute'
+    STREAM = False
+    MMAP = False
     
     def __init__(self, *args, **kwargs):
         """Constructor"""
         super(Cursor, self).__init__(**kwargs)
         
         self.dsn = self.connection.dsn
+        self._url = unix.is_unix(self.dsn) and unix.url(self.dsn) or self.dsn
+        self.description = []
+        self._rows = []
+        self._prepared = {}  # (operation, settings) -> _PreparedRequest
         
         # Attributes
         for k, v in kwargs.items():
@@ -54,44 +107,238 @@ class Cursor(BaseCursor):
             return TimestampFromTicks(value)
         return value
     
-    def _fetch(self):
-        n = self._record
-        desc = self.description
-        row = self._rows[n]
-        self._record += 1
+    def _convert(self, row):
         if self.CONVERT_DATETIME:
+            desc = self.description
             row = [self._convert_dt(row[n], d[1]) for n, d in enumerate(desc)]
-        return self.row_factory(self, row)
+        return row
+
+    def _getrow(self):
+        row = self._convert(self._rows[self._record])
+        self._record += 1
+        return row
 
     @property
     def rowcount(self):
+        if self._stream is not None:
+            if self._stream.rowcount is None:
+                return -1
+            return self._stream.rowcount
         return len(self._rows)
+
+    def _iterstream(self):
+        """Generator, yields values of rows read from the stream"""
+        for values in self._streamrows:
+            self._record += 1
+            yield self._convert(values)
+        reply = self._stream.reply
+        self._stream.close()
+        if reply.get('error'):
+            e = reply.pop('error')
+            raise DatabaseError(': '.join([e['type'], e['message']]))
+
+    def _fetchstream(self, size):
+        """Return up to 'size' rows from the stream (None for the rest)"""
+        values = itertools.islice(self._iterstream(), size)
+        if self.result_factory is not None:
+            result = self.result_factory(self)
+            for v in values:
+                result.append(v)
+            return result
+        return [self.row_factory(self, v) for v in values]
+
+    def __iter__(self):
+        """Generator, yields a row from 0 to rowcount, or off the stream"""
+        if self._stream is None:
+            return super(Cursor, self).__iter__()
+        return (self.row_factory(self, v) for v in self._iterstream())
+
+    def fetchone(self):
+        if self._stream is None:
+            return super(Cursor, self).fetchone()
+        for values in itertools.islice(self._iterstream(), 1):
+            return self.row_factory(self, values)
+        return None
+
+    def fetchmany(self, size=None):
+        if self._stream is None:
+            return super(Cursor, self).fetchmany(size)
+        if size is None:
+            size = self.arraysize
+        return self._fetchstream(size)
+
+    def fetchall(self):
+        if self._stream is None:
+            return super(Cursor, self).fetchall()
+        return self._fetchstream(None)
+
+    def fetchcolumns(self, size=None):
+        """
+        Return 'size' number of rows as a column-oriented ResultSet
+
+        The ResultSet of all the rows of a memory-mapped result reads the
+        mapping in place, so its NumPy columns are not copies.
+        """
+        if self._mapped is None:
+            return super(Cursor, self).fetchcolumns(size)
+        if size is None:
+            size = self.arraysize
+        if not 0 <= self._record < self.rowcount:
+            self._record = 0
+        start = self._record
+        end = min(start + size, self.rowcount)
+        self._record = end
+        if start == 0 and end == self.rowcount:
+            return ResultSet(self, list(self._mapped))
+        return ResultSet(self, [c[start:end] for c in self._mapped])
     
-    def execute(self, operation, params=[]):
+    def _cursor_params(self):
+        """Return dict of Cursor settings for the server Cursor"""
+        return dict([(p, getattr(self, p)) for p in self._settings])
+
+    def _transport(self):
+        return self.MMAP and 'mmap' or None
+
+    def _params(self, params):
+        """Return JSONRPC 'params' for operation args"""
+        rpc_params = {'args': params, 'cursor': self._cursor_params()}
+        if self._transport():
+            rpc_params['transport'] = self._transport()
+        return rpc_params
+
+    def _prepare(self, operation):
+        """Return the _PreparedRequest of 'operation' for current settings"""
+        key = (operation, self._transport(),
+               tuple(getattr(self, p) for p in self._settings))
+        prepared = self._prepared.get(key)
+        if prepared is None:
+            prepared = _PreparedRequest(operation, self._cursor_params(),
+                                        transport=self._transport())
+            self._prepared[key] = prepared
+        return prepared
+
+    def _post(self, data, batch=False):
         """
-        Call server at a URL and get JSONRPC `result
+        POST str of a JSONRPC request (or batch) to the server, return reply
+
+        Rows of a cursor result are parsed as they arrive, see ReplyReader
+        """
+        req = urllib2.Request(self._url, data, self._headers)
+        rep = _opener.open(req)
+        try:
+            if batch:
+                return json.load(rep)
+            reader = ReplyReader(rep)
+            if not reader.streaming:
+                return reader.reply
+            rows = list(reader)
+            reply = reader.reply
+            reply['result']['cursor']['rows'] = rows
+            return reply
+        finally:
+            rep.close()
+
+    def _open(self, data):
+        """
+        POST str of a JSONRPC request for a newline-delimited reply
+
+        Returns the reply of the header line, the Cursor keeps reading
+        the rows if it is a cursor result
+        """
+        headers = dict(self._headers, accept=NDJSON)
+        req = urllib2.Request(self._url, data, headers)
+        reader = LineReader(_opener.open(req))
+        if reader.streaming:
+            self._stream = reader
+            self._streamrows = iter(reader)
+        else:
+            reader.close()
+        return reader.reply
+
+    def _result(self, reply):
+        """
+        Return `result of a JSONRPC reply
+
+        A cursor result is loaded into this Cursor, returns rowcount
         """
-        curs_settings = ('CONVERT_NULL',)  # to forward to server Cursor
-        curs_params = dict([(p, getattr(self, p)) for p in curs_settings])
-        rpc_params = {'args': params, 'cursor': curs_params}
-        self._request.update({'method': operation, 'params': rpc_params, 'id': 1})
-        req = urllib2.Request(self.dsn, json.dumps(self._request), self._headers)
-        rep = urllib2.urlopen(req)
-        j = rep.read()
-        rep.close()
-        reply = json.loads(j)
         if reply.get('error'):
             e = reply['error']
             raise DatabaseError(': '.join([e['type'], e['message']]))
         result = reply.get('result')
+        self._mapped = None
+        if isinstance(result, dict) and 'mmap' in result:
+            handle = result['mmap']
+            self.description = handle['description']
+            self._mapped = shm.read_result(handle)
+            self._rows = shm.ColumnRows(self._mapped, handle['nrows'])
+            self._record = 0
+            return self.rowcount
         if isinstance(result, dict) and 'cursor' in result:
             _curs = result['cursor']
+            if _curs.get('error'):
+                e = _curs['error']
+                raise DatabaseError(': '.join([e['type'], e['message']]))
             self.description = _curs.get('description')
-            self._rows = _curs.get('rows')
+            self._rows = _curs.get('rows', [])
+            self._record = 0
             return self.rowcount
         else:
             return result
 
+    def execute(self, operation, params=[]):
+        """
+        Call server at a URL and get JSONRPC `result
+        """
+        data = self._prepare(operation)(params)
+        self.close()
+        if self.STREAM:
+            return self._result(self._open(data))
+        return self._result(self._post(data))
+
+    def executebatch(self, operations):
+        """
+        Call server once with a JSONRPC batch of operations
+
+        Inputs
+        ------
+        operations : sequence of (operation, params) pairs
+
+        Returns
+        -------
+        list of results in order, where cursor results (or memory-mapped
+        ones, see 'MMAP') are the rows (as from 'fetchall') rather than
+        the rowcount
+
+        Notes
+        -----
+        The Cursor is left on the last cursor result, like 'executemany'.
+        Raises DatabaseError for the first request returning an error.
+        
+        """
+        batch = [{'jsonrpc': '2.0', 'method': operation,
+                  'params': self._params(params), 'id': n}
+                 for n, (operation, params) in enumerate(operations)]
+        if not batch:
+            return []
+        self.close()
+        replies = self._post(json.dumps(batch), batch=True)
+        replies.sort(key=lambda reply: reply.get('id'))
+        results = []
+        for reply in replies:
+            result = self._result(reply)
+            if isinstance(reply.get('result'), dict) and \
+                    ('cursor' in reply['result'] or
+                     'mmap' in reply['result']):
+                result = self.fetchall()
+            results.append(result)
+        return results
+
+    def close(self):
+        """Close any open stream of rows"""
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = self._streamrows = None
+
 class Connection(BaseConnection):
     """
     Connection class for remote
@@ -102,4 +349,15 @@ class Connection(BaseConnection):
 
 
 def connect(dsn, *args, **kwargs):
+    """
+    Return a Connection to a curds2 web service
+
+    Inputs
+    ------
+    dsn : str of URL of the database on the server, e.g.
+          'http://localhost:5150/opt/antelope/data/db/demo/demo', or of a
+          Unix domain socket of a server on this host and the database,
+          'unix:///var/run/curdsd.sock:/opt/antelope/data/db/demo/demo'
+
+    """
     return Connection(dsn, *args, **kwargs)
@@ -3,11 +3,23 @@
 Flask app to service dbapi2 Antelope requests using curds2
 """
 import os
-from flask import Flask, request, jsonify
-from curds2.ws.service import Service
+import json
+import time
+from flask import Flask, Response, request, jsonify
+from curds2.ws.service import Service, Dispatcher
+from curds2.ws.metrics import Metrics, command_pattern
+from curds2.ws.stream import NDJSON
+from curds2.ws.unix import listener
 
 PORT=5150
+SOCKET=None  # path of a Unix domain socket to listen on instead
+WORKERS=4
+PROFILE_HEADER = 'X-Curds-Profile'
 app = Flask(__name__)
+app.config['DISPATCHER'] = None  # Run requests in the handler if None
+app.config['PROFILE'] = False    # Time requests, see '/metrics'
+app.config['STREAM'] = True      # Stream rows of dbprocess replies
+metrics = Metrics()
 
 
 def process_request(request):
@@ -18,29 +30,86 @@ def process_request(request):
     else:
         return {}
 
-def process_reply(rep):
+def process_reply(rep, timings=None):
     """
     Turn a service reply into a flask JSON response
+
+    A batch reply is a list, which 'jsonify' doesn't take. If profiling,
+    'serialize' seconds and response 'size' are added to 'timings'.
     """
-    return jsonify(rep)
+    t0 = time.time()
+    if isinstance(rep, list):
+        response = Response(json.dumps(rep), mimetype='application/json')
+    else:
+        response = jsonify(rep)
+    if timings is not None:
+        timings['serialize'] = time.time() - t0
+        timings['size'] = len(response.get_data())
+    return response
+
+
+@app.route('/metrics', methods=['GET'])
+def curds_metrics():
+    """Latency histograms of profiled requests, Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @app.route('/<path:dbname>', methods=['GET', 'POST'])
 def curds_service(dbname):
+    t0 = time.time()
     dbname = os.path.join(os.sep, dbname)
     req = process_request(request)
-    result = Service(dbname).run(req)
-    return process_reply(result)
+    timings = None
+    if app.config['PROFILE']:
+        timings = {}
+        pattern = command_pattern(req)
+    dispatcher = app.config['DISPATCHER']
+    lines = NDJSON in request.headers.get('Accept', '')
+    if isinstance(req, dict) and (lines or app.config['STREAM'] and
+                                  timings is None):
+        if dispatcher is None:
+            chunks = Service(dbname).stream(req, lines)
+        else:
+            chunks = dispatcher.stream(dbname, req, lines)
+        mimetype = NDJSON if lines else 'application/json'
+        return Response(chunks, mimetype=mimetype)
+    if dispatcher is None:
+        result = Service(dbname, timings=timings).run(req)
+    else:
+        result = dispatcher.run(dbname, req, timings=timings)
+    response = process_reply(result, timings)
+    if timings is not None:
+        timings['total'] = time.time() - t0
+        metrics.observe(dbname, pattern, timings)
+        response.headers[PROFILE_HEADER] = json.dumps(timings)
+    return response
 
 
 # Main routines -- for standalone web servers
-def gevent_main():
+def gevent_main(socket_path=SOCKET):
     """
     Gevent coroutine WDGI standalone server
+
+    Datascope calls run on a pool of WORKERS threads, so greenlets keep
+    serving while a request blocks in C.
+
+    Listens on TCP PORT, or on the Unix domain socket 'socket_path' if
+    given, for clients on this host with 'unix://' DSNs.
     """
     from gevent.wsgi import WSGIServer
-    http_server = WSGIServer(('', PORT), app)
-    http_server.serve_forever()
+    from gevent.event import Event
+    from gevent.threadpool import ThreadPool
+    app.config['DISPATCHER'] = Dispatcher(ThreadPool(WORKERS),
+                                          event_factory=Event)
+    if socket_path:
+        http_server = WSGIServer(listener(socket_path), app)
+    else:
+        http_server = WSGIServer(('', PORT), app)
+    try:
+        http_server.serve_forever()
+    finally:
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
 
 
 def dev_main():
@@ -0,0 +1,120 @@
+#
+"""
+Request timing metrics for the curds2 web service
+
+Timings of profiled requests are aggregated into histograms per
+database and per command pattern, and rendered in the Prometheus text
+format for the '/metrics' endpoint.
+"""
+import re
+import threading
+
+# Upper bounds of histogram buckets
+SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+           1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES = (1e3, 1e4, 1e5, 1e6, 1e7, 1e8)
+
+# Literal values in dbprocess commands, i.e. numbers and quoted strings
+_LITERALS = re.compile(r'''"[^"]*"|'[^']*'|\b\d+(\.\d*)?\b''')
+
+
+def command_pattern(request):
+    """
+    Return str of the command pattern of a JSONRPC request
+
+    Literals in dbprocess commands are replaced by '?', so requests for
+    different events fall in the same pattern. A batch is 'batch' and
+    anything else that isn't a request object (i.e. a null body) is
+    'invalid'.
+    """
+    if isinstance(request, list):
+        return 'batch'
+    if not isinstance(request, dict):
+        return 'invalid'
+    method = request.get('method', 'dbprocess')
+    try:
+        cmds = request['params']['args'][0]
+    except (KeyError, IndexError, TypeError):
+        return method
+    if not isinstance(cmds, list):
+        return method
+    return ' | '.join([method] + [_LITERALS.sub('?', c) for c in cmds])
+
+
+class Histogram(object):
+    """
+    Cumulative histogram of observed values, Prometheus style
+    """
+    def __init__(self, buckets=SECONDS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for n, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[n] += 1
+        self.count += 1
+        self.sum += value
+
+
+def _label(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace(
+        '\n', r'\n')
+
+
+class Metrics(object):
+    """
+    Histograms of request timings by step, database and command pattern
+
+    Steps are the keys of the timings dict of a request (i.e. 'open',
+    'dbprocess', 'fetch', 'serialize', 'total'), with 'size' in bytes.
+    """
+    prefix = 'curds'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}   # (step, database, pattern) -> Histogram
+
+    def observe(self, database, pattern, timings):
+        """Add the timings of one request"""
+        with self._lock:
+            for step, value in timings.items():
+                key = (step, database, pattern)
+                if key not in self._histograms:
+                    buckets = step == 'size' and BYTES or SECONDS
+                    self._histograms[key] = Histogram(buckets)
+                self._histograms[key].observe(value)
+
+    def render(self):
+        """
+        Return str of all histograms in the Prometheus text format
+
+        Series are sorted by step, so each metric name gets one TYPE line
+        followed by all its series.
+        """
+        lines = []
+        last = None
+        with self._lock:
+            items = sorted(self._histograms.items())
+            for (step, database, pattern), hist in items:
+                if step == 'size':
+                    name = '{0}_response_bytes'.format(self.prefix)
+                else:
+                    name = '{0}_{1}_seconds'.format(self.prefix, step)
+                if name != last:
+                    lines.append('# TYPE {0} histogram'.format(name))
+                    last = name
+                labels = 'database="{0}",pattern="{1}"'.format(
+                    _label(database), _label(pattern))
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append('{0}_bucket{{{1},le="{2}"}} {3}'.format(
+                        name, labels, bound, count))
+                lines.append('{0}_bucket{{{1},le="+Inf"}} {2}'.format(
+                    name, labels, hist.count))
+                lines.append('{0}_sum{{{1}}} {2}'.format(name, labels,
+                                                         hist.sum))
+                lines.append('{0}_count{{{1}}} {2}'.format(name, labels,
+                                                           hist.count))
+        return '\n'.join(lines) + '\n'
@@ -2,16 +2,68 @@
 """
 service curds2 requests
 """
+import contextlib
+import json
+import threading
+import time
+
 import curds2.raw.dbapi2 as dbapi2
+from curds2.api.base import DescriptionCache
+from curds2.api.core import OperationalError
+from curds2.ws import shm
+from curds2.ws.stream import CHUNK, encode_reply, encode_lines
+
+
+def _error(request, e):
+    """Update a JSONRPC dict request with an error reply from exception"""
+    if isinstance(request, list):
+        return [_error(r, e) for r in request]
+    if not isinstance(request, dict):
+        request = {'jsonrpc': '2.0', 'id': None}
+    request.update({'error': {
+        'message': str(e),
+        'type': e.__class__.__name__,
+        }
+    })
+    return request
+
+
+def _invalid(request):
+    """Return JSONRPC error reply to a request that isn't an object"""
+    return _error({'jsonrpc': '2.0', 'id': None}, dbapi2.ProgrammingError(
+        "Invalid Request: {0}".format(json.dumps(request))))
 
 
 class Service(object):
     """
     Run a curds2 query as a JSONRPC service
+
+    Profiling
+    ---------
+    Pass a dict as 'timings' to have the seconds spent in each step of
+    the request added to it: 'open' (database), 'dbprocess' and 'fetch'
+    (rows and description). Steps repeated in a batch are summed.
+
+    Transport
+    ---------
+    A request with a 'transport' param of 'mmap' gets its rows as the
+    handle of a memory-mapped file, see 'curds2.ws.shm', for clients on
+    the same host.
+
+    Descriptions
+    ------------
+    The Connections of all Services share 'description_cache', so the
+    same view of a database is only described once across requests.
+
     """
     cursor_params = {}
+    connection = None   # open Connection shared by a batch
+    chunk = CHUNK       # rows per chunk of a streamed reply
+    transport = None    # 'mmap' to hand rows over in a file
+    timings = None      # dict of step -> seconds, if profiling
+    description_cache = DescriptionCache()  # shared by all Services
 
-    def __init__(self, dbname=None, cursor_params={}):
+    def __init__(self, dbname=None, cursor_params={}, timings=None):
         """stub"""
         if dbname:
             self.dbname = dbname.encode()
@@ -20,15 +72,49 @@ class Service(object):
             
         if cursor_params:
             self.cursor_params = cursor_params
+        self.timings = timings
+
+    @contextlib.contextmanager
+    def _timed(self, step):
+        """Add the time spent in the block to 'timings', if profiling"""
+        if self.timings is None:
+            yield
+            return
+        t0 = time.time()
+        try:
+            yield
+        finally:
+            self.timings[step] = (self.timings.get(step, 0.0) +
+                                  time.time() - t0)
+
+    def _connect(self):
+        with self._timed('open'):
+            return dbapi2.connect(self.dbname,
+                                  description_cache=self.description_cache)
 
     def dbprocess(self, args):
         """
         connect to a db, run dbprocess, close connection
         """
         cmds = [c.encode() for c in args[0]]  # no Unicode support sux
-        with dbapi2.connect(self.dbname) as conn:
-            curs = conn.cursor(**self.cursor_params)
-            nrecs = curs.execute('dbprocess', [cmds])
+        if self.connection is None:
+            with self._connect() as conn:
+                return self._dbprocess(conn, cmds)
+        return self._dbprocess(self.connection, cmds)
+
+    def _cursor(self, conn, cmds):
+        """Return a Cursor on the view made by dbprocess 'cmds'"""
+        curs = conn.cursor(**self.cursor_params)
+        with self._timed('dbprocess'):
+            curs.execute('dbprocess', [cmds])
+        return curs
+
+    def _dbprocess(self, conn, cmds):
+        curs = self._cursor(conn, cmds)
+        if self.transport == 'mmap':
+            with self._timed('fetch'):
+                return {'mmap': shm.write_result(curs)}
+        with self._timed('fetch'):
             desc = curs.description
             rows = [c for c in curs]
         return {'cursor': {'description': desc, 'rows': rows}}
@@ -38,21 +124,284 @@ class Service(object):
             raise AttributeError("No such method: {0}".format(method))    
         return getattr(self, method)(args)
     
+    def run_batch(self, requests):
+        """
+        Turn a JSONRPC batch (list of dict requests) into a list of replies
+
+        All requests in the batch run on one open Connection. An entry
+        that isn't a dict gets an "Invalid Request" error reply.
+        """
+        if not requests:
+            return _error({'jsonrpc': '2.0', 'id': None},
+                          dbapi2.ProgrammingError("Empty batch"))
+        try:
+            conn = self._connect()
+        except Exception as e:
+            return _error(requests, e)
+        self.connection = conn
+        try:
+            return [self.run(r) if isinstance(r, dict) else _invalid(r)
+                    for r in requests]
+        finally:
+            self.connection = None
+            conn.close()
+
     def run(self, request):
         """
         Turn a JSONRPC dict request into a JSONRPC dict reply
+
+        A list of requests is run as a batch, see 'run_batch'
         """
+        if isinstance(request, list):
+            return self.run_batch(request)
+        if not isinstance(request, dict):
+            return _invalid(request)
         try:
             meth = request.get('method', 'dbprocess')
             params = request.pop('params')
             cmds = params.get('args', [])
             self.cursor_params = params.get('cursor', {})
+            self.transport = params.get('transport')
             result = self.execute(cmds, method=meth)
             request.update({'result': result})
         except Exception as e:
-            request.update({'error': {
-                'message': e.message, 
-                'type': e.__class__.__name__,
-                }
-            })
+            _error(request, e)
         return request
+
+    def stream(self, request, lines=False):
+        """
+        Turn a JSONRPC dict request into a generator of JSON reply text
+
+        The rows of a dbprocess result are encoded in chunks of 'chunk'
+        rows as the Cursor is iterated, and the database stays open until
+        the generator finishes or is closed. Other requests are run and
+        encoded whole, see 'run', as are requests for another transport.
+
+        If 'lines' is True, the reply is newline-delimited, see
+        'curds2.ws.stream.encode_lines', and a reply without rows is
+        one line.
+        """
+        def dump(reply):
+            return json.dumps(reply) + ('\n' if lines else '')
+
+        if not isinstance(request, dict) or \
+                request.get('method', 'dbprocess') != 'dbprocess' or \
+                (request.get('params') or {}).get('transport'):
+            yield dump(self.run(request))
+            return
+        try:
+            params = request.pop('params')
+            self.cursor_params = params.get('cursor', {})
+            cmds = [c.encode() for c in params.get('args', [])[0]]
+            conn = self._connect()
+        except Exception as e:
+            yield dump(_error(request, e))
+            return
+        try:
+            try:
+                curs = self._cursor(conn, cmds)
+                request['result'] = {
+                    'cursor': {'description': curs.description}}
+            except Exception as e:
+                yield dump(_error(request, e))
+                return
+            encode = encode_lines if lines else encode_reply
+            for text in encode(request, curs, self.chunk):
+                yield text
+        finally:
+            conn.close()
+
+
+class Dispatcher(object):
+    """
+    Run Service requests on a bounded pool of worker threads
+
+    Datascope calls block in C, so requests are handed to a pool and the
+    server keeps accepting (and answering cheap requests) while a heavy
+    join runs.
+
+    Attributes
+    ----------
+    pool          : thread pool with 'apply_async' (i.e. gevent or
+                    multiprocessing ThreadPool), made from 'workers' if None
+    workers       : int of number of threads for a new pool (4)
+    per_database  : int of max running requests per database (2)
+    max_pending   : int of max queued + running requests, any more are
+                    refused immediately (64)
+    timeout       : float of seconds a request may wait and run (300)
+    event_factory : Event class for requests waiting for their database,
+                    i.e. gevent.event.Event under gevent (threading.Event)
+    service       : Service class run for the requests
+
+    Notes
+    -----
+    Requests for a database at its 'per_database' limit wait in a queue
+    of that database, and only go to the pool when a slot frees up, so
+    they don't hold pool threads other databases could use.
+
+    A request which times out gets an error reply right away. If it is
+    still waiting for the pool or its database it is dropped, one already
+    running in C finishes in the background.
+
+    """
+    workers = 4
+    per_database = 2
+    max_pending = 64
+    timeout = 300.0
+    event_factory = threading.Event
+    service = Service
+
+    def __init__(self, pool=None, **kwargs):
+        for k, v in kwargs.items():
+            if hasattr(self, k):
+                self.__setattr__(k, v)
+        if pool is None:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(self.workers)
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._active = {}       # running requests per database
+        self._waiting = {}      # database -> list of Events of waiters
+        self._pending = 0
+
+    def _busy(self, request):
+        """Count a new request, return an error reply if there are too many"""
+        with self._lock:
+            if self._pending < self.max_pending:
+                self._pending += 1
+                return None
+            pending = self._pending
+        return _error(request, OperationalError(
+            "Service busy: {0} requests pending".format(pending)))
+
+    def _finish(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _acquire(self, dbname, deadline):
+        """
+        Take a slot on a database, waiting in its queue until 'deadline'
+
+        Returns False if the deadline passed first. Waiting is on an
+        'event_factory' Event, in the thread (or greenlet) of the caller.
+        """
+        with self._lock:
+            if time.time() >= deadline:
+                return False
+            if self._active.get(dbname, 0) < self.per_database:
+                self._active[dbname] = self._active.get(dbname, 0) + 1
+                return True
+            event = self.event_factory()
+            self._waiting.setdefault(dbname, []).append(event)
+        event.wait(max(0.0, deadline - time.time()))
+        with self._lock:
+            if event.is_set():
+                return True     # slot handed over by '_release'
+            self._waiting[dbname].remove(event)
+            if not self._waiting[dbname]:
+                del self._waiting[dbname]
+            return False
+
+    def _release(self, dbname):
+        """Give a slot on a database to its next waiter, or free it"""
+        with self._lock:
+            waiting = self._waiting.get(dbname)
+            if waiting:
+                waiting.pop(0).set()
+                if not waiting:
+                    del self._waiting[dbname]
+                return
+            self._active[dbname] -= 1
+            if not self._active[dbname]:
+                del self._active[dbname]
+
+    def _work(self, dbname, request, deadline, timings=None):
+        """Run a request in a worker thread, unless it timed out queued"""
+        if time.time() >= deadline:
+            return _error(request, OperationalError(
+                "Request timed out before it ran"))
+        try:
+            return self.service(dbname, timings=timings).run(request)
+        except Exception as e:
+            return _error(request, e)
+
+    def run(self, dbname, request, timings=None):
+        """
+        Turn a JSONRPC dict request into a JSONRPC dict reply using the pool
+
+        A 'timings' dict is passed on to the Service for profiling
+        """
+        busy = self._busy(request)
+        if busy is not None:
+            return busy
+        deadline = time.time() + self.timeout
+        if not self._acquire(dbname, deadline):
+            self._finish()
+            return _error(request, OperationalError(
+                "Timed out waiting for database: {0}".format(dbname)))
+        if isinstance(request, list):
+            work = [dict(r) if isinstance(r, dict) else r for r in request]
+        elif isinstance(request, dict):
+            work = dict(request)
+        else:
+            work = request
+        steps = {} if timings is not None else None   # merged when done
+
+        def done(reply):
+            self._release(dbname)
+            self._finish()
+        job = self.pool.apply_async(self._work,
+                                    (dbname, work, deadline, steps),
+                                    callback=done)
+        job.wait(max(0.0, deadline - time.time()))
+        if not job.ready():
+            return _error(request, OperationalError(
+                "Request timed out after {0}s".format(self.timeout)))
+        if timings is not None:
+            timings.update(steps)
+        return job.get()
+
+    @staticmethod
+    def _next(chunks, deadline=None):
+        """Return the next chunk, None at the end or past 'deadline'"""
+        if deadline is not None and time.time() >= deadline:
+            return None
+        return next(chunks, None)
+
+    def stream(self, dbname, request, lines=False):
+        """
+        Generator of JSON reply text of a request streamed from the pool
+
+        Each chunk of the Service 'stream' is made in a worker thread,
+        holding a slot on the database until the generator is finished
+        or closed. Waiting for the slot and the first chunk is limited
+        by 'timeout'.
+        """
+        def dump(reply):
+            return json.dumps(reply) + ('\n' if lines else '')
+
+        busy = self._busy(request)
+        if busy is not None:
+            yield dump(busy)
+            return
+        try:
+            deadline = time.time() + self.timeout
+            if not self._acquire(dbname, deadline):
+                yield dump(_error(request, OperationalError(
+                    "Timed out waiting for database: {0}".format(dbname))))
+                return
+            chunks = self.service(dbname).stream(dict(request), lines)
+            try:
+                text = self.pool.apply(self._next, (chunks, deadline))
+                if text is None:
+                    yield dump(_error(request, OperationalError(
+                        "Request timed out before it ran")))
+                    return
+                while text is not None:
+                    yield text
+                    text = self.pool.apply(self._next, (chunks,))
+            finally:
+                self.pool.apply(chunks.close)
+                self._release(dbname)
+        finally:
+            self._finish()
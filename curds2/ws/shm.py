@@ -0,0 +1,216 @@
+#
+"""
+Result handoff through memory-mapped files, for clients on the server host
+
+Instead of encoding rows as JSON, the server writes the result columns
+to a file in shared memory (/dev/shm where there is one) and replies
+with a handle: the path, description and the layout of the columns.
+The client maps the file and reads numeric columns in place, so NumPy
+arrays and DataFrames of them are made without copying.
+
+File layout
+-----------
+Columns one after the other, each starting on an 8-byte boundary.
+Typed columns (array.array) are their raw native buffer, other columns
+(strings, NULLs as None) are a JSON list.
+
+Notes
+-----
+Files are made readable by other users (FILE_MODE), as clients may
+run as another user than the server, so don't use the mmap transport
+for data other users of the host must not see.
+
+A client only maps files in DIRECTORY named like the server's, and
+removes the file once it is mapped, if it may (in a sticky /dev/shm
+only the owner can). Files nobody removed are swept by the server
+after MAX_AGE seconds. Both ends must be the same machine (native byte
+order and sizes).
+"""
+import array
+import glob
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+
+from curds2.api.core import InterfaceError
+
+PREFIX = 'curds-'
+SUFFIX = '.shm'
+MAX_AGE = 300.0     # seconds before an unclaimed file is removed
+ALIGN = 8
+FILE_MODE = 0o644   # readable by clients running as other users
+
+if os.path.isdir('/dev/shm'):
+    DIRECTORY = '/dev/shm'
+else:
+    DIRECTORY = tempfile.gettempdir()
+
+
+def sweep(directory=None, max_age=MAX_AGE):
+    """Remove result files in 'directory' older than 'max_age' seconds"""
+    old = time.time() - max_age
+    pattern = os.path.join(directory or DIRECTORY, PREFIX + '*' + SUFFIX)
+    for path in glob.glob(pattern):
+        try:
+            if os.path.getmtime(path) < old:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def write_result(cursor, directory=None):
+    """
+    Write the rest of the rows of a Cursor to a file, return the handle
+
+    Inputs
+    ------
+    cursor    : curds2 Cursor on a view
+    directory : str of directory for the file (DIRECTORY)
+
+    Returns
+    -------
+    dict of 'path', 'size', 'nrows', 'description' and 'columns', a list
+    of {'typecode', 'offset', 'length'} where 'typecode' is None for
+    JSON columns and 'length' is in bytes
+
+    """
+    directory = directory or DIRECTORY
+    sweep(directory)
+    result = cursor.fetchcolumns(cursor.rowcount)
+    fd, path = tempfile.mkstemp(prefix=PREFIX, suffix=SUFFIX, dir=directory)
+    columns = []
+    try:
+        os.fchmod(fd, FILE_MODE)
+        with os.fdopen(fd, 'wb') as f:
+            offset = 0
+            for col in result._columns:
+                pad = -offset % ALIGN
+                f.write('\0' * pad)
+                offset += pad
+                if isinstance(col, array.array):
+                    col.tofile(f)
+                    typecode = col.typecode
+                    length = len(col) * col.itemsize
+                else:
+                    text = json.dumps(col)
+                    f.write(text)
+                    typecode = None
+                    length = len(text)
+                columns.append({'typecode': typecode, 'offset': offset,
+                                'length': length})
+                offset += length
+    except Exception:
+        os.remove(path)
+        raise
+    return {'path': path, 'size': offset, 'nrows': len(result),
+            'description': result.description, 'columns': columns}
+
+
+class MappedColumn(object):
+    """
+    Typed column read in place from a mapped buffer
+
+    Supports len, indexing, slicing (to an array.array copy) and
+    iteration, and converts to a NumPy array without a copy.
+    """
+    __slots__ = ['typecode', '_buf', '_offset', '_count', '_struct']
+
+    def __init__(self, buf, offset, typecode, count):
+        self.typecode = typecode
+        self._buf = buf
+        self._offset = offset
+        self._count = count
+        self._struct = struct.Struct(typecode)
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return array.array(self.typecode, [
+                self[n] for n in xrange(*key.indices(self._count))])
+        if key < 0:
+            key += self._count
+        if not 0 <= key < self._count:
+            raise IndexError("column index out of range")
+        return self._struct.unpack_from(
+            self._buf, self._offset + key * self._struct.size)[0]
+
+    def __iter__(self):
+        for n in xrange(self._count):
+            yield self[n]
+
+    def __array__(self, dtype=None):
+        import numpy
+        if not self._count:
+            values = numpy.array([], dtype=self.typecode)
+        else:
+            values = numpy.frombuffer(self._buf, dtype=self.typecode,
+                                      count=self._count,
+                                      offset=self._offset)
+        if dtype is not None:
+            values = values.astype(dtype)
+        return values
+
+
+class ColumnRows(object):
+    """Sequence of rows (lists of values) over a list of columns"""
+    __slots__ = ['columns', '_nrows']
+
+    def __init__(self, columns, nrows):
+        self.columns = columns
+        self._nrows = nrows
+
+    def __len__(self):
+        return self._nrows
+
+    def __getitem__(self, n):
+        return [c[n] for c in self.columns]
+
+
+def _checked_path(path, directory=None):
+    """
+    Return the real path of a result file, raise InterfaceError unless it
+    is a result file in 'directory' (DIRECTORY)
+    """
+    real = os.path.realpath(path)
+    name = os.path.basename(real)
+    if os.path.dirname(real) != os.path.realpath(directory or DIRECTORY) \
+            or not (name.startswith(PREFIX) and name.endswith(SUFFIX)):
+        raise InterfaceError("Not a result file: {0}".format(path))
+    return real
+
+
+def read_result(handle, directory=None):
+    """
+    Map the file of a result handle, return list of columns
+
+    Typed columns are MappedColumns on the mapping, JSON columns lists.
+    The file is removed if this process may, the mapping stays until the
+    columns are gone. The path must be a result file in 'directory'
+    (DIRECTORY), see '_checked_path'.
+    """
+    path = _checked_path(handle['path'], directory)
+    try:
+        buf = None
+        if handle['size']:
+            with open(path, 'rb') as f:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    finally:
+        try:
+            os.remove(path)
+        except OSError:
+            pass    # not ours to remove, left for the server's sweep
+    nrows = handle['nrows']
+    columns = []
+    for col in handle['columns']:
+        offset, length = col['offset'], col['length']
+        if col['typecode'] is None:
+            columns.append(json.loads(buf[offset:offset + length]))
+        else:
+            columns.append(MappedColumn(buf, offset, str(col['typecode']),
+                                        nrows))
+    return columns
@@ -0,0 +1,290 @@
+#
+"""
+Streamed JSON for curds2 web service replies
+
+A reply with a cursor result is written as the JSONRPC envelope and the
+description, then the rows in chunks while the cursor is iterated, so
+the server never holds all the rows or the whole JSON text. It is the
+same JSON document as a 'jsonify' reply.
+
+The client reads it back with a ReplyReader, which parses the rows as
+they arrive instead of loading the whole body first.
+
+Newline-delimited streams (NDJSON) are also supported, for clients that
+process rows while the server is still scanning: a header line of the
+reply with the description, lines of JSON arrays of rows, then a
+trailer line of {"rowcount": n}, or {"error": {...}} on failure.
+"""
+import json
+import re
+import time
+
+from curds2.api.base import AdaptiveArraysize
+
+CHUNK = 1000    # rows per chunk of JSON text
+READ = 65536    # bytes per read of a reply
+NDJSON = 'application/x-ndjson'
+
+_ROWS = re.compile(r'"rows"\s*:\s*\[')
+_SPACE = re.compile(r'[\s,]*')
+_CLOSE = {'{': '}', '[': ']'}
+
+
+def _error_dict(e):
+    return {'message': str(e), 'type': e.__class__.__name__}
+
+
+def encode_reply(reply, rows, chunk=CHUNK):
+    """
+    Generator of str chunks of the JSON text of a cursor result reply
+
+    Inputs
+    ------
+    reply : dict of JSONRPC reply, with a result of
+            {'cursor': {'description': description}} and no rows
+    rows  : iterable of rows (sequences) for the 'rows' of the cursor
+    chunk : int of number of rows per chunk (CHUNK)
+
+    Notes
+    -----
+    The envelope is sent before the rows are read, so an error while
+    iterating can't replace the result. A JSONRPC reply can't have both,
+    so the error goes in the cursor as an 'error' member after the rows
+    sent so far, like the trailer line of 'encode_lines'.
+
+    """
+    envelope = dict(reply)
+    cursor = dict(envelope.pop('result')['cursor'])
+    description = cursor.pop('description')
+    head = json.dumps(envelope)[:-1]
+    if envelope:
+        head += ', '
+    yield ''.join([head, '"result": {"cursor": {"description": ',
+                   json.dumps(description), ', "rows": ['])
+    sep = ''
+    block = []
+    try:
+        for row in rows:
+            block.append(row)
+            if len(block) >= chunk:
+                yield sep + json.dumps(block)[1:-1]
+                sep = ', '
+                block = []
+        if block:
+            yield sep + json.dumps(block)[1:-1]
+    except Exception as e:
+        yield '], "error": ' + json.dumps(_error_dict(e)) + '}}}'
+        return
+    yield ']}}}'
+
+
+def encode_lines(reply, rows, chunk=CHUNK):
+    """
+    Generator of lines of a newline-delimited cursor result reply
+
+    Inputs
+    ------
+    reply : dict of JSONRPC reply, with a result of
+            {'cursor': {'description': description}} and no rows
+    rows  : iterable of rows (sequences) for the cursor
+    chunk : int of max number of rows per line (CHUNK)
+
+    Notes
+    -----
+    Lines start at one row, so the first rows go out as soon as they are
+    read, and are sized by an AdaptiveArraysize up to 'chunk' rows: they
+    double while the time per row to read and encode them drops. These
+    are the pages a streaming ws Cursor reads.
+
+    """
+    yield json.dumps(reply) + '\n'
+    nrows = 0
+    sizer = AdaptiveArraysize(start=1, maximum=chunk)
+    block = []
+    t0 = time.time()
+    try:
+        for row in rows:
+            block.append(row)
+            if len(block) >= sizer.size:
+                line = json.dumps(block) + '\n'
+                sizer.update(len(block), time.time() - t0)
+                yield line
+                nrows += len(block)
+                block = []
+                t0 = time.time()
+        if block:
+            yield json.dumps(block) + '\n'
+            nrows += len(block)
+    except Exception as e:
+        yield json.dumps({'error': _error_dict(e)}) + '\n'
+        return
+    yield json.dumps({'rowcount': nrows}) + '\n'
+
+
+def _closers(text):
+    """Return str closing the objects and arrays left open in JSON text"""
+    stack = []
+    string = escape = False
+    for c in text:
+        if string:
+            if escape:
+                escape = False
+            elif c == '\\':
+                escape = True
+            elif c == '"':
+                string = False
+        elif c == '"':
+            string = True
+        elif c in _CLOSE:
+            stack.append(_CLOSE[c])
+        elif c in '}]':
+            stack.pop()
+    return ''.join(reversed(stack))
+
+
+def _is_cursor(reply):
+    """Return bool of whether a reply has a cursor result with rows"""
+    result = reply.get('result')
+    return isinstance(result, dict) and \
+        isinstance(result.get('cursor'), dict) and 'rows' in result['cursor']
+
+
+class ReplyReader(object):
+    """
+    Read a JSONRPC reply from a file object, parsing rows as they arrive
+
+    Use like this:
+    >>> reader = ReplyReader(urllib2.urlopen(req))
+    >>> reader.reply['result']['cursor']['description']
+    >>> for row in reader:
+    ...     # rows of the cursor result, while the rest downloads
+    >>> reader.reply    # whole reply, 'rows' empty, with any 'error'
+    ...                 # of the cursor
+
+    Attributes
+    ----------
+    reply     : dict of reply. Until all rows are read, a cursor result
+                has just the description
+    streaming : bool of whether there are rows to iterate over
+
+    Notes
+    -----
+    Works with any JSON reply, streamed or not. Replies without a
+    cursor result are parsed whole on construction, even if they have
+    a 'rows' array somewhere else.
+
+    """
+    def __init__(self, fileobj, size=READ):
+        self._file = fileobj
+        self._size = size
+        self._buf = ''
+        self._pos = 0
+        self.streaming = False
+        start = 0
+        while True:
+            match = _ROWS.search(self._buf, start)
+            if match:
+                break
+            start = max(0, len(self._buf) - 16)
+            if not self._read():
+                self.reply = json.loads(self._buf)
+                return
+        head = self._buf[:match.start()] + '"rows": []'
+        closers = _closers(head)
+        reply = json.loads(head + closers)
+        if closers != '}}}' or not _is_cursor(reply):
+            while self._read():
+                pass
+            self.reply = json.loads(self._buf)
+            return
+        self._head = head
+        self.reply = reply
+        self._pos = match.end()
+        self.streaming = True
+
+    def _read(self):
+        """Append a read to the buffer, return False at end of file"""
+        data = self._file.read(self._size)
+        if not data:
+            return False
+        self._buf = self._buf[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def __iter__(self):
+        """Generator, yields rows until the end of the rows array"""
+        decode = json.JSONDecoder().raw_decode
+        while self.streaming:
+            self._pos = _SPACE.match(self._buf, self._pos).end()
+            if self._pos >= len(self._buf):
+                if not self._read():
+                    raise ValueError("Reply ended in the rows")
+                continue
+            if self._buf[self._pos] == ']':
+                self._finish()
+                return
+            try:
+                row, end = decode(self._buf, self._pos)
+            except ValueError:
+                if not self._read():
+                    raise
+                continue
+            self._pos = end
+            yield row
+
+    def _finish(self):
+        """Read the rest of the reply, which may end in a cursor 'error'"""
+        tail = self._buf[self._pos + 1:]
+        data = self._file.read()
+        while data:
+            tail += data
+            data = self._file.read()
+        self.reply = json.loads(self._head + tail)
+        self.streaming = False
+
+
+class LineReader(object):
+    """
+    Read a newline-delimited JSONRPC reply from a file object
+
+    Use like this:
+    >>> reader = LineReader(urllib2.urlopen(req))
+    >>> reader.reply['result']['cursor']['description']
+    >>> for row in reader:
+    ...     # rows of the cursor result, one line read at a time
+    >>> reader.rowcount
+
+    Attributes
+    ----------
+    reply     : dict of reply from the header line, gets any 'error'
+                from the trailer line
+    streaming : bool of whether there are rows to iterate over
+    rowcount  : int of number of rows, None until the trailer is read
+
+    """
+    def __init__(self, fileobj):
+        self._file = fileobj
+        self.reply = json.loads(fileobj.readline())
+        result = self.reply.get('result')
+        self.streaming = isinstance(result, dict) and \
+            'cursor' in result and 'rows' not in result['cursor']
+        self.rowcount = None
+
+    def __iter__(self):
+        """Generator, yields rows until the trailer line"""
+        while self.streaming:
+            line = self._file.readline()
+            if not line:
+                raise ValueError("Reply ended before the trailer line")
+            item = json.loads(line)
+            if isinstance(item, list):
+                for row in item:
+                    yield row
+                continue
+            self.streaming = False
+            if 'error' in item:
+                self.reply['error'] = item['error']
+            self.rowcount = item.get('rowcount')
+
+    def close(self):
+        self._file.close()
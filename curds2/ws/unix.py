@@ -0,0 +1,90 @@
+#
+"""
+HTTP over Unix domain sockets, for clients on the server host
+
+DSNs of the form 'unix://<socket path>:<dbname>' name the socket a
+curdsd is listening on and the database, e.g.
+
+unix:///var/run/curdsd.sock:/opt/antelope/data/db/demo/demo
+
+The client goes through urllib2 like for 'http' DSNs, with a handler for
+the 'unix' scheme. The socket path is carried percent-encoded as the
+host of the URL, which is how 'url' rewrites a DSN.
+"""
+import httplib
+import os
+import socket
+import stat
+import urllib
+import urllib2
+
+SCHEME = 'unix://'
+
+
+def is_unix(dsn):
+    """Return bool of whether 'dsn' is a Unix domain socket DSN"""
+    return dsn.startswith(SCHEME)
+
+
+def split(dsn):
+    """Return (socket path, dbname) of a 'unix://' DSN"""
+    path, sep, dbname = dsn[len(SCHEME):].partition(':')
+    if not sep or not path:
+        raise ValueError("Expected 'unix://<socket path>:<dbname>': " + dsn)
+    return path, dbname
+
+
+def url(dsn):
+    """Return str of the urllib2 URL of a 'unix://' DSN"""
+    path, dbname = split(dsn)
+    return SCHEME + urllib.quote(path, safe='') + '/' + dbname.lstrip('/')
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+    """HTTPConnection to the Unix socket at the unquoted 'host'"""
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+            sock.settimeout(self.timeout)
+        sock.connect(urllib.unquote(self.host))
+        self.sock = sock
+
+
+class UnixHandler(urllib2.AbstractHTTPHandler):
+    """urllib2 handler of 'unix' URLs, see 'url'"""
+    def unix_open(self, req):
+        return self.do_open(UnixHTTPConnection, req)
+
+    def unix_request(self, req):
+        if not req.has_header('Host'):
+            req.add_unredirected_header('Host', 'localhost')
+        return self.do_request_(req)
+
+
+def listener(path, mode=0o666, backlog=128):
+    """
+    Return a listening socket bound to the Unix domain socket 'path'
+
+    A socket file left at 'path' by a server that is gone is replaced,
+    anything else there (or a live server) is an error. The file gets
+    permissions 'mode'.
+    """
+    try:
+        is_socket = stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        is_socket = False
+    if is_socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(path)
+        except socket.error:
+            os.remove(path)
+        else:
+            raise socket.error("Socket in use: " + path)
+        finally:
+            sock.close()
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(path)
+    os.chmod(path, mode)
+    sock.listen(backlog)
+    return sock
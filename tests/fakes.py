@@ -0,0 +1,48 @@
+"""
+Fake Cursors for the unit tests that don't need a Datascope database
+"""
+from curds2.api.base import BaseCursor
+from curds2.api.core import DatabaseError
+
+description = [('orid', 2, None, 8, '%8ld', None, False),
+               ('time', 4, None, 17, '%17.5f', None, True)]
+
+rows = [(n, 704371900.0 + n) for n in range(100)]
+
+
+class ListCursor(BaseCursor):
+    """
+    Cursor over a list of rows, counting calls to '_getrow'
+
+    Constructor
+    -----------
+    ListCursor(rows=rows, description=description, **kwargs)
+
+    Any 'dbprocess' is run on the same rows, other operations raise a
+    DatabaseError as for an unknown command.
+    """
+    def __init__(self, rows=rows, description=description, **kwargs):
+        super(ListCursor, self).__init__(**kwargs)
+        self._description = description
+        self._rows = rows
+        self._record = -501
+        self.calls = 0
+
+    @property
+    def description(self):
+        return self._description
+
+    @property
+    def rowcount(self):
+        return len(self._rows)
+
+    def execute(self, operation, params=[]):
+        if operation != 'dbprocess':
+            raise DatabaseError("No such command available: " + operation)
+        return self.rowcount
+
+    def _getrow(self):
+        self.calls += 1
+        row = list(self._rows[self._record])
+        self._record += 1
+        return row
@@ -0,0 +1,112 @@
+"""
+Unit tests for curds2.ws.asyncapp
+"""
+import json
+import os
+import shutil
+import socket
+import SocketServer
+import tempfile
+import threading
+import time
+import unittest
+from curds2.ws.asyncapp import Server
+
+
+class SleepService(object):
+    """Service replying with its dbname after 'sleep' seconds"""
+    def __init__(self, dbname):
+        self.dbname = dbname
+
+    def run(self, request):
+        params = request.pop('params')
+        time.sleep(params.get('sleep', 0))
+        if params.get('done'):
+            open(params['done'], 'w').close()
+        request['result'] = self.dbname * params.get('repeat', 1)
+        return request
+
+
+class Handler(SocketServer.BaseRequestHandler):
+    def handle(self):
+        self.server.curds.handle(self.request, self.client_address)
+
+
+class ServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.httpd = SocketServer.ThreadingTCPServer(('127.0.0.1', 0),
+                                                     Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.curds = Server(service=SleepService, timeout=5.0)
+        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+        shutil.rmtree(self.dir)
+
+    def _send(self, params):
+        body = json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'dbprocess',
+                           'params': params})
+        sock = socket.create_connection(self.httpd.server_address)
+        sock.sendall('POST /tmp/demo HTTP/1.1\r\n'
+                     'Content-Type: application/json\r\n'
+                     'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+        return sock
+
+    def _reply(self, sock):
+        data = ''.join(iter(lambda: sock.recv(65536), ''))
+        sock.close()
+        head, body = data.split('\r\n\r\n', 1)
+        return head.split('\r\n')[0], json.loads(body)
+
+    def test_run(self):
+        status, reply = self._reply(self._send({'args': []}))
+        self.assertEqual(status, 'HTTP/1.1 200 OK')
+        self.assertEqual(reply['result'], '/tmp/demo')
+
+    def test_timeout(self):
+        t0 = time.time()
+        status, reply = self._reply(self._send({'sleep': 3, 'timeout': 0.2}))
+        self.assertLess(time.time() - t0, 2)
+        self.assertEqual(reply['error']['type'], 'OperationalError')
+
+    def test_hang_up(self):
+        done = os.path.join(self.dir, 'done')
+        self._send({'sleep': 0.5, 'done': done}).close()
+        time.sleep(1.0)
+        self.assertFalse(os.path.exists(done))
+
+    def test_bad_json(self):
+        sock = socket.create_connection(self.httpd.server_address)
+        sock.sendall('POST /tmp/demo HTTP/1.1\r\n'
+                     'Content-Length: 5\r\n\r\n{spam')
+        status, reply = self._reply(sock)
+        self.assertEqual(status, 'HTTP/1.1 400 Bad Request')
+
+    def test_large_reply(self):
+        status, reply = self._reply(self._send({'repeat': 20000}))
+        self.assertEqual(reply['result'], '/tmp/demo' * 20000)
+
+    def _headers(self, *headers):
+        sock = socket.create_connection(self.httpd.server_address)
+        sock.sendall('POST /tmp/demo HTTP/1.1\r\n' +
+                     ''.join(h + '\r\n' for h in headers) + '\r\n')
+        return self._reply(sock)[0]
+
+    def test_chunked(self):
+        self.assertEqual(self._headers('Transfer-Encoding: chunked'),
+                         'HTTP/1.1 411 Length Required')
+
+    def test_expect(self):
+        self.assertEqual(self._headers('Content-Length: 5',
+                                       'Expect: 100-continue'),
+                         'HTTP/1.1 417 Expectation Failed')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,215 @@
+"""
+Unit tests for curds2.api.base
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from curds2.api.base import AdaptiveArraysize, BaseCursor, DescriptionCache
+from tests.fakes import ListCursor, description, rows
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class AdaptiveArraysizeTestCase(unittest.TestCase):
+
+    def test_grow(self):
+        sizer = AdaptiveArraysize(start=4, maximum=20)
+        self.assertEqual(sizer.update(4, 4.0), 8)
+        self.assertEqual(sizer.update(8, 4.0), 16)
+        self.assertEqual(sizer.update(16, 4.0), 20)
+        self.assertEqual(sizer.update(20, 4.0), 20)
+
+    def test_settle(self):
+        sizer = AdaptiveArraysize(start=4)
+        sizer.update(4, 4.0)
+        self.assertEqual(sizer.update(8, 8.0), 8)
+        self.assertEqual(sizer.update(8, 7.6), 8)
+        self.assertEqual(sizer.update(8, 8.0), 8)
+        self.assertEqual(sizer.update(8, 1.0), 8)
+
+    def test_noise(self):
+        sizer = AdaptiveArraysize(start=4)
+        sizer.update(4, 4.0)
+        self.assertEqual(sizer.update(8, 9.0), 8)
+        self.assertEqual(sizer.update(8, 4.0), 16)
+        self.assertEqual(sizer.update(16, 4.0), 32)
+
+    def test_short_block(self):
+        sizer = AdaptiveArraysize(start=4)
+        self.assertEqual(sizer.update(3, 1.0), 4)
+
+
+class PrefetchTestCase(unittest.TestCase):
+
+    def test_iter(self):
+        curs = ListCursor()
+        self.assertEqual(list(curs), rows)
+        self.assertEqual(curs.calls, len(rows))
+
+    def test_iter_fetch_override(self):
+        class FetchCursor(ListCursor):
+            def _fetch(self):
+                return ('fetched', super(FetchCursor, self)._fetch())
+        curs = FetchCursor()
+        self.assertTrue(FetchCursor._fetch_overridden())
+        self.assertFalse(ListCursor._fetch_overridden())
+        self.assertEqual(list(curs), [('fetched', r) for r in rows])
+
+    def test_iter_position(self):
+        curs = ListCursor()
+        for row in curs:
+            if row[0] == 9:
+                break
+        self.assertEqual(curs.rownumber, 10)
+        self.assertEqual(curs.fetchone(), rows[10])
+
+    def test_prefetch_rows(self):
+        curs = ListCursor()
+        curs.prefetch_bytes = 250
+        self.assertEqual(curs._prefetch_rows(), 10)
+
+    def test_no_prefetch(self):
+        curs = ListCursor()
+        curs.PREFETCH = False
+        self.assertEqual(list(curs), rows)
+
+
+class IterColumnsTestCase(unittest.TestCase):
+
+    def test_blocks(self):
+        results = list(ListCursor().iter_columns(40))
+        self.assertEqual([len(r) for r in results], [40, 40, 20])
+        self.assertEqual(results[1][0], rows[40])
+
+    def test_arraysize(self):
+        curs = ListCursor()
+        curs.arraysize = 30
+        self.assertEqual([len(r) for r in curs.iter_columns()],
+                         [30, 30, 30, 10])
+
+
+class PointerTestCase(unittest.TestCase):
+
+    def test_shared_list(self):
+        curs = ListCursor()
+        dbptr = curs._dbptr
+        self.assertIs(curs._dbptr, dbptr)
+        curs._record = 5
+        self.assertEqual(dbptr, [None, None, None, 5])
+
+    def test_setter_copies_in(self):
+        curs = ListCursor()
+        dbptr = curs._dbptr
+        new = [0, 1, -501, 0]
+        curs._dbptr = new
+        self.assertIs(curs._dbptr, dbptr)
+        self.assertEqual(dbptr, new)
+        curs._record = 3
+        self.assertEqual(new[3], 0)
+        self.assertEqual((curs._database, curs._table, curs._field),
+                         (0, 1, -501))
+
+    def test_no_super_init(self):
+        class NoInitCursor(BaseCursor):
+            description = description
+            rowcount = len(rows)
+
+            def __init__(self):
+                pass
+
+            def _getrow(self):
+                row = rows[self._record]
+                self._record += 1
+                return row
+        curs = NoInitCursor()
+        self.assertEqual(curs._record, None)
+        self.assertEqual(list(curs), rows)
+        self.assertIsNot(NoInitCursor()._dbptr, curs._dbptr)
+
+
+class DescriptionCacheTestCase(unittest.TestCase):
+
+    def test_get(self):
+        cache = DescriptionCache()
+        self.assertIsNone(cache.get('origin'))
+        cache.put('origin', description)
+        cached = cache.get('origin')
+        self.assertEqual(cached, description)
+        cached.append(('junk',))
+        self.assertEqual(cache.get('origin'), description)
+
+    def test_bounded(self):
+        cache = DescriptionCache(maxsize=2)
+        cache.put('origin', description)
+        cache.put('arrival', description)
+        cache.get('origin')
+        cache.put('assoc', description)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('arrival'))
+        self.assertIsNotNone(cache.get('origin'))
+
+
+@unittest.skipIf(pandas is None, "pandas not installed")
+class DataFrameTestCase(unittest.TestCase):
+
+    def test_whole(self):
+        df = ListCursor().to_dataframe()
+        self.assertEqual(len(df), len(rows))
+        self.assertEqual(list(df['orid']), [r[0] for r in rows])
+
+    def test_chunks(self):
+        frames = list(ListCursor().to_dataframe(chunksize=40))
+        self.assertEqual([len(df) for df in frames], [40, 40, 20])
+        self.assertEqual(frames[1]['orid'][0], 40)
+
+    def test_datetimes(self):
+        curs = ListCursor()
+        curs.CONVERT_DATETIME = True
+        self.assertEqual(curs.to_dataframe()['time'].dtype.kind, 'M')
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow not installed")
+class ArrowTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def test_table(self):
+        table = ListCursor().to_arrow()
+        self.assertEqual(table.num_rows, len(rows))
+        self.assertEqual(table.column('time').to_pylist(),
+                         [r[1] for r in rows])
+
+    def test_batches(self):
+        batches = list(ListCursor().to_arrow(chunksize=40))
+        self.assertEqual([b.num_rows for b in batches], [40, 40, 20])
+
+    def test_dotted_names(self):
+        dotted = [('origin.orid',) + description[0][1:], description[1]]
+        table = ListCursor(description=dotted).to_arrow()
+        self.assertEqual(table.schema.names, ['origin_orid', 'time'])
+
+    def test_write_parquet(self):
+        path = os.path.join(self.dir, 'origin.parquet')
+        self.assertEqual(ListCursor().write_parquet(path, row_group_size=30),
+                         len(rows))
+        parquet = pyarrow.parquet.ParquetFile(path)
+        self.assertEqual(parquet.metadata.num_row_groups, 4)
+        self.assertEqual(parquet.metadata.row_group(3).num_rows, 10)
+        self.assertEqual(parquet.read().column('orid').to_pylist(),
+                         [r[0] for r in rows])
+
+
+if __name__ == '__main__':
+    unittest.main()
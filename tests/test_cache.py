@@ -0,0 +1,59 @@
+"""
+Unit tests for curds2.cache
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from curds2 import inotify
+from curds2.cache import TableWatcher
+
+
+class TableWatcherTestCase(unittest.TestCase):
+
+    INOTIFY = False
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.paths = {'origin': os.path.join(self.dir, 'demo.origin'),
+                      'arrival': os.path.join(self.dir, 'demo.arrival')}
+        open(self.paths['origin'], 'w').write('1\n')
+        self.watcher = TableWatcher(self.paths, interval=0.0,
+                                    INOTIFY=self.INOTIFY)
+
+    def test_unchanged(self):
+        self.assertEqual(self.watcher.versions(), {'origin': 0, 'arrival': 0})
+
+    def test_append(self):
+        open(self.paths['origin'], 'a').write('2\n')
+        self.assertTrue(self.watcher.version('origin') > 0)
+        self.assertEqual(self.watcher.version('arrival'), 0)
+
+    def test_create(self):
+        open(self.paths['arrival'], 'w').write('1\n')
+        v = self.watcher.version('arrival')
+        self.assertTrue(v > 0)
+        open(self.paths['arrival'], 'a').write('2\n')
+        self.assertTrue(self.watcher.version('arrival') > v)
+
+    def tearDown(self):
+        self.watcher.close()
+        shutil.rmtree(self.dir)
+
+
+@unittest.skipUnless(inotify.available(), "inotify not available")
+class InotifyTableWatcherTestCase(TableWatcherTestCase):
+
+    INOTIFY = True
+
+    def test_overflow(self):
+        notify = self.watcher._notify
+        os.close(notify.fd)
+        notify.fd, w = os.pipe()
+        os.write(w, inotify._EVENT.pack(-1, inotify.IN_Q_OVERFLOW, 0, 0))
+        os.close(w)
+        self.assertEqual(self.watcher.versions(), {'origin': 1, 'arrival': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
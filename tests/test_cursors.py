@@ -0,0 +1,272 @@
+"""
+Unit tests for curds2.cursors, with the Datascope calls stubbed
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from curds2 import inotify
+from curds2.api.base import BaseConnection
+from curds2.api.core import DatabaseError
+from curds2.cursors import InteractiveCursor, TailCursor
+from curds2.raw.dbapi2 import Cursor as RawCursor, ds
+
+FIELDS = ['orid', 'time', 'auth']
+
+
+class StubDatascope(object):
+    """
+    Stand-in for the Datascope calls of the 'ds' module, records writes
+
+    Names are set in the 'ds' instance dict, so they are found before
+    the antelope library is imported, and removed again by 'restore'.
+    """
+    names = {'dbALL': -501, 'dbINVALID': -102, 'dbNULL': -302,
+             'dbTABLE_NAME': 'dbTABLE_NAME',
+             'dbRECORD_COUNT': 'dbRECORD_COUNT',
+             'dbTABLE_IS_VIEW': 'dbTABLE_IS_VIEW'}
+
+    def __init__(self, nrecs=10):
+        self.nrecs = nrecs
+        self.puts = []
+        self.fail = None    # record number to fail a _dbputv on
+        self._saved = {}
+        names = dict(self.names, _dbquery=self._dbquery,
+                     _dbputv=self._dbputv, _dblookup=self._dblookup)
+        for name, value in names.items():
+            if name in ds.__dict__ and name in self.names:
+                continue
+            self._saved[name] = ds.__dict__.get(name)
+            ds.__dict__[name] = value
+
+    def restore(self):
+        for name, value in self._saved.items():
+            if value is None:
+                del ds.__dict__[name]
+            else:
+                ds.__dict__[name] = value
+
+    def _dbquery(self, dbptr, code):
+        if code == ds.dbTABLE_NAME:
+            return 'origin'
+        if code == ds.dbRECORD_COUNT:
+            return self.nrecs
+        if code == ds.dbTABLE_IS_VIEW:
+            return 0
+        raise KeyError(code)
+
+    def _dblookup(self, dbptr, *args):
+        return [dbptr[0], 1, ds.dbALL, ds.dbALL]
+
+    def _dbputv(self, dbptr, table, *args):
+        if dbptr[3] == self.fail:
+            raise DatabaseError("dbputv failed")
+        self.puts.append((dbptr[3], dict(zip(args[::2], args[1::2]))))
+
+
+class ViewDatascope(StubDatascope):
+    """
+    StubDatascope answering the 'description' queries for a view
+
+    The view at any table index is of the 'tables' attribute, its last
+    table sets the field type, so a reused index can be told apart.
+    """
+    names = dict(StubDatascope.names, **dict(
+        (name, name) for name in ['dbTABLE_FIELDS', 'dbVIEW_TABLES',
+                                  'dbPRIMARY_KEY', 'dbFIELD_TYPE',
+                                  'dbFORMAT', 'dbFIELD_SIZE',
+                                  'dbFIELD_FORMAT']))
+    types = {'origin': 4, 'event': 2}
+
+    def __init__(self, *args, **kwargs):
+        super(ViewDatascope, self).__init__(*args, **kwargs)
+        self.tables = ['origin', 'assoc']
+
+    def _dbquery(self, dbptr, code):
+        if code == ds.dbTABLE_IS_VIEW:
+            return 1
+        if code == ds.dbVIEW_TABLES:
+            return list(self.tables)
+        if code == ds.dbTABLE_FIELDS:
+            return ['orid']
+        if code == ds.dbPRIMARY_KEY:
+            return ['orid']
+        if code == ds.dbFIELD_TYPE:
+            return self.types.get(self.tables[-1], 6)
+        if code in (ds.dbFORMAT, ds.dbFIELD_SIZE, ds.dbFIELD_FORMAT):
+            return None
+        return super(ViewDatascope, self)._dbquery(dbptr, code)
+
+
+class StubCursor(InteractiveCursor):
+    """InteractiveCursor with a fixed description"""
+    description = [(name, None, None, None, None, None, True)
+                   for name in FIELDS]
+
+
+class StubTailCursor(TailCursor):
+    """TailCursor with rows of the record number, on one table file"""
+    interval = 0.05
+    path = None
+
+    def _fetch(self):
+        row = (self._record,)
+        self._record += 1
+        return row
+
+    def _table_files(self):
+        return [self.path]
+
+
+class InteractiveCursorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ds = StubDatascope()
+        self.conn = BaseConnection('demo')
+        self.curs = StubCursor([0, 0, -501, 0], connection=self.conn,
+                               BUFFER_WRITES=True)
+
+    def tearDown(self):
+        self.ds.restore()
+
+    def test_unbuffered(self):
+        self.curs.BUFFER_WRITES = False
+        row = self.curs.fetchone()
+        row['auth'] = 'JSPC'
+        self.assertEqual(self.ds.puts, [(0, {'auth': 'JSPC'})])
+
+    def test_buffered(self):
+        row = self.curs.fetchone()
+        row['auth'] = 'JSPC'
+        row.update({'orid': 5, 'spam': 1})
+        self.assertEqual(self.ds.puts, [])
+        self.assertEqual(row['auth'], 'JSPC')
+        self.curs.flush()
+        self.assertEqual(self.ds.puts, [(0, {'auth': 'JSPC', 'orid': 5})])
+        self.curs.flush()
+        self.assertEqual(len(self.ds.puts), 1)
+
+    def test_row_change(self):
+        self.curs.fetchone()['auth'] = 'JSPC'
+        self.curs.fetchone()
+        self.assertEqual(self.ds.puts, [(0, {'auth': 'JSPC'})])
+
+    def test_buffer_size(self):
+        self.curs.buffer_size = 3
+        rows = [self.curs.fetchone() for n in range(3)]
+        for n, row in enumerate(rows):
+            row['orid'] = n
+        self.assertEqual([p[0] for p in self.ds.puts], [0, 1, 2])
+        self.assertEqual(self.curs._dirty_rows, [])
+
+    def test_iter(self):
+        self.ds.nrecs = 3
+        for n, row in enumerate(self.curs):
+            self.assertEqual(len(self.ds.puts), n)
+            row['orid'] = n
+        self.curs.flush()
+        self.assertEqual(self.ds.puts,
+                         [(n, {'orid': n}) for n in range(3)])
+
+    def test_commit(self):
+        self.curs.fetchone()['auth'] = 'JSPC'
+        self.conn.commit()
+        self.assertEqual(self.ds.puts, [(0, {'auth': 'JSPC'})])
+
+    def test_failed_flush(self):
+        rows = [self.curs.fetchone() for n in range(3)]
+        for row in rows:
+            row['orid'] = 1
+        self.ds.fail = 1
+        self.assertRaises(DatabaseError, self.curs.flush)
+        self.assertEqual([p[0] for p in self.ds.puts], [0])
+        self.assertEqual([id(r) for r in self.curs._dirty_rows],
+                         [id(r) for r in rows[1:]])
+        self.ds.fail = None
+        self.curs.flush()
+        self.assertEqual([p[0] for p in self.ds.puts], [0, 1, 2])
+        self.assertEqual(self.curs._dirty_rows, [])
+
+
+class DescriptionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ds = ViewDatascope()
+        self.conn = BaseConnection('demo')
+
+    def tearDown(self):
+        self.ds.restore()
+
+    def test_cached(self):
+        curs = RawCursor([0, 3, -501, -501], connection=self.conn)
+        other = RawCursor([0, 3, -501, -501], connection=self.conn)
+        self.assertIs(curs.description[0], other.description[0])
+
+    def test_reused_view(self):
+        curs = RawCursor([0, 3, -501, -501], connection=self.conn)
+        self.assertEqual(curs.description[0].type_code, 6)
+        self.ds.tables = ['origin', 'event']
+        self.assertEqual(curs.description[0].type_code, 2)
+
+
+class TailCursorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ds = StubDatascope(nrecs=3)
+        self.curs = StubTailCursor([0, -501, -501, -501], INOTIFY=False)
+        self.assertEqual(self.curs.execute('dblookup', ('', 'origin')), 3)
+
+    def tearDown(self):
+        self.curs.close()
+        self.ds.restore()
+
+    def _append(self, nrecs, delay):
+        """Add records after 'delay' seconds, in another thread"""
+        def append():
+            self.ds.nrecs += nrecs
+            if self.curs.path:
+                open(self.curs.path, 'a').write('record\n' * nrecs)
+        timer = threading.Timer(delay, append)
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def test_fetchnew(self):
+        self.assertEqual(self.curs.fetchnew(), [])
+        self.ds.nrecs = 5
+        self.assertEqual(self.curs.poll(), 2)
+        self.assertEqual(self.curs.fetchnew(), [(3,), (4,)])
+        self.assertEqual(self.curs.fetchnew(), [])
+        self.assertEqual(self.curs.poll(), 0)
+
+    def test_wait_for_new(self):
+        self._append(2, 0.2)
+        self.assertEqual(self.curs.wait_for_new(timeout=5.0), 2)
+        self.assertEqual(self.curs.fetchnew(), [(3,), (4,)])
+
+    def test_wait_timeout(self):
+        t0 = time.time()
+        self.assertEqual(self.curs.wait_for_new(timeout=0.2), 0)
+        self.assertLess(time.time() - t0, 1.0)
+
+    def test_tail(self):
+        self._append(1, 0.1)
+        self.assertEqual(list(self.curs.tail(timeout=0.5)), [(3,)])
+
+    @unittest.skipUnless(inotify.available(), "inotify not available")
+    def test_wait_inotify(self):
+        dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, dir)
+        self.curs.path = os.path.join(dir, 'demo.origin')
+        open(self.curs.path, 'w').close()
+        self.curs.INOTIFY = True
+        self.curs.interval = 10.0
+        self._append(1, 0.2)
+        t0 = time.time()
+        self.assertEqual(self.curs.wait_for_new(timeout=20.0), 1)
+        self.assertLess(time.time() - t0, 5.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -55,10 +55,14 @@ class ConnectionTestCase(unittest.TestCase):
     def test_cursor_close(self):
         """Test Cursor close"""
         # Test we are connected to the DB
-        curs = Connection(self.dsn).cursor()
+        conn = Connection(self.dsn)
+        curs = conn.cursor()
         dbptr = Dbptr(getattr(curs, '_dbptr'))
         self.assertNotEqual( dbptr.query('dbDATABASE_COUNT'), 0 )
         curs.close()
+        # The database is left open for the other Cursors
+        self.assertNotEqual( dbptr.query('dbDATABASE_COUNT'), 0 )
+        conn.close()
         self.assertEqual( dbptr.query('dbDATABASE_COUNT'), 0 )
 
 
@@ -156,6 +160,28 @@ class CursorTestCase(unittest.TestCase):
         seq = self.curs.fetchall()
         self.assertEqual(len(seq), self.NRECS_ORIGIN-4)
 
+    def test_fetchcolumns(self):
+        nrecs0 = self.curs.execute('lookup', {'table':'origin'})
+        self.curs.scroll(0, 'absolute')
+        rs = self.curs.fetchcolumns(5)
+        self.assertEqual(len(rs), 5)
+        self.assertEqual(rs[0], demo_origin_record_0)
+        self.assertEqual(self.curs.rownumber, 5)
+
+    def test_to_dataframe(self):
+        nrecs0 = self.curs.execute('lookup', {'table':'origin'})
+        self.curs.scroll(0, 'absolute')
+        chunks = list(self.curs.to_dataframe(chunksize=500))
+        self.assertEqual([len(df) for df in chunks], [500, 500, 351])
+        self.assertEqual(list(chunks[0].columns), [d[0] for d in self.curs.description])
+
+    def test_to_arrow(self):
+        nrecs0 = self.curs.execute('process', [('dbopen origin', 'dbjoin assoc')])
+        table = self.curs.to_arrow()
+        self.assertEqual(table.num_rows, nrecs0)
+        self.assertEqual(table.schema.names,
+                         [f.replace('.', '_') for f in demo_origin_assoc_fields])
+
     def test_scroll(self):
         nrecs0 = self.curs.execute('lookup', {'table':'origin'})
         self.curs.scroll(5, 'absolute')
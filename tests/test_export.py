@@ -0,0 +1,44 @@
+"""
+Unit tests for curds2.export
+"""
+import unittest
+from StringIO import StringIO
+from curds2.export import export_csv, export_tsv, formatter
+from tests.fakes import ListCursor
+
+description = [('orid', 2, None, 8, '%8ld', None, False),
+               ('time', 4, None, 17, '%17.5f', None, True),
+               ('ml', 3, None, 7, '%7.2f', None, True),
+               ('auth', 6, None, 15, '%-15s', None, True)]
+
+rows = [(1, 704371900.66886, 2.62, 'JSPC'),
+        (2, 704372222.0, None, 'UNR, NV'),
+        (3, 704373333.5, -999.0, '-')]
+
+
+class ExportTestCase(unittest.TestCase):
+
+    def test_formatter(self):
+        self.assertEqual(formatter(4)(704371900.66886), '704371900.66886')
+        self.assertEqual(formatter(3, '%7.2f')(2.6243), '2.62')
+        self.assertEqual(formatter(2, '%8ld')(715), '715')
+        self.assertEqual(formatter(3, '%7.2f')(None), '')
+
+    def test_export_csv(self):
+        f = StringIO()
+        nrows = export_csv(ListCursor(rows, description), f, chunk=2)
+        self.assertEqual(nrows, 3)
+        lines = f.getvalue().splitlines()
+        self.assertEqual(lines[0], 'orid,time,ml,auth')
+        self.assertEqual(lines[1], '1,704371900.66886,2.62,JSPC')
+        self.assertEqual(lines[2], '2,704372222.00000,,"UNR, NV"')
+        self.assertEqual(len(lines), 4)
+
+    def test_export_fields(self):
+        f = StringIO()
+        export_tsv(ListCursor(rows, description), f, fields=['auth', 'orid'], header=False)
+        self.assertEqual(f.getvalue().splitlines()[-1], '-\t3')
+
+
+if __name__ == '__main__':
+    unittest.main()
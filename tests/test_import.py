@@ -0,0 +1,36 @@
+"""
+Tests that importing curds2 modules defers the slow optional imports
+"""
+import subprocess
+import sys
+import unittest
+from curds2 import rows
+
+check_modules = """
+import sys
+import curds2.dbapi2, curds2.cursors, curds2.rows
+print(','.join(m for m in ('antelope', 'obspy') if m in sys.modules))
+"""
+
+
+class ImportTestCase(unittest.TestCase):
+
+    def test_lazy_imports(self):
+        """Test Antelope and ObSpy aren't imported with curds2 modules"""
+        out = subprocess.check_output([sys.executable, '-c', check_modules])
+        self.assertEqual(out.strip(), '')
+
+    def test_utcdatetime_shim(self):
+        """Test rows.UTCDateTime makes instances of the loaded class"""
+        class UTCDateTime(float):
+            pass
+        saved, rows._UTCDateTime = rows._UTCDateTime, UTCDateTime
+        try:
+            self.assertIsInstance(rows.UTCDateTime(1.5), UTCDateTime)
+            self.assertEqual(rows.UTCDateTime(1.5), 1.5)
+        finally:
+            rows._UTCDateTime = saved
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+"""
+Unit tests for curds2.index
+"""
+import os
+import shutil
+import tempfile
+import unittest
+import datetime
+from curds2 import index
+from curds2.cache import _signature
+from curds2.raw.dbapi2 import Cursor as RawCursor, ds
+from tests.fakes import ListCursor, description, rows
+from tests.test_cursors import StubDatascope
+
+NULLS = [-1, -9999999999.999]
+
+
+class StubRawCursor(RawCursor):
+    """Raw Cursor on the fake rows and a row of NULLs"""
+    description = description
+    rowcount = len(rows) + 1
+
+    def _getvalues(self, builder):
+        return list((rows + [NULLS])[self._record])
+
+
+class ZoneMapTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'demo.arrival')
+        open(self.path, 'w').write('arrival rows\n')
+        zones = index._zones(ListCursor(), 30)
+        self.zonemap = index.ZoneMap(self.path, _signature(self.path),
+                                     len(rows), 30, zones)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_zones(self):
+        self.assertEqual(self.zonemap.zones['orid'],
+                         [[0, 29], [30, 59], [60, 89], [90, 99]])
+
+    def test_blocks(self):
+        blocks = self.zonemap.blocks
+        self.assertEqual(blocks('orid', 35, 40), [[30, 60]])
+        self.assertEqual(blocks('orid', 50, 95), [[30, 100]])
+        self.assertEqual(blocks('orid', 200, 300), [])
+        self.assertEqual(blocks('sta', 'A', 'B'), [[0, 100]])
+
+    def test_load(self):
+        self.assertTrue(self.zonemap.save())
+        zonemap = index.ZoneMap.load(self.path)
+        self.assertEqual(zonemap.zones, self.zonemap.zones)
+        self.assertEqual(zonemap.blocks('time', 704371900.0, 704371905.0),
+                         [[0, 30]])
+        open(self.path, 'a').write('more arrival rows\n')
+        self.assertIsNone(index.ZoneMap.load(self.path))
+
+
+class RangesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.ds = StubDatascope()
+        self.addCleanup(self.ds.restore)
+        for name, value in [('dbTIME', 4), ('dbYEARDAY', 5),
+                            ('_dbgetv', self._dbgetv)]:
+            if name not in ds.__dict__:
+                ds.__dict__[name] = value
+                self.addCleanup(ds.__dict__.pop, name)
+        zones = index._zones(ListCursor(), 30)
+        self.zonemap = index.ZoneMap(None, None, len(rows) + 1, 30, zones)
+
+    def _dbgetv(self, dbptr, table, *fields):
+        nulls = dict(zip([d[0] for d in description], NULLS))
+        return 0, [nulls[f] for f in fields]
+
+    def _subset(self, low, high, **kwargs):
+        curs = StubRawCursor([0, 1, -501, -501], **kwargs)
+        return list(index.subset(curs, 'time', low, high, self.zonemap))
+
+    def test_range(self):
+        self.assertEqual(self._subset(704371935.0, 704371937.0),
+                         [rows[35], rows[36], rows[37]])
+
+    def test_nulls(self):
+        self.assertEqual(len(self._subset(-1e11, 1e11)), len(rows))
+
+    def test_datetimes(self):
+        found = self._subset(704371935.0, 704371936.0, CONVERT_DATETIME=True)
+        self.assertEqual([r[0] for r in found], [35, 36])
+        self.assertIsInstance(found[0][1], datetime.datetime)
+
+
+if __name__ == '__main__':
+    unittest.main()
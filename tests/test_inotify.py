@@ -0,0 +1,57 @@
+"""
+Unit tests for curds2.inotify
+"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from curds2 import inotify
+
+
+@unittest.skipUnless(inotify.available(), "inotify not available")
+class InotifyTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'demo.origin')
+        self.notify = inotify.Inotify()
+        self.notify.add_watch(self.dir)
+
+    def tearDown(self):
+        self.notify.close()
+        shutil.rmtree(self.dir)
+
+    def test_read(self):
+        open(self.path, 'w').write('record\n')
+        self.assertEqual(self.notify.read(timeout=1.0), set([self.path]))
+
+    def test_timeout(self):
+        self.assertEqual(self.notify.read(timeout=0.1), set())
+
+    def test_wake(self):
+        timer = threading.Timer(0.1, lambda: open(self.path, 'w').close())
+        timer.start()
+        self.assertEqual(self.notify.read(timeout=5.0), set([self.path]))
+        timer.join()
+
+    def test_overflow(self):
+        os.close(self.notify.fd)
+        self.notify.fd, w = os.pipe()
+        os.write(w, inotify._EVENT.pack(-1, inotify.IN_Q_OVERFLOW, 0, 0))
+        os.close(w)
+        self.assertEqual(self.notify.read(timeout=1.0),
+                         set([inotify.OVERFLOW]))
+
+    def test_bad_watch(self):
+        self.assertRaises(OSError, self.notify.add_watch,
+                          os.path.join(self.dir, 'spam'))
+
+    def test_close(self):
+        with inotify.Inotify() as notify:
+            pass
+        self.assertEqual(notify.fd, -1)
+
+
+if __name__ == '__main__':
+    unittest.main()
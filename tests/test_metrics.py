@@ -0,0 +1,53 @@
+"""
+Unit tests for curds2.ws.metrics
+"""
+import unittest
+from curds2.ws.metrics import Histogram, Metrics, command_pattern
+
+
+class MetricsTestCase(unittest.TestCase):
+
+    def test_command_pattern(self):
+        req = {'method': 'dbprocess',
+               'params': {'args': [['dbopen origin',
+                                    'dbsubset orid==715',
+                                    'dbsubset auth=~/"UNR"/']]}}
+        self.assertEqual(command_pattern(req),
+                         'dbprocess | dbopen origin | dbsubset orid==? | '
+                         'dbsubset auth=~/?/')
+        self.assertEqual(command_pattern([req]), 'batch')
+        self.assertEqual(command_pattern({}), 'dbprocess')
+        self.assertEqual(command_pattern(None), 'invalid')
+        self.assertEqual(command_pattern(1), 'invalid')
+
+    def test_histogram(self):
+        h = Histogram((0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            h.observe(value)
+        self.assertEqual(h.counts, [1, 2])
+        self.assertEqual(h.count, 3)
+        self.assertAlmostEqual(h.sum, 5.55)
+
+    def test_render(self):
+        m = Metrics()
+        m.observe('/db', 'dbprocess', {'fetch': 0.002, 'size': 2048})
+        m.observe('/db', 'dbprocess', {'fetch': 0.2, 'size': 4096})
+        text = m.render()
+        self.assertIn('curds_fetch_seconds_bucket{database="/db",'
+                      'pattern="dbprocess",le="0.0025"} 1', text)
+        self.assertIn('curds_fetch_seconds_count{database="/db",'
+                      'pattern="dbprocess"} 2', text)
+        self.assertIn('curds_response_bytes_sum{database="/db",'
+                      'pattern="dbprocess"} 6144', text)
+
+    def test_render_types(self):
+        m = Metrics()
+        m.observe('/db', 'dbprocess', {'fetch': 0.002, 'size': 2048})
+        m.observe('/db2', 'dbprocess', {'fetch': 0.2})
+        types = [l for l in m.render().splitlines() if l.startswith('#')]
+        self.assertEqual(types, ['# TYPE curds_fetch_seconds histogram',
+                                 '# TYPE curds_response_bytes histogram'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+"""
+Unit tests for curds2.multi
+"""
+import unittest
+from curds2.api.base import BaseConnection
+from curds2.api.core import DatabaseError
+from curds2.multi import connect
+from tests.fakes import ListCursor, description
+
+# database name -> rows, each database in time order
+databases = dict(('db_{0}'.format(d),
+                  [(100 * d + n, float(n * 10 + d)) for n in range(25)])
+                 for d in range(8))
+
+
+class ListConnection(BaseConnection):
+    opened = set()
+
+    def __init__(self, dsn, perm='r'):
+        super(ListConnection, self).__init__(dsn)
+        self.opened.add(dsn)
+
+    def close(self):
+        self.opened.discard(self.dsn)
+
+    def cursor(self, **kwargs):
+        return ListCursor(databases[self.dsn], connection=self, **kwargs)
+
+
+class MultiCursorTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = connect(sorted(databases), workers=3,
+                            connection_factory=ListConnection)
+
+    def test_union(self):
+        curs = self.conn.cursor(blocksize=4)
+        self.assertEqual(curs.execute('dbprocess', [['dbopen origin']]), -1)
+        self.assertEqual(curs.description, description)
+        rows = list(curs)
+        expected = [r for d in databases.values() for r in d]
+        self.assertEqual(sorted(rows), sorted(expected))
+        self.assertEqual(curs.rowcount, len(expected))
+        self.assertEqual(ListConnection.opened, set())
+
+    def test_merge(self):
+        curs = self.conn.cursor(blocksize=4, order_by='time')
+        curs.execute('dbprocess', [['dbopen origin', 'dbsort time']])
+        rows = curs.fetchmany(10) + curs.fetchall()
+        expected = sorted(r[1] for d in databases.values() for r in d)
+        self.assertEqual([r[1] for r in rows], expected)
+        self.assertEqual(ListConnection.opened, set())
+
+    def test_close(self):
+        curs = self.conn.cursor(blocksize=2, order_by='time')
+        curs.execute('dbprocess', [['dbopen origin']])
+        self.assertEqual(curs.fetchone(), (0, 0.0))
+        curs.close()
+        self.assertEqual(ListConnection.opened, set())
+        self.assertEqual(curs.fetchall(), [])
+
+    def test_error(self):
+        curs = self.conn.cursor()
+        self.assertRaises(DatabaseError, curs.execute, 'dbnothing')
+        self.assertRaises(DatabaseError, self.conn.cursor(order_by='time')
+                          .execute, 'dbnothing')
+
+
+if __name__ == '__main__':
+    unittest.main()
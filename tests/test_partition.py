@@ -0,0 +1,76 @@
+"""
+Unit tests for curds2.partition
+"""
+import calendar
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from curds2 import partition
+from curds2.cache import _signature
+
+
+class PartitionTestCase(unittest.TestCase):
+    """Day volumes with origin table files and up-to-date sidecars"""
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.jan1 = calendar.timegm((2014, 1, 1, 0, 0, 0))
+        self.dsns = []
+        for day in range(1, 4):
+            dsn = os.path.join(self.dir, 'db_2014_01_0{0}'.format(day))
+            open(dsn, 'w').write('#\nschema css3.0\n')
+            table = dsn + '.origin'
+            open(table, 'w').write('origin rows\n')
+            start = self.jan1 + (day - 1) * partition.DAY
+            summary = {'path': table, 'signature': list(_signature(table)),
+                       'min': start + 600.0, 'max': start + 3600.0}
+            json.dump({'origin.time': summary},
+                      open(dsn + partition.SIDECAR, 'w'))
+            self.dsns.append(dsn)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_day_range(self):
+        self.assertEqual(partition.day_range(self.dsns[0]),
+                         (self.jan1, self.jan1 + partition.DAY))
+        self.assertIsNone(partition.day_range('/data/db/demo'))
+
+    def test_volumes(self):
+        pattern = os.path.join(self.dir, 'db_2014_*')
+        self.assertEqual(partition.volumes(pattern), self.dsns)
+
+    def test_prune(self):
+        day2 = self.jan1 + partition.DAY
+        pattern = os.path.join(self.dir, 'db_2014_*')
+        self.assertEqual(partition.prune(pattern, day2, day2 + 1800.0),
+                         self.dsns[1:2])
+        self.assertEqual(partition.prune(pattern, day2 + 3000.0,
+                                         day2 + partition.DAY + 900.0),
+                         self.dsns[1:3])
+        self.assertEqual(partition.prune(pattern, day2 + 4000.0,
+                                         day2 + 5000.0), [])
+
+    def test_prune_by_name(self):
+        # no sidecar or tables for this volume, it's never looked at
+        dsns = self.dsns + [os.path.join(self.dir, 'db_2014_06_01')]
+        self.assertEqual(partition.prune(dsns, self.jan1, self.jan1 + 900.0),
+                         self.dsns[:1])
+
+    def test_no_table(self):
+        dsn = os.path.join(self.dir, 'db_2014_01_04')
+        summary = {'path': dsn + '.origin', 'signature': None,
+                   'min': None, 'max': None}
+        json.dump({'origin.time': summary},
+                  open(dsn + partition.SIDECAR, 'w'))
+        summarize, partition.summarize = partition.summarize, None
+        try:
+            self.assertIsNone(partition.time_range(dsn))
+        finally:
+            partition.summarize = summarize
+
+
+if __name__ == '__main__':
+    unittest.main()
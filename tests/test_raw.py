@@ -83,10 +83,18 @@ class CursorTestCase(unittest.TestCase):
     def test_cursor_close(self):
         """Test Cursor close"""
         # Test we are connected to the DB
-        curs = Connection(self.dsn).cursor()
-        dbptr = getattr(curs, '_dbptr')
+        conn = Connection(self.dsn)
+        curs = conn.cursor()
+        curs.execute('dblookup', ('', 'origin', '', ''))
+        curs.execute('dbsort', (['time'],))
+        view = list(getattr(curs, '_dbptr'))
+        self.assertTrue( _ds._dbquery(view, _ds.dbTABLE_IS_VIEW) )
+        curs.close()
+        self.assertEqual( getattr(curs, '_dbptr')[1], _ds.dbALL )
+        # The database is left open for the other Cursors
+        dbptr = conn._dbptr
         self.assertNotEqual(  _ds._dbquery(dbptr,_ds.dbDATABASE_COUNT), 0 )
-        curs.close() 
+        conn.close()
         self.assertEqual(  _ds._dbquery(dbptr,_ds.dbDATABASE_COUNT), 0 )
         
     def test_cursor_execute(self):
@@ -94,6 +102,38 @@ class CursorTestCase(unittest.TestCase):
         self.assertIsInstance( curs.execute, _Executer )
         curs.close() 
 
+    def test_cursor_threads(self):
+        """Test Cursors in threads sharing one Connection"""
+        import threading
+        counts = []
+        def lookup(conn):
+            curs = conn.cursor()
+            counts.append(curs.execute('dblookup', ('','origin','','')))
+            curs.scroll(0, 'absolute')
+            counts.append(len(curs.fetchall()))
+        with connect(self.dsn) as conn:
+            threads = [threading.Thread(target=lookup, args=(conn,)) for i in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(counts, [1351] * 8)
+
+    def test_cursor_row_builder(self):
+        """Test fused rows match row_factory over the converted values"""
+        from curds2.rows import NamedTupleRow, OrderedDictRow
+        from curds2.api.base import BaseRow
+        with connect(self.dsn) as conn:
+            for factory in (BaseRow, NamedTupleRow, OrderedDictRow):
+                curs = conn.cursor(row_factory=factory, CONVERT_NULL=True,
+                                   CONVERT_DATETIME=True)
+                curs.execute('dblookup', ('', 'origin', '', ''))
+                rows = list(curs)
+                for curs._record in range(curs.rowcount):
+                    values = curs._getrow()
+                    self.assertEqual(rows[curs._record - 1],
+                                     factory(curs, values))
+
 
 class ExecuterTestCase(unittest.TestCase):
 
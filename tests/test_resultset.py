@@ -0,0 +1,142 @@
+"""
+Unit tests for curds2.api.resultset
+"""
+import array
+import unittest
+from curds2.api.resultset import ResultSet, arrow_schema
+from tests.fakes import ListCursor
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+description = [('orid', 2, None, 8, '%8ld', None, False),
+               ('time', 4, None, 17, '%17.5f', None, True),
+               ('auth', 6, None, 15, '%-15s', None, True)]
+
+rows = [(1, 704371900.66886, 'JSPC'),
+        (2, 704372222.0, 'UNR'),
+        (3, 704373333.5, '-')]
+
+
+class ResultSetTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.rs = ResultSet(ListCursor(rows, description))
+        for row in rows:
+            self.rs.append(row)
+
+    def test_len(self):
+        self.assertEqual(len(self.rs), 3)
+
+    def test_typed_columns(self):
+        self.assertIsInstance(self.rs['orid'], array.array)
+        self.assertIsInstance(self.rs['time'], array.array)
+        self.assertIsInstance(self.rs['auth'], list)
+        self.assertEqual(list(self.rs['orid']), [1, 2, 3])
+
+    def test_getitem(self):
+        self.assertEqual(self.rs[0], rows[0])
+        self.assertEqual(self.rs[-1], rows[-1])
+
+    def test_slice(self):
+        rs = self.rs[1:]
+        self.assertIsInstance(rs, ResultSet)
+        self.assertEqual(len(rs), 2)
+        self.assertEqual(rs[0], rows[1])
+
+    def test_iter(self):
+        self.assertEqual(list(self.rs), rows)
+        self.assertEqual(self.rs.tolist(), rows)
+
+    def test_null_fallback(self):
+        self.rs.append((None, None, None))
+        self.assertIsInstance(self.rs['orid'], list)
+        self.assertEqual(self.rs[3], (None, None, None))
+        self.assertEqual(self.rs[0], rows[0])
+
+
+class _NullTestCase(unittest.TestCase):
+    """ResultSet of the rows and a row of NULLs as None"""
+
+    def setUp(self):
+        self.rs = ResultSet(ListCursor(rows, description))
+        for row in rows + [(None, None, None)]:
+            self.rs.append(row)
+
+
+@unittest.skipIf(pandas is None, "pandas not installed")
+class DataFrameTestCase(_NullTestCase):
+
+    def test_nan(self):
+        df = self.rs.to_dataframe()
+        self.assertEqual(list(df.columns), ['orid', 'time', 'auth'])
+        self.assertEqual(df['orid'].dtype.kind, 'f')
+        self.assertEqual(list(df['orid'][:3]), [1, 2, 3])
+        self.assertTrue(pandas.isnull(df['orid'][3]))
+        self.assertTrue(pandas.isnull(df['time'][3]))
+        self.assertTrue(pandas.isnull(df['auth'][3]))
+
+    def test_nat(self):
+        df = self.rs.to_dataframe(datetimes=True)
+        self.assertEqual(df['time'].dtype.kind, 'M')
+        self.assertEqual(df['time'][1],
+                         pandas.Timestamp('1992-04-27 10:57:02'))
+        self.assertTrue(pandas.isnull(df['time'][3]))
+
+    def test_typed(self):
+        df = ResultSet(ListCursor(rows, description)).to_dataframe()
+        self.assertEqual(df['orid'].dtype.kind, 'i')
+        self.assertEqual(df['time'].dtype.kind, 'f')
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow not installed")
+class ArrowTestCase(_NullTestCase):
+
+    def test_nulls(self):
+        batch = self.rs.to_arrow()
+        self.assertEqual(batch.num_rows, 4)
+        self.assertEqual([c.null_count for c in batch.columns], [1, 1, 1])
+        self.assertEqual(batch.column(0).to_pylist(), [1, 2, 3, None])
+        self.assertEqual(batch.column(2).to_pylist()[:3], ['JSPC', 'UNR', '-'])
+
+    def test_timestamps(self):
+        batch = self.rs.to_arrow(datetimes=True)
+        times = batch.column(1)
+        self.assertTrue(pyarrow.types.is_timestamp(times.type))
+        self.assertEqual(times.cast(pyarrow.int64()).to_pylist(),
+                         [704371900668860, 704372222000000, 704373333500000,
+                          None])
+
+    def test_typed_timestamps(self):
+        rs = ResultSet(ListCursor(rows, description))
+        for row in rows:
+            rs.append(row)
+        times = rs.to_arrow(datetimes=True).column(1)
+        self.assertEqual(times.cast(pyarrow.int64()).to_pylist()[0],
+                         704371900668860)
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow not installed")
+class ArrowSchemaTestCase(unittest.TestCase):
+
+    def test_names(self):
+        schema = arrow_schema(description + [('assoc.orid', 2)])
+        self.assertEqual(schema.names, ['orid', 'time', 'auth', 'assoc_orid'])
+        self.assertEqual(schema.field('assoc_orid').type, pyarrow.int64())
+
+    def test_types(self):
+        schema = arrow_schema(description, datetimes=True)
+        self.assertEqual(schema.field('orid').type, pyarrow.int64())
+        self.assertTrue(pyarrow.types.is_timestamp(schema.field('time').type))
+        self.assertEqual(schema.field('auth').type, pyarrow.string())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,201 @@
+"""
+Unit tests for curds2.ws.service
+"""
+import threading
+import time
+import unittest
+from curds2.ws.service import Dispatcher, Service
+
+
+class StubService(object):
+    """Service sleeping for the 'sleep' param, recording what ran"""
+    ran = []
+
+    def __init__(self, dbname, timings=None):
+        self.dbname = dbname
+
+    def run(self, request):
+        params = request.pop('params')
+        time.sleep(params.get('sleep', 0))
+        self.ran.append((self.dbname, request['id']))
+        request['result'] = self.dbname
+        return request
+
+    def stream(self, request, lines=False):
+        yield '{"result": '
+        yield '"{0}"}}'.format(self.run(request)['result'])
+
+
+class StubCursor(object):
+    """Cursor with one row of the dbprocess commands"""
+    description = [('cmds', 6, None, 64, '%s', None, True)]
+
+    def execute(self, operation, params):
+        self.rows = [(' | '.join(params[0]),)]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class StubConnection(object):
+    """Connection counting opens and closes"""
+    opened = closed = 0
+
+    def __init__(self):
+        StubConnection.opened += 1
+
+    def cursor(self, **kwargs):
+        return StubCursor()
+
+    def close(self):
+        StubConnection.closed += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class StubConnectService(Service):
+    """Service on StubConnections"""
+    def _connect(self):
+        return StubConnection()
+
+
+def request(id, sleep=0):
+    return {'jsonrpc': '2.0', 'id': id, 'method': 'dbprocess',
+            'params': {'sleep': sleep}}
+
+
+class DispatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        StubService.ran = []
+        self.threads = []
+
+    def tearDown(self):
+        for thread in self.threads:
+            thread.join()
+
+    def dispatcher(self, **kwargs):
+        return Dispatcher(service=StubService, **kwargs)
+
+    def background(self, dispatcher, dbname, req):
+        """Run a request in another thread, return dict for the reply"""
+        reply = {}
+
+        def run():
+            reply.update(dispatcher.run(dbname, req))
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.threads.append(thread)
+        time.sleep(0.05)
+        return reply
+
+    def test_run(self):
+        reply = self.dispatcher().run('/tmp/a', request(1))
+        self.assertEqual(reply['result'], '/tmp/a')
+
+    def test_max_pending(self):
+        dispatcher = self.dispatcher(max_pending=1)
+        self.background(dispatcher, '/tmp/a', request(1, sleep=0.3))
+        reply = dispatcher.run('/tmp/b', request(2))
+        self.assertIn('busy', reply['error']['message'])
+        self.threads[0].join()
+        self.assertEqual(dispatcher.run('/tmp/b', request(3))['result'],
+                         '/tmp/b')
+
+    def test_per_database(self):
+        dispatcher = self.dispatcher(workers=2, per_database=1)
+        self.background(dispatcher, '/tmp/a', request(1, sleep=0.5))
+        self.background(dispatcher, '/tmp/a', request(2, sleep=0.5))
+        t0 = time.time()
+        reply = dispatcher.run('/tmp/b', request(3))
+        self.assertEqual(reply['result'], '/tmp/b')
+        self.assertLess(time.time() - t0, 0.3)
+        for thread in self.threads:
+            thread.join()
+        self.assertEqual(StubService.ran,
+                         [('/tmp/b', 3), ('/tmp/a', 1), ('/tmp/a', 2)])
+
+    def test_database_timeout(self):
+        dispatcher = self.dispatcher(per_database=1, timeout=0.2)
+        self.background(dispatcher, '/tmp/a', request(1, sleep=0.5))
+        reply = dispatcher.run('/tmp/a', request(2))
+        self.assertIn('waiting for database', reply['error']['message'])
+        time.sleep(0.6)
+        self.assertEqual(StubService.ran, [('/tmp/a', 1)])
+
+    def test_queued_timeout(self):
+        dispatcher = self.dispatcher(workers=1, timeout=0.3)
+        self.background(dispatcher, '/tmp/a', request(1, sleep=0.6))
+        reply = dispatcher.run('/tmp/b', request(2))
+        self.assertIn('timed out', reply['error']['message'])
+        time.sleep(0.5)
+        self.assertEqual(StubService.ran, [('/tmp/a', 1)])
+        self.assertEqual(dispatcher._pending, 0)
+
+    def test_stream(self):
+        dispatcher = self.dispatcher(per_database=1)
+        text = ''.join(dispatcher.stream('/tmp/a', request(1)))
+        self.assertEqual(text, '{"result": "/tmp/a"}')
+        self.assertEqual(dispatcher._active, {})
+        self.assertEqual(dispatcher._pending, 0)
+
+
+class ServiceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        StubConnection.opened = StubConnection.closed = 0
+        self.service = StubConnectService('/tmp/demo')
+
+    def _request(self, id, *cmds):
+        return {'jsonrpc': '2.0', 'id': id, 'method': 'dbprocess',
+                'params': {'args': [list(cmds)]}}
+
+    def test_run(self):
+        reply = self.service.run(self._request(1, 'dbopen origin'))
+        self.assertEqual(reply['result']['cursor']['rows'],
+                         [('dbopen origin',)])
+
+    def test_batch(self):
+        replies = self.service.run([self._request(1, 'dbopen origin'),
+                                    self._request(2, 'dbopen site')])
+        self.assertEqual([r['result']['cursor']['rows'] for r in replies],
+                         [[('dbopen origin',)], [('dbopen site',)]])
+        self.assertEqual((StubConnection.opened, StubConnection.closed),
+                         (1, 1))
+
+    def test_batch_invalid(self):
+        replies = self.service.run([1, self._request(2, 'dbopen site'), []])
+        self.assertEqual(len(replies), 3)
+        for reply in replies[0], replies[2]:
+            self.assertEqual(reply['id'], None)
+            self.assertIn('Invalid Request', reply['error']['message'])
+        self.assertEqual(replies[1]['result']['cursor']['rows'],
+                         [('dbopen site',)])
+
+    def test_invalid(self):
+        reply = self.service.run(1)
+        self.assertIn('Invalid Request', reply['error']['message'])
+        self.assertEqual(reply['error']['type'], 'ProgrammingError')
+
+    def test_empty_batch(self):
+        reply = self.service.run([])
+        self.assertEqual(reply['error']['message'], 'Empty batch')
+
+    def test_unknown_method(self):
+        reply = self.service.run({'jsonrpc': '2.0', 'id': 1, 'method': 'spam',
+                                  'params': {'args': []}})
+        self.assertEqual(reply['error']['type'], 'AttributeError')
+
+    def test_dispatcher_invalid(self):
+        dispatcher = Dispatcher(service=StubConnectService)
+        replies = dispatcher.run('/tmp/demo', [1, self._request(2, 'x')])
+        self.assertIn('Invalid Request', replies[0]['error']['message'])
+        self.assertEqual(replies[1]['id'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Unit tests for curds2.ws.shm
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from curds2.api.core import InterfaceError
+from curds2.ws import shm
+from tests.fakes import ListCursor, rows
+
+
+class ShmTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_round_trip(self):
+        handle = shm.write_result(ListCursor(), self.directory)
+        self.assertEqual(handle['nrows'], len(rows))
+        columns = shm.read_result(handle, self.directory)
+        self.assertFalse(os.path.exists(handle['path']))
+        result = shm.ColumnRows(columns, handle['nrows'])
+        self.assertEqual(len(result), len(rows))
+        self.assertEqual([tuple(result[n]) for n in range(len(result))], rows)
+
+    def test_column(self):
+        handle = shm.write_result(ListCursor(), self.directory)
+        orid = shm.read_result(handle, self.directory)[0]
+        self.assertIsInstance(orid, shm.MappedColumn)
+        self.assertEqual(orid[-1], 99)
+        self.assertEqual(list(orid[10:13]), [10, 11, 12])
+        self.assertRaises(IndexError, orid.__getitem__, len(rows))
+
+    def test_mode(self):
+        handle = shm.write_result(ListCursor(), self.directory)
+        self.assertEqual(os.stat(handle['path']).st_mode & 0o777,
+                         shm.FILE_MODE)
+
+    def test_bad_path(self):
+        handle = shm.write_result(ListCursor(), self.directory)
+        self.assertRaises(InterfaceError, shm.read_result, handle)
+        other = os.path.join(self.directory, 'passwd')
+        open(other, 'w').close()
+        for path in (other, os.path.join(self.directory, '..',
+                                         os.path.basename(self.directory),
+                                         'passwd')):
+            self.assertRaises(InterfaceError, shm.read_result,
+                              dict(handle, path=path), self.directory)
+        self.assertTrue(os.path.exists(other))
+        self.assertTrue(os.path.exists(handle['path']))
+
+    def test_not_removable(self):
+        def remove(path):
+            raise OSError(1, "Operation not permitted", path)
+        handle = shm.write_result(ListCursor(), self.directory)
+        shm.os.remove, os_remove = remove, shm.os.remove
+        try:
+            columns = shm.read_result(handle, self.directory)
+        finally:
+            shm.os.remove = os_remove
+        self.assertEqual(list(columns[0])[:3], [0, 1, 2])
+        self.assertTrue(os.path.exists(handle['path']))
+
+    def test_sweep(self):
+        fd, path = tempfile.mkstemp(prefix=shm.PREFIX, suffix=shm.SUFFIX,
+                                    dir=self.directory)
+        os.close(fd)
+        os.utime(path, (0, 0))
+        shm.sweep(self.directory)
+        self.assertFalse(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
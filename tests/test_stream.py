@@ -0,0 +1,155 @@
+"""
+Unit tests for curds2.ws.stream
+"""
+import json
+import unittest
+from StringIO import StringIO
+from curds2.ws import stream
+from curds2.ws.stream import LineReader, ReplyReader, encode_lines, \
+    encode_reply, _closers
+
+description = [['orid', 2, 8, 8, '%8ld', None, False],
+               ['auth', 6, 15, 15, '%-15s', None, True]]
+
+rows = [[n, 'UNR "%d" ]},[' % n] for n in range(25)]
+
+
+def reply():
+    return {'jsonrpc': '2.0', 'id': 1, 'method': 'dbprocess',
+            'result': {'cursor': {'description': description}}}
+
+
+def failing(n):
+    for row in rows[:n]:
+        yield row
+    raise ValueError("dbgetv failed")
+
+
+class StreamTestCase(unittest.TestCase):
+
+    def test_encode(self):
+        text = ''.join(encode_reply(reply(), iter(rows), chunk=10))
+        expected = reply()
+        expected['result']['cursor']['rows'] = rows
+        self.assertEqual(json.loads(text), expected)
+
+    def test_encode_empty(self):
+        text = ''.join(encode_reply(reply(), []))
+        self.assertEqual(json.loads(text)['result']['cursor']['rows'], [])
+
+    def test_encode_error(self):
+        text = ''.join(encode_reply(reply(), failing(3), chunk=2))
+        rep = json.loads(text)
+        self.assertEqual(len(rep['result']['cursor']['rows']), 2)
+        self.assertEqual(rep['result']['cursor']['error']['type'],
+                         'ValueError')
+        self.assertNotIn('error', rep)
+
+    def test_closers(self):
+        self.assertEqual(_closers('{"a": [1, "]}", {"b": '), '}]}')
+
+    def test_reader(self):
+        text = ''.join(encode_reply(reply(), iter(rows), chunk=10))
+        reader = ReplyReader(StringIO(text), size=7)
+        self.assertTrue(reader.streaming)
+        self.assertEqual(reader.reply['result']['cursor']['description'],
+                         description)
+        self.assertEqual(list(reader), rows)
+        self.assertEqual(reader.reply['id'], 1)
+
+    def test_reader_sorted(self):
+        rep = reply()
+        rep['result']['cursor']['rows'] = rows
+        text = json.dumps(rep, indent=2, sort_keys=True)
+        reader = ReplyReader(StringIO(text), size=16)
+        self.assertEqual(list(reader), rows)
+        self.assertEqual(reader.reply['method'], 'dbprocess')
+
+    def test_reader_error(self):
+        text = ''.join(encode_reply(reply(), failing(3), chunk=2))
+        reader = ReplyReader(StringIO(text), size=5)
+        self.assertEqual(len(list(reader)), 2)
+        self.assertEqual(reader.reply['result']['cursor']['error']['message'],
+                         'dbgetv failed')
+
+    def test_reader_plain(self):
+        text = json.dumps({'id': 1, 'result': 1351})
+        reader = ReplyReader(StringIO(text), size=4)
+        self.assertFalse(reader.streaming)
+        self.assertEqual(reader.reply['result'], 1351)
+
+    def test_reader_rows_not_cursor(self):
+        text = json.dumps({'id': 1, 'result': {'rows': [[1], [2]]}})
+        reader = ReplyReader(StringIO(text), size=4)
+        self.assertFalse(reader.streaming)
+        self.assertEqual(reader.reply['result']['rows'], [[1], [2]])
+
+
+class Clock(object):
+    """Stand-in for the time module, 'step' seconds per call"""
+    def __init__(self, step=0.0):
+        self.now = 0.0
+        self.step = step
+
+    def time(self):
+        self.now += self.step
+        return self.now
+
+
+class LinesTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock(step=1.0)
+        stream.time, self._time = self.clock, stream.time
+
+    def tearDown(self):
+        stream.time = self._time
+
+    def test_encode_lines(self):
+        # the same time per line, the time per row drops as lines grow
+        lines = list(encode_lines(reply(), iter(rows), chunk=8))
+        self.assertEqual(json.loads(lines[0]), reply())
+        self.assertEqual([len(json.loads(l)) for l in lines[1:-1]],
+                         [1, 2, 4, 8, 8, 2])
+        self.assertEqual(json.loads(lines[-1]), {'rowcount': 25})
+        self.assertTrue(all(l.count('\n') == 1 for l in lines))
+
+    def test_encode_lines_settle(self):
+        # the same time per row, lines stop growing
+        self.clock.step = 0.0
+
+        def timed():
+            for row in rows:
+                self.clock.now += 1.0
+                yield row
+        lines = list(encode_lines(reply(), timed(), chunk=8))
+        self.assertEqual([len(json.loads(l)) for l in lines[1:-1]],
+                         [1] + [2] * 12)
+
+    def test_reader(self):
+        text = ''.join(encode_lines(reply(), iter(rows)))
+        reader = LineReader(StringIO(text))
+        self.assertTrue(reader.streaming)
+        self.assertIsNone(reader.rowcount)
+        self.assertEqual(list(reader), rows)
+        self.assertEqual(reader.rowcount, 25)
+
+    def test_reader_error(self):
+        text = ''.join(encode_lines(reply(), failing(3)))
+        reader = LineReader(StringIO(text))
+        self.assertEqual(len(list(reader)), 3)
+        self.assertEqual(reader.reply['error']['type'], 'ValueError')
+
+    def test_reader_truncated(self):
+        text = ''.join(list(encode_lines(reply(), iter(rows)))[:-1])
+        reader = LineReader(StringIO(text))
+        self.assertRaises(ValueError, list, reader)
+
+    def test_reader_plain(self):
+        reader = LineReader(StringIO(json.dumps({'id': 1, 'result': 3})))
+        self.assertFalse(reader.streaming)
+        self.assertEqual(list(reader), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,183 @@
+"""
+Unit tests for curds2.ws.dbapi2
+"""
+import BaseHTTPServer
+import json
+import os
+import shutil
+import SocketServer
+import tempfile
+import threading
+import unittest
+from curds2.api.core import DatabaseError
+from curds2.ws import shm, unix
+from curds2.ws.dbapi2 import connect, _PreparedRequest
+from tests.fakes import ListCursor, rows
+
+
+class PreparedRequestTestCase(unittest.TestCase):
+
+    def test_request(self):
+        prepared = _PreparedRequest('dbprocess', {'CONVERT_NULL': True})
+        request = json.loads(prepared([['dbopen origin', 'dbjoin assoc']]))
+        self.assertEqual(request, {
+            'jsonrpc': '2.0', 'id': 1, 'method': 'dbprocess',
+            'params': {'cursor': {'CONVERT_NULL': True},
+                       'args': [['dbopen origin', 'dbjoin assoc']]}})
+
+
+class CursorTestCase(unittest.TestCase):
+
+    def test_state(self):
+        conn = connect('http://localhost:5150/tmp/demo')
+        curs1, curs2 = conn.cursor(), conn.cursor(CONVERT_NULL=True)
+        curs1._result({'result': {'cursor': {'description': [['orid', 2]],
+                                             'rows': [[1], [2]]}}})
+        self.assertEqual(curs1.rowcount, 2)
+        self.assertEqual(curs2.rowcount, 0)
+        self.assertEqual(curs2.description, [])
+
+    def test_prepare(self):
+        curs = connect('http://localhost:5150/tmp/demo').cursor()
+        prepared = curs._prepare('dbprocess')
+        self.assertIs(curs._prepare('dbprocess'), prepared)
+        curs.CONVERT_NULL = True
+        self.assertIsNot(curs._prepare('dbprocess'), prepared)
+        request = json.loads(curs._prepare('dbprocess')([['dbopen site']]))
+        self.assertEqual(request['params']['cursor'], {'CONVERT_NULL': True})
+
+
+class EchoHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Reply to a request with a cursor result of its path and params"""
+    def do_POST(self):
+        req = json.loads(self.rfile.read(int(self.headers['content-length'])))
+        body = json.dumps({'jsonrpc': '2.0', 'id': req['id'], 'result': {
+            'cursor': {'description': [['path', 6], ['args', 6]],
+                       'rows': [[self.path, req['params']['args']]]}}})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class BatchHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Reply to a batch in reverse order, with a cursor result of the args
+    of each dbprocess and an error for other methods
+    """
+    def do_POST(self):
+        batch = json.loads(self.rfile.read(
+            int(self.headers['content-length'])))
+        replies = []
+        for req in reversed(batch):
+            reply = {'jsonrpc': '2.0', 'id': req['id']}
+            if req['method'] == 'dbprocess':
+                reply['result'] = {'cursor': {
+                    'description': [['args', 6]],
+                    'rows': [[a] for a in req['params']['args'][0]]}}
+            else:
+                reply['error'] = {'type': 'AttributeError',
+                                  'message': 'No such method'}
+            replies.append(reply)
+        body = json.dumps(replies)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MmapBatchHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Reply to a batch with memory-mapped results of the ListCursor rows"""
+    def do_POST(self):
+        batch = json.loads(self.rfile.read(
+            int(self.headers['content-length'])))
+        replies = [{'jsonrpc': '2.0', 'id': req['id'], 'result': {
+                    'mmap': shm.write_result(ListCursor())}}
+                   for req in batch]
+        body = json.dumps(replies)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class UnixTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'curdsd.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_url(self):
+        dsn = 'unix:///var/run/curdsd.sock:/tmp/demo'
+        self.assertEqual(unix.split(dsn), ('/var/run/curdsd.sock', '/tmp/demo'))
+        self.assertEqual(unix.url(dsn),
+                         'unix://%2Fvar%2Frun%2Fcurdsd.sock/tmp/demo')
+        self.assertRaises(ValueError, unix.split, 'unix:///tmp/demo')
+
+    def test_execute(self):
+        server = SocketServer.UnixStreamServer(self.path, EchoHandler)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        try:
+            curs = connect('unix://{0}:/tmp/demo'.format(self.path)).cursor()
+            self.assertEqual(curs.execute('dbprocess', [['dbopen site']]), 1)
+            self.assertEqual(curs.fetchone(), ('/tmp/demo', [['dbopen site']]))
+        finally:
+            thread.join()
+            server.server_close()
+
+    def _serve(self, handler):
+        """Serve one request on the socket in another thread"""
+        server = SocketServer.UnixStreamServer(self.path, handler)
+        thread = threading.Thread(target=server.handle_request)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(thread.join)
+
+    def test_executebatch(self):
+        self._serve(BatchHandler)
+        curs = connect('unix://{0}:/tmp/demo'.format(self.path)).cursor()
+        results = curs.executebatch([('dbprocess', [['dbopen origin']]),
+                                     ('dbprocess', [['a', 'b']])])
+        self.assertEqual(results, [[('dbopen origin',)], [('a',), ('b',)]])
+        self.assertEqual(curs.rowcount, 2)
+
+    def test_executebatch_error(self):
+        self._serve(BatchHandler)
+        curs = connect('unix://{0}:/tmp/demo'.format(self.path)).cursor()
+        self.assertRaises(DatabaseError, curs.executebatch,
+                          [('dbprocess', [['dbopen origin']]), ('spam', [])])
+
+    def test_executebatch_mmap(self):
+        self._serve(MmapBatchHandler)
+        conn = connect('unix://{0}:/tmp/demo'.format(self.path), MMAP=True)
+        curs = conn.cursor()
+        results = curs.executebatch([('dbprocess', [['dbopen origin']]),
+                                     ('dbprocess', [['dbopen arrival']])])
+        self.assertEqual([[tuple(r) for r in result] for result in results],
+                         [rows, rows])
+
+    def test_stale_socket(self):
+        unix.listener(self.path).close()
+        sock = unix.listener(self.path)
+        self.assertRaises(Exception, unix.listener, self.path)
+        sock.close()
+
+
+if __name__ == '__main__':
+    unittest.main()